@@ -1,8 +1,44 @@
 import os
 from celery import Celery
+from celery.signals import task_prerun, task_postrun, worker_process_shutdown, worker_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'NYT.settings')
 
 app = Celery("NYT")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@task_prerun.connect
+@task_postrun.connect
+def _close_old_db_connections(**kwargs):
+    # Celery has no request cycle, so apply CONN_MAX_AGE / health checks per task
+    from django.db import close_old_connections
+    close_old_connections()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _flush_query_hits(**kwargs):
+    # Write out buffered QueryHits before the process goes away
+    from perfmetrics import recorder
+    recorder.flush()
+
+
+@task_prerun.connect
+def _start_task_timer(task_id=None, **kwargs):
+    from perfmetrics import prom
+    prom.task_started(task_id)
+
+
+@task_postrun.connect
+def _observe_task_duration(task_id=None, task=None, state=None, **kwargs):
+    from perfmetrics import prom
+    prom.task_finished(task_id, task.name, state)
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_dead(**kwargs):
+    # Drop this child's live gauges from PROMETHEUS_MULTIPROC_DIR; its counters stay
+    from perfmetrics import prom
+    prom.mark_process_dead(os.getpid())
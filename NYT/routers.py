@@ -0,0 +1,77 @@
+"""
+Database routing: analytics reads vs. ingestion writes.
+
+When an ``analytics`` alias is configured (a streaming replica, or a separate
+pool on the primary), ORM reads of the ``analytics`` app and the raw analytics
+SQL go there, while every write stays on ``default``. ``perfmetrics`` models
+are read on ``default``: its rollup, purge, baseline and stats code reads what
+it has just written, so only the request-path views ask for ``analytics_db()``
+explicitly.
+If the replica lags more than ``ANALYTICS_REPLICA_MAX_LAG_S`` or cannot be
+reached, reads fall back to the primary until the next check.
+"""
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+ANALYTICS_ALIAS = "analytics"
+READ_APPS = {"analytics"}
+# Scale-factor benchmark database: holds only the core tables, reached explicitly with using=
+BENCH_ALIAS = "bench"
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_health = {"checked_at": 0.0, "alias": "default", "lag_s": None}
+
+
+def replica_lag_s() -> float:
+    with connections[ANALYTICS_ALIAS].cursor() as cur:
+        cur.execute(LAG_SQL)
+        return float(cur.fetchone()[0])
+
+
+def analytics_db() -> str:
+    """
+    Alias to run analytics reads on, re-checking replica lag at most every
+    ``ANALYTICS_REPLICA_LAG_CHECK_S`` seconds per process.
+    """
+    if ANALYTICS_ALIAS not in settings.DATABASES:
+        return "default"
+    now = time.monotonic()
+    if now - _health["checked_at"] >= getattr(settings, "ANALYTICS_REPLICA_LAG_CHECK_S", 5):
+        try:
+            lag = replica_lag_s()
+        except DatabaseError:
+            lag = None
+        max_lag = getattr(settings, "ANALYTICS_REPLICA_MAX_LAG_S", 30)
+        ok = lag is not None and lag <= max_lag
+        _health.update(checked_at=now, lag_s=lag, alias=ANALYTICS_ALIAS if ok else "default")
+    return _health["alias"]
+
+
+class AnalyticsRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in READ_APPS:
+            return analytics_db()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ANALYTICS_ALIAS:
+            return False
+        if db == BENCH_ALIAS:
+            return app_label == "core"
+        return None
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'perfmetrics.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,9 +84,56 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'nyc'),
         'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Persistent connections: one per web thread / Celery process, reused across
+        # requests and checked before reuse. The pool size is therefore bounded by
+        # workers x threads; keep it below Postgres max_connections.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+            'application_name': os.environ.get('DB_APPLICATION_NAME', 'nyt'),
+            'keepalives': 1,
+            'keepalives_idle': 60,
+        },
     }
 }
 
+# Optional read-only alias for analytics/perfmetrics reads (streaming replica or a
+# separate pool on the primary). Writes always go to 'default'. See NYT/routers.py.
+if os.environ.get('ANALYTICS_DB_HOST'):
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('ANALYTICS_DB_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('ANALYTICS_DB_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('ANALYTICS_DB_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('ANALYTICS_DB_HOST'),
+        'PORT': os.environ.get('ANALYTICS_DB_PORT', '5432'),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Optional dedicated database for scale-factor benchmarks (populate_benchdb / bench_scale).
+# Same server and credentials as the primary unless overridden; only the core tables are migrated there.
+if os.environ.get('BENCH_DB_NAME'):
+    DATABASES['bench'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('BENCH_DB_NAME'),
+        'USER': os.environ.get('BENCH_DB_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('BENCH_DB_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('BENCH_DB_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('BENCH_DB_PORT', DATABASES['default']['PORT']),
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['NYT.routers.AnalyticsRouter']
+# Fall back to the primary when the replica is further behind than this
+ANALYTICS_REPLICA_MAX_LAG_S = float(os.environ.get('ANALYTICS_REPLICA_MAX_LAG_S', '30'))
+ANALYTICS_REPLICA_LAG_CHECK_S = float(os.environ.get('ANALYTICS_REPLICA_LAG_CHECK_S', '5'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -130,4 +178,95 @@ CELERY_BROKER_URL = "redis://127.0.0.1:6380/0"
 CELERY_RESULT_BACKEND = "redis://127.0.0.1:6380/0"
 CELERY_TASK_TIME_LIMIT = 60 * 60 * 2 # 2 hour per task hard limit
 CELERY_TASK_SOFT_TIME_LIMIT = 55 * 60
-CELERY_WORKER_MAX_TASKS_PER_CHILD = 50
\ No newline at end of file
+CELERY_WORKER_MAX_TASKS_PER_CHILD = 50
+CELERY_BEAT_SCHEDULE = {
+    "perfmetrics-rollup": {"task": "perfmetrics.tasks.rollup_query_hits", "schedule": 60.0},
+    "perfmetrics-db-stats": {"task": "perfmetrics.tasks.collect_db_stats", "schedule": 300.0},
+}
+
+# Analytics result streaming (?format=columnar|arrow): rows per server-side fetchmany()
+ANALYTICS_FETCH_CHUNK_SIZE = int(os.environ.get("ANALYTICS_FETCH_CHUNK_SIZE", "5000"))
+
+# Ingest data version token (bumped after every ingest; used for analytics ETags).
+# Must live on storage shared by all web and Celery processes.
+DATA_VERSION_FILE = os.environ.get("DATA_VERSION_FILE", str(BASE_DIR / "var" / "data_version"))
+
+# Optional local Parquet trip lake (Hive-partitioned year=/month=). Empty disables it.
+# When set, ingestion also writes trips here and /api/v2/...?engine=lake reads from it.
+TRIP_LAKE_DIR = os.environ.get("TRIP_LAKE_DIR", "")
+
+# Shared memory-mapped Arrow snapshots of hot aggregates (published after ingestion).
+# Empty disables; when set, /api/v2/...?engine=snapshot serves from them.
+ANALYTICS_SNAPSHOT_DIR = os.environ.get("ANALYTICS_SNAPSHOT_DIR", "")
+
+# Run the known analytics queries as per-connection server-side prepared statements
+ANALYTICS_PREPARED_STATEMENTS = os.environ.get("ANALYTICS_PREPARED_STATEMENTS", "1") == "1"
+
+# Admission control per analytics query class (per process): execution slots, how many
+# requests may wait for one and for how long (429 when the queue is full, 503 when the
+# wait times out), and the default statement_timeout. Catalog metrics pick a class.
+ANALYTICS_ADMISSION = {
+    "light": {
+        "concurrency": int(os.environ.get("ANALYTICS_LIGHT_CONCURRENCY", "8")),
+        "queue": int(os.environ.get("ANALYTICS_LIGHT_QUEUE", "32")),
+        "wait_s": float(os.environ.get("ANALYTICS_LIGHT_WAIT_S", "5")),
+        "timeout_ms": int(os.environ.get("ANALYTICS_LIGHT_TIMEOUT_MS", "15000")),
+    },
+    "heavy": {
+        "concurrency": int(os.environ.get("ANALYTICS_HEAVY_CONCURRENCY", "2")),
+        "queue": int(os.environ.get("ANALYTICS_HEAVY_QUEUE", "8")),
+        "wait_s": float(os.environ.get("ANALYTICS_HEAVY_WAIT_S", "15")),
+        "timeout_ms": int(os.environ.get("ANALYTICS_HEAVY_TIMEOUT_MS", "60000")),
+    },
+}
+
+# QueryHit recording: buffered and written in bulk by a background thread ("thread"), handed to
+# a Celery task ("celery"), or one INSERT per query ("sync"). Sampling is per label pattern.
+QUERYHIT_RECORDER = {
+    "mode": os.environ.get("QUERYHIT_RECORDER_MODE", "thread"),
+    "flush_size": int(os.environ.get("QUERYHIT_FLUSH_SIZE", "500")),
+    "flush_interval_s": float(os.environ.get("QUERYHIT_FLUSH_INTERVAL_S", "2")),
+    "max_buffer": 20_000,
+    "sampling": {"*": float(os.environ.get("QUERYHIT_SAMPLE_RATE", "1.0"))},
+}
+
+# QueryHit retention: raw hits and minute rollups are downsampled into minute/hour rollups
+# (perfmetrics.rollup, run every minute by Celery beat) and purged after this many days.
+PERFMETRICS_RETENTION = {
+    "raw_days": int(os.environ.get("PERFMETRICS_RAW_DAYS", "2")),
+    "minute_days": int(os.environ.get("PERFMETRICS_MINUTE_DAYS", "14")),
+    "hour_days": int(os.environ.get("PERFMETRICS_HOUR_DAYS", "400")),
+}
+
+# Sampled EXPLAIN (ANALYZE, BUFFERS) capture of analytics queries, run by Celery (perfmetrics.plans).
+# Slow queries are always sampled; each label at most once per min_interval_s per process.
+ANALYTICS_PLAN_CAPTURE = {
+    "enabled": os.environ.get("ANALYTICS_PLAN_CAPTURE", "1") == "1",
+    "sample_rate": float(os.environ.get("ANALYTICS_PLAN_SAMPLE_RATE", "0.01")),
+    "slow_ms": float(os.environ.get("ANALYTICS_PLAN_SLOW_MS", "2000")),
+    "min_interval_s": float(os.environ.get("ANALYTICS_PLAN_MIN_INTERVAL_S", "300")),
+    "latency_shift_pct": 50.0,
+}
+
+# pg_stat_* snapshots (perfmetrics.dbstats, every 5 minutes via Celery beat) are kept this long
+DBSTATS_RETENTION_DAYS = int(os.environ.get("DBSTATS_RETENTION_DAYS", "14"))
+
+# Server-Timing breakdown (queue, db-connect/exec/fetch, build, serialize, instr, app) for requests
+# under these paths, and a sampling profiler on profile_rate of them (perfmetrics.timing / .profiler).
+# Profiles are stored per endpoint and hour in RequestProfile via Celery.
+PERF_TIMING = {
+    "enabled": os.environ.get("PERF_TIMING", "1") == "1",
+    "paths": ["/api/", "/metrics/"],
+    "profile_rate": float(os.environ.get("PERF_PROFILE_RATE", "0.0")),
+    "profile_interval_ms": float(os.environ.get("PERF_PROFILE_INTERVAL_MS", "5")),
+}
+
+# Prometheus exposition at /metrics/prometheus/ (perfmetrics.prom). For gunicorn/Celery worker processes export
+# PROMETHEUS_MULTIPROC_DIR (an empty, shared directory) before starting them. Queue depth is LLEN on these queues.
+PROMETHEUS_CELERY_QUEUES = [q.strip() for q in os.environ.get("PROMETHEUS_CELERY_QUEUES", "celery").split(",") if q.strip()]
+
+# Budgets for `manage.py check_web_imports` (web worker import time / peak RSS after loading all URLconfs)
+WEB_IMPORT_CHECK = {
+    "max_import_ms": float(os.environ["WEB_IMPORT_MAX_MS"]) if os.environ.get("WEB_IMPORT_MAX_MS") else None,
+    "max_rss_mb": float(os.environ["WEB_IMPORT_MAX_RSS_MB"]) if os.environ.get("WEB_IMPORT_MAX_RSS_MB") else None,
+}
@@ -0,0 +1,45 @@
+"""
+HTTP caching for analytics endpoints.
+
+Responses carry an ETag derived from the request (path, query string, response
+format) and the ingest data version (`core.dataversion`). A matching
+If-None-Match is answered with 304 before the view runs, so repeat dashboard
+loads cost no query at all. Bodies above ~200 bytes are gzip-compressed.
+"""
+import hashlib
+from functools import partial, wraps
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import etag
+
+from analytics.formats import requested_format
+from core import dataversion
+
+
+def analytics_etag(request, *args, snapshot_backed: bool = False, **kwargs) -> str:
+    query = "&".join(f"{k}={','.join(v)}" for k, v in sorted(request.GET.lists()))
+    version = dataversion.current()
+    if snapshot_backed or request.GET.get("engine") == "snapshot":
+        # Snapshots are republished after the data version moves; key on what is served
+        from analytics import snapshots
+        if snapshots.enabled():
+            version = f"{version}:{snapshots.current_version()}"
+    key = "|".join([request.path, query, requested_format(request), version])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def data_versioned(view, snapshot_backed: bool = False):
+    # snapshot_backed: the view may answer from a published snapshot whatever the query string says
+    etag_func = partial(analytics_etag, snapshot_backed=True) if snapshot_backed else analytics_etag
+    conditional = gzip_page(etag(etag_func)(view))
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = conditional(request, *args, **kwargs)
+        # Clients must revalidate, which is a 304 until the next ingest
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ("Accept",))
+        return response
+
+    return wrapped
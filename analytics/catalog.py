@@ -0,0 +1,223 @@
+"""
+Analytics query catalog.
+
+Every metric is declared once: its SQL template, bind parameters, the source
+table variants it can run against and whether responses may be cached. The
+v1/v2/v3 views, ``analytics/urls.py``, the compare page and the benchmark
+commands are all generated from ``METRICS``.
+
+SQL templates use ``{trip}`` / ``{location}`` for table names; a variant maps
+those to real tables:
+
+- ``raw``:    ``core_trip`` as ingested
+- ``clean``:  ``trip_clean``, the filtered copy built by ``build_optimized``
+- ``rollup``: per-day/vendor pre-aggregates (``trip_daily_vendor``); only for
+              metrics that declare ``rollup_sql``
+
+``query_class`` picks the admission-control pool (``perfmetrics.admission``);
+``timeout_ms`` overrides that class's ``statement_timeout``. ``series`` names
+the (x, y) columns of per-day series, which ``?points=N`` can downsample
+(``analytics.downsample``).
+"""
+from dataclasses import dataclass
+
+SOURCES = {
+    "raw": {"trip": "core_trip", "location": "core_location"},
+    "clean": {"trip": "trip_clean", "location": "core_location"},
+    "rollup": {"trip": "trip_clean", "location": "core_location", "daily_vendor": "trip_daily_vendor"},
+}
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    sql: str
+    params: tuple = ()
+    rollup_sql: str | None = None
+    cacheable: bool = True
+    query_class: str = "light"
+    timeout_ms: int | None = None
+    series: tuple[str, str] | None = None  # (x, y) columns of a time series; enables ?points=N
+
+    @property
+    def run_options(self) -> dict:
+        return {"params": self.params, "query_class": self.query_class, "timeout_ms": self.timeout_ms}
+
+    @property
+    def slug(self) -> str:
+        return self.name.replace("_", "-")
+
+    @property
+    def variants(self) -> tuple[str, ...]:
+        return ("raw", "clean", "rollup") if self.rollup_sql else ("raw", "clean")
+
+    @property
+    def best_variant(self) -> str:
+        return self.variants[-1]
+
+    def render(self, variant: str = "raw") -> str:
+        if variant not in self.variants:
+            raise KeyError(f"{self.name} has no {variant!r} variant")
+        template = self.rollup_sql if variant == "rollup" else self.sql
+        return template.format(**SOURCES[variant])
+
+
+METRICS = [
+    Metric(
+        name="daily_trips",
+        series=("d", "trips"),
+        sql="""
+    SELECT date(tpep_pickup_datetime) AS d, COUNT(*) AS trips
+    FROM {trip}
+    GROUP BY d
+    ORDER BY d
+    """,
+        rollup_sql="""
+    SELECT d, SUM(trips)::bigint AS trips
+    FROM {daily_vendor}
+    GROUP BY d
+    ORDER BY d
+    """,
+    ),
+    Metric(
+        name="avg_fare_by_vendor",
+        sql="""
+    SELECT vendor_id, AVG(fare_amount) AS avg_fare
+    FROM {trip}
+    GROUP BY vendor_id
+    ORDER BY avg_fare DESC
+    """,
+    ),
+    Metric(
+        name="total_distance_by_pickup",
+        sql="""
+    SELECT pu_location_id, SUM(trip_distance) AS total_miles
+    FROM {trip}
+    GROUP BY pu_location_id
+    ORDER BY total_miles DESC
+    LIMIT 50
+    """,
+    ),
+    Metric(
+        name="avg_tip_by_payment",
+        sql="""
+    SELECT payment_type, AVG(tip_amount) AS avg_tip
+    FROM {trip}
+    GROUP BY payment_type
+    ORDER BY avg_tip DESC
+    """,
+    ),
+    Metric(
+        name="monthly_revenue_by_dropoff",
+        query_class="heavy",
+        sql="""
+    SELECT date_trunc('month', tpep_dropoff_datetime) AS month, do_location_id, SUM(total_amount) AS revenue
+    FROM {trip}
+    GROUP BY month, do_location_id
+    ORDER BY month, revenue DESC
+    LIMIT 500
+    """,
+    ),
+    Metric(
+        name="rolling_7day_avg_trips",
+        series=("d", "avg_7d"),
+        sql="""
+    WITH daily AS (
+        SELECT date(tpep_pickup_datetime) AS d, COUNT(*) AS trips
+        FROM {trip}
+        GROUP BY d
+    )
+    SELECT d,
+           AVG(trips) OVER (ORDER BY d ROWS BETWEEN 6 PRECEDING AND CURRENT ROW) AS avg_7d
+    FROM daily
+    ORDER BY d
+    """,
+        rollup_sql="""
+    WITH daily AS (
+        SELECT d, SUM(trips) AS trips
+        FROM {daily_vendor}
+        GROUP BY d
+    )
+    SELECT d,
+           AVG(trips) OVER (ORDER BY d ROWS BETWEEN 6 PRECEDING AND CURRENT ROW) AS avg_7d
+    FROM daily
+    ORDER BY d
+    """,
+    ),
+    Metric(
+        name="top10_pairs_by_revenue",
+        query_class="heavy",
+        sql="""
+    SELECT pu_location_id, do_location_id, SUM(total_amount) AS revenue
+    FROM {trip}
+    GROUP BY pu_location_id, do_location_id
+    ORDER BY revenue DESC
+    LIMIT 10
+    """,
+    ),
+    Metric(
+        name="daily_p90_distance",
+        series=("d", "p90"),
+        query_class="heavy",
+        sql="""
+    SELECT d, percentile_cont(0.90) WITHIN GROUP (ORDER BY trip_distance) AS p90
+    FROM (
+        SELECT date(tpep_pickup_datetime) AS d, trip_distance
+        FROM {trip}
+    ) t
+    GROUP BY d
+    ORDER BY d
+    """,
+    ),
+    Metric(
+        name="neighborhood_tip_ranking",
+        query_class="heavy",
+        sql="""
+    SELECT l.zone, AVG(CASE WHEN fare_amount > 0 THEN (tip_amount / fare_amount) ELSE 0 END) AS tip_ratio
+    FROM {trip} t
+    JOIN {location} l ON l.location_id = t.do_location_id
+    GROUP BY l.zone
+    ORDER BY tip_ratio DESC
+    LIMIT 50
+    """,
+    ),
+    Metric(
+        name="vendor_95th_percentile_days",
+        query_class="heavy",
+        sql="""
+    WITH daily_vendor AS (
+        SELECT date(tpep_pickup_datetime) AS d, vendor_id, COUNT(*) AS trips
+        FROM {trip}
+        GROUP BY d, vendor_id
+    ),
+    percentile AS (
+        SELECT d, percentile_cont(0.95) WITHIN GROUP (ORDER BY trips) AS p95
+        FROM daily_vendor
+        GROUP BY d
+    )
+    SELECT dv.d, dv.vendor_id, dv.trips, p.p95
+    FROM daily_vendor dv
+    JOIN percentile p ON p.d = dv.d
+    WHERE dv.trips > p.p95
+    ORDER BY dv.d, dv.trips DESC
+    """,
+        rollup_sql="""
+    WITH daily_vendor AS (
+        SELECT d, vendor_id, trips
+        FROM {daily_vendor}
+    ),
+    percentile AS (
+        SELECT d, percentile_cont(0.95) WITHIN GROUP (ORDER BY trips) AS p95
+        FROM daily_vendor
+        GROUP BY d
+    )
+    SELECT dv.d, dv.vendor_id, dv.trips, p.p95
+    FROM daily_vendor dv
+    JOIN percentile p ON p.d = dv.d
+    WHERE dv.trips > p.p95
+    ORDER BY dv.d, dv.trips DESC
+    """,
+    ),
+]
+
+BY_NAME = {m.name: m for m in METRICS}
@@ -0,0 +1,117 @@
+"""
+Shape-preserving downsampling of ordered series for charts.
+
+``?points=N`` on metrics that declare ``Metric.series`` returns at most N of
+the result rows, picked by Largest-Triangle-Three-Buckets (default) or, with
+``?downsample=minmax``, the lowest and highest row of each bucket. Rows are
+selected, never interpolated, and the first and last row are always kept.
+The ETag covers the query string, so every N is cached on its own.
+Only JSON responses can be downsampled; NULL values count as 0 when choosing.
+"""
+from datetime import date, datetime
+
+import numpy as np
+
+from analytics.formats import requested_format
+
+MIN_POINTS = 4
+MAX_POINTS = 10_000
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Indices of the `n` rows kept by Largest-Triangle-Three-Buckets.
+    """
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    # n - 2 buckets over the inner rows; bucket averages come from prefix sums
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    widths = np.diff(edges)
+    csx = np.concatenate([[0.0], np.cumsum(x)])
+    csy = np.concatenate([[0.0], np.cumsum(y)])
+    avg_x = (csx[edges[1:]] - csx[edges[:-1]]) / widths
+    avg_y = (csy[edges[1:]] - csy[edges[:-1]]) / widths
+    # The third vertex for bucket b is the average of bucket b + 1 (the last row for the final bucket)
+    cx = np.append(avg_x[1:], x[-1])
+    cy = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for b in range(n - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs((x[a] - cx[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy[b] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[b + 1] = a
+    return out
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum row of (n - 2) / 2 equal buckets, plus both ends.
+    """
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    buckets = (n - 2) // 2
+    edges = np.linspace(0, size, buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    starts = edges[:-1]
+    lowest = np.lexsort((y, bucket))[starts]
+    highest = np.lexsort((-y, bucket))[starts]
+    return np.unique(np.concatenate([[0, size - 1], lowest, highest]))
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def requested(request, series: tuple[str, str] | None) -> tuple[int, str] | None:
+    """
+    (points, method) asked for with ``?points=N&downsample=lttb|minmax``, or None. Raises ValueError.
+    """
+    raw = request.GET.get("points")
+    if not raw:
+        return None
+    if series is None:
+        raise ValueError("points is only supported for time series metrics")
+    if requested_format(request) != "json":
+        raise ValueError("points is only supported for JSON responses")
+    try:
+        points = int(raw)
+    except ValueError:
+        raise ValueError("points must be an integer")
+    if not MIN_POINTS <= points <= MAX_POINTS:
+        raise ValueError(f"points must be between {MIN_POINTS} and {MAX_POINTS}")
+    method = request.GET.get("downsample", "lttb")
+    if method not in METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(METHODS)}")
+    return points, method
+
+
+def _axis(values: list) -> np.ndarray:
+    first = next((v for v in values if v is not None), None)
+    if isinstance(first, datetime):
+        return np.fromiter((v.timestamp() for v in values), dtype=np.float64, count=len(values))
+    if isinstance(first, date):
+        return np.fromiter((v.toordinal() for v in values), dtype=np.float64, count=len(values))
+    if isinstance(first, (int, float)):
+        return np.asarray(values, dtype=np.float64)
+    return np.arange(len(values), dtype=np.float64)
+
+
+def select(rows: list[dict], series: tuple[str, str], points: int, method: str = "lttb") -> list[dict]:
+    if len(rows) <= points:
+        return rows
+    x_key, y_key = series
+    x = _axis([r[x_key] for r in rows])
+    y = np.fromiter((0.0 if r[y_key] is None else r[y_key] for r in rows), dtype=np.float64, count=len(rows))
+    return [rows[i] for i in METHODS[method](x, np.nan_to_num(y), points)]
+
+
+def timed(result: dict, series: tuple[str, str] | None, ds: tuple[int, str] | None) -> dict:
+    # V2/V3 envelope: "rows" stays the full count, "points" is what was sent
+    if ds is None:
+        return result
+    data = select(result["data"], series, *ds)
+    return {**result, "points": len(data), "downsample": ds[1], "data": data}
@@ -0,0 +1,168 @@
+"""
+Response formats for analytics results.
+
+``json`` is the legacy shape (list of row dicts, or the V2 timed envelope) and
+is built in memory. ``columnar`` and ``arrow`` are streamed from a server-side
+cursor, one ``fetchmany`` chunk at a time, so peak memory does not grow with
+the size of the result:
+
+- ``columnar``: ``{"columns": [...], "data": {col: [...]}, "rows": n}``
+- ``arrow``:    Apache Arrow IPC stream, one record batch per fetch chunk
+
+The format is picked with ``?format=`` or, failing that, the ``Accept`` header.
+"""
+import json
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from core.streams import ChunkSink
+from perfmetrics.utils import stream_sql_logged
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_MEDIA_TYPE = "application/vnd.nyt.columnar+json"
+
+FORMATS = ("json", "columnar", "arrow")
+
+# Per-column spool kept in memory up to this size, then moved to a temp file
+COLUMN_SPOOL_BYTES = 1024 * 1024
+
+
+def requested_format(request) -> str:
+    fmt = request.GET.get("format")
+    if fmt in FORMATS:
+        return fmt
+    accept = request.headers.get("Accept", "")
+    if ARROW_STREAM_MEDIA_TYPE in accept:
+        return "arrow"
+    if COLUMNAR_MEDIA_TYPE in accept:
+        return "columnar"
+    return "json"
+
+
+class ColumnarJSONEncoder:
+    """
+    Stream ``{"columns": [...], "data": {col: [...]}}``.
+
+    Values are appended to one spooled buffer per column while chunks arrive and
+    the document is emitted column by column at the end, so memory stays bounded
+    by ``COLUMN_SPOOL_BYTES`` per column rather than by the number of rows.
+    """
+    content_type = "application/json"
+
+    def __init__(self, timed: bool = False):
+        self.timed = timed
+        self.columns: list[str] = []
+        self.spools: list = []
+        self.counts: list[int] = []
+
+    def write(self, columns, types, rows) -> bytes:
+        if not self.spools:
+            self.columns = list(columns)
+            self.spools = [tempfile.SpooledTemporaryFile(max_size=COLUMN_SPOOL_BYTES) for _ in self.columns]
+            self.counts = [0] * len(self.columns)
+        for i, values in enumerate(zip(*rows)):
+            spool = self.spools[i]
+            for v in values:
+                if self.counts[i]:
+                    spool.write(b",")
+                spool.write(json.dumps(v, cls=DjangoJSONEncoder).encode())
+                self.counts[i] += 1
+        return b""
+
+    def close(self, rows: int, elapsed_ms: float):
+        yield b'{"columns":' + json.dumps(self.columns).encode() + b',"data":{'
+        for i, (name, spool) in enumerate(zip(self.columns, self.spools)):
+            yield (b"," if i else b"") + json.dumps(name).encode() + b":["
+            spool.seek(0)
+            while True:
+                block = spool.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+            spool.close()
+            yield b"]"
+        tail = {"rows": rows}
+        if self.timed:
+            tail["elapsed_ms"] = elapsed_ms
+        yield b"}," + json.dumps(tail)[1:].encode()
+
+
+# Postgres type OID -> Arrow type factory; anything else is sent as its string form
+PG_ARROW_TYPES = {
+    16: lambda pa: pa.bool_(),
+    20: lambda pa: pa.int64(),
+    21: lambda pa: pa.int16(),
+    23: lambda pa: pa.int32(),
+    26: lambda pa: pa.int64(),
+    700: lambda pa: pa.float32(),
+    701: lambda pa: pa.float64(),
+    1700: lambda pa: pa.float64(),
+    1082: lambda pa: pa.date32(),
+    1083: lambda pa: pa.time64("us"),
+    1114: lambda pa: pa.timestamp("us"),
+    1184: lambda pa: pa.timestamp("us", tz="UTC"),
+}
+
+
+class ArrowStreamEncoder:
+    """
+    Stream an Arrow IPC stream. The schema comes from the cursor's column type
+    OIDs and is written before any rows, so all-NULL chunks and empty results
+    still give a valid stream; NUMERIC values are sent as float64 since
+    Postgres precision is unbounded.
+    """
+    content_type = ARROW_STREAM_MEDIA_TYPE
+
+    def __init__(self, timed: bool = False):
+        # An IPC stream has no envelope for the timing summary; accepted like the other encoders
+        import pyarrow as pa
+        self.pa = pa
+        self.sink = ChunkSink()
+        self.writer = None
+        self.schema = None
+
+    def _schema(self, columns, types):
+        pa = self.pa
+        return pa.schema([
+            (name, PG_ARROW_TYPES[oid](pa) if oid in PG_ARROW_TYPES else pa.string())
+            for name, oid in zip(columns, types)
+        ])
+
+    def _array(self, values, type):
+        pa = self.pa
+        if pa.types.is_floating(type):
+            values = [float(v) if v is not None else None for v in values]
+        elif pa.types.is_string(type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        return pa.array(values, type=type)
+
+    def write(self, columns, types, rows) -> bytes:
+        pa = self.pa
+        if self.writer is None:
+            self.schema = self._schema(columns, types)
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+        if rows:
+            arrays = [self._array(list(v), f.type) for v, f in zip(zip(*rows), self.schema)]
+            self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+
+    def close(self, rows: int, elapsed_ms: float):
+        if self.writer is not None:
+            self.writer.close()
+        yield self.sink.drain()
+
+
+ENCODERS = {
+    "columnar": ColumnarJSONEncoder,
+    "arrow": ArrowStreamEncoder,
+}
+
+
+def stream_sql_response(fmt: str, timed: bool = False, **run_kwargs) -> StreamingHttpResponse:
+    """
+    Run SQL through ``perfmetrics.utils.stream_sql_logged`` and stream it in ``fmt``.
+    """
+    encoder = ENCODERS[fmt](timed=timed)
+    return StreamingHttpResponse(stream_sql_logged(encoder=encoder, **run_kwargs), content_type=encoder.content_type)
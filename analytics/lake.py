@@ -0,0 +1,195 @@
+"""
+Lake engine: the analytics metrics answered from the local Parquet trip lake
+(``core.lake``) with ``pyarrow.dataset`` scans and ``pyarrow.compute`` group-bys
+instead of Postgres. Selected per request with ``?engine=lake`` on the V2 API.
+
+Each metric reads only the columns it needs; optional ``start``/``end`` pickup
+bounds are pushed down to the year/month partitions and row-group statistics.
+Results use the same keys and ordering as the SQL versions; percentiles are
+exact (``percentile_cont`` semantics).
+"""
+from datetime import datetime, time as dtime, timezone as tz
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from django.utils.dateparse import parse_date
+
+from analytics import snapshots
+from analytics.timeseries import trailing_mean
+from core import lake
+from core.models import Location
+
+
+def pickup_filter(start: str | None = None, end: str | None = None):
+    """
+    Dataset filter for start <= date(pickup) <= end, with matching partition
+    bounds so whole year=/month= directories are skipped.
+    """
+    expr = None
+    year, month = pc.field("year"), pc.field("month")
+    if start:
+        d = parse_date(start)
+        if d is None:
+            raise ValueError(f"Invalid start date: {start!r}")
+        lo = datetime.combine(d, dtime.min, tzinfo=tz.utc)
+        expr = (pc.field("tpep_pickup_datetime") >= pa.scalar(lo, pa.timestamp("us", tz="UTC"))) & (
+            (year > d.year) | ((year == d.year) & (month >= d.month))
+        )
+    if end:
+        d = parse_date(end)
+        if d is None:
+            raise ValueError(f"Invalid end date: {end!r}")
+        hi = datetime.combine(d, dtime.max, tzinfo=tz.utc)
+        e = (pc.field("tpep_pickup_datetime") <= pa.scalar(hi, pa.timestamp("us", tz="UTC"))) & (
+            (year < d.year) | ((year == d.year) & (month <= d.month))
+        )
+        expr = e if expr is None else expr & e
+    return expr
+
+
+def _scan(columns: dict, filter=None) -> pa.Table:
+    return lake.open_dataset().to_table(columns=columns, filter=filter)
+
+
+def _pickup_date():
+    return pc.field("tpep_pickup_datetime").cast(pa.date32())
+
+
+def _rows(table: pa.Table, limit: int | None = None) -> list[dict]:
+    if limit is not None:
+        table = table.slice(0, limit)
+    return table.to_pylist()
+
+
+def _grouped_percentile_cont(keys: np.ndarray, values: np.ndarray, q: float):
+    """
+    Exact percentile_cont(q) of `values` within each key. Returns (keys, percentiles).
+    """
+    order = np.lexsort((values, keys))
+    k, v = keys[order], values[order].astype(np.float64)
+    uniq, starts, counts = np.unique(k, return_index=True, return_counts=True)
+    pos = starts + q * (counts - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    return uniq, v[lo] + (v[hi] - v[lo]) * (pos - lo)
+
+
+def _group(t: pa.Table, keys: list[str], aggs: list[tuple[str, str, str]]) -> pa.Table:
+    """
+    Group `t` by `keys` with (column, function, output name) aggregations and
+    return the keys followed by the named aggregates.
+    """
+    g = t.group_by(keys).aggregate([(col, fn) for col, fn, _ in aggs])
+    g = g.rename_columns({f"{col}_{fn}": name for col, fn, name in aggs})
+    return g.select(keys + [name for _, _, name in aggs])
+
+
+def _daily_counts(filter=None) -> pa.Table:
+    t = _scan({"d": _pickup_date()}, filter)
+    return _group(t, ["d"], [("d", "count", "trips")]).sort_by("d")
+
+
+def daily_trips(filter=None):
+    return _rows(_daily_counts(filter))
+
+
+def avg_fare_by_vendor(filter=None):
+    t = _scan({"vendor_id": pc.field("vendor_id"), "fare_amount": pc.field("fare_amount")}, filter)
+    t = _group(t, ["vendor_id"], [("fare_amount", "mean", "avg_fare")])
+    return _rows(t.sort_by([("avg_fare", "descending")]))
+
+
+def total_distance_by_pickup(filter=None):
+    t = _scan({"pu_location_id": pc.field("pu_location_id"), "trip_distance": pc.field("trip_distance")}, filter)
+    t = _group(t, ["pu_location_id"], [("trip_distance", "sum", "total_miles")])
+    return _rows(t.sort_by([("total_miles", "descending")]), limit=50)
+
+
+def avg_tip_by_payment(filter=None):
+    t = _scan({"payment_type": pc.field("payment_type"), "tip_amount": pc.field("tip_amount")}, filter)
+    t = _group(t, ["payment_type"], [("tip_amount", "mean", "avg_tip")])
+    return _rows(t.sort_by([("avg_tip", "descending")]))
+
+
+def monthly_revenue_by_dropoff(filter=None):
+    t = _scan({
+        "month": pc.floor_temporal(pc.field("tpep_dropoff_datetime"), unit="month"),
+        "do_location_id": pc.field("do_location_id"),
+        "total_amount": pc.field("total_amount"),
+    }, filter)
+    t = _group(t, ["month", "do_location_id"], [("total_amount", "sum", "revenue")])
+    return _rows(t.sort_by([("month", "ascending"), ("revenue", "descending")]), limit=500)
+
+
+def rolling_7day_avg_trips(filter=None):
+    daily = _daily_counts(filter)
+    avg = trailing_mean(daily.column("trips").to_numpy(), 7)
+    return [{"d": d, "avg_7d": float(a)} for d, a in zip(daily.column("d").to_pylist(), avg)]
+
+
+def top10_pairs_by_revenue(filter=None):
+    t = _scan({
+        "pu_location_id": pc.field("pu_location_id"),
+        "do_location_id": pc.field("do_location_id"),
+        "total_amount": pc.field("total_amount"),
+    }, filter)
+    t = _group(t, ["pu_location_id", "do_location_id"], [("total_amount", "sum", "revenue")])
+    return _rows(t.sort_by([("revenue", "descending")]), limit=10)
+
+
+def daily_p90_distance(filter=None):
+    t = _scan({"d": _pickup_date(), "trip_distance": pc.field("trip_distance")}, filter)
+    days, p90 = _grouped_percentile_cont(t.column("d").to_numpy(), t.column("trip_distance").to_numpy(), 0.90)
+    return [{"d": d, "p90": float(p)} for d, p in zip(days.astype(object), p90)]
+
+
+def neighborhood_tip_ranking(filter=None):
+    fare = pc.field("fare_amount")
+    ratio = pc.if_else(fare > 0, pc.divide(pc.field("tip_amount"), fare), pa.scalar(0.0))
+    t = _scan({"do_location_id": pc.field("do_location_id"), "ratio": ratio}, filter)
+    per_loc = _group(t, ["do_location_id"], [("ratio", "sum", "ratio_sum"), ("ratio", "count", "ratio_count")])
+
+    # Inner join on the (small) zone table, then re-group by zone name
+    zones = snapshots.zone_names() or dict(Location.objects.values_list("location_id", "zone"))
+    acc: dict[str, list[float]] = {}
+    for loc, s, c in zip(*(per_loc.column(n).to_pylist() for n in ("do_location_id", "ratio_sum", "ratio_count"))):
+        zone = zones.get(loc)
+        if zone is None:
+            continue
+        a = acc.setdefault(zone, [0.0, 0])
+        a[0] += s or 0.0
+        a[1] += c
+    ranked = sorted(((z, s / c) for z, (s, c) in acc.items() if c), key=lambda r: r[1], reverse=True)
+    return [{"zone": z, "tip_ratio": r} for z, r in ranked[:50]]
+
+
+def vendor_95th_percentile_days(filter=None):
+    t = _scan({"d": _pickup_date(), "vendor_id": pc.field("vendor_id")}, filter)
+    dv = _group(t, ["d", "vendor_id"], [("d", "count", "trips")])
+    d = dv.column("d").to_numpy()
+    trips = dv.column("trips").to_numpy()
+    days, p95 = _grouped_percentile_cont(d, trips, 0.95)
+    p = p95[np.searchsorted(days, d)]
+    keep = trips > p
+    out = pa.table({
+        "d": dv.column("d").filter(pa.array(keep)),
+        "vendor_id": dv.column("vendor_id").filter(pa.array(keep)),
+        "trips": pa.array(trips[keep]),
+        "p95": pa.array(p[keep]),
+    })
+    return _rows(out.sort_by([("d", "ascending"), ("trips", "descending")]))
+
+
+METRICS = {
+    "daily_trips": daily_trips,
+    "avg_fare_by_vendor": avg_fare_by_vendor,
+    "total_distance_by_pickup": total_distance_by_pickup,
+    "avg_tip_by_payment": avg_tip_by_payment,
+    "monthly_revenue_by_dropoff": monthly_revenue_by_dropoff,
+    "rolling_7day_avg_trips": rolling_7day_avg_trips,
+    "top10_pairs_by_revenue": top10_pairs_by_revenue,
+    "daily_p90_distance": daily_p90_distance,
+    "neighborhood_tip_ranking": neighborhood_tip_ranking,
+    "vendor_95th_percentile_days": vendor_95th_percentile_days,
+}
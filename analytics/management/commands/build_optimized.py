@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from analytics import optimize
+from core import dataversion
+
+
+class Command(BaseCommand):
+    help = "Build trip_clean and trip_daily_vendor for the clean/rollup catalog variants (v2 ?optimized=1, v3)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", choices=sorted(optimize.BUILD_STEPS), help="Build only this table")
+
+    def handle(self, *args, **options):
+        tables = [options["table"]] if options["table"] else list(optimize.BUILD_STEPS)
+        for table in tables:
+            ms = optimize.build(table)
+            self.stdout.write(self.style.SUCCESS(f"Built {table} in {ms:.0f} ms"))
+        # Responses cached against the old tables must not be revalidated
+        dataversion.bump()
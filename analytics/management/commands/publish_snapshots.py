@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics import snapshots
+
+
+class Command(BaseCommand):
+    help = "Publish memory-mapped Arrow snapshots of hot aggregates for the web workers."
+
+    def handle(self, *args, **options):
+        if not snapshots.enabled():
+            raise CommandError("ANALYTICS_SNAPSHOT_DIR is not set")
+        res = snapshots.publish_timed()
+        self.stdout.write(self.style.SUCCESS(f"Published snapshot {res['version']} in {res['elapsed_ms']} ms"))
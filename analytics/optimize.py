@@ -0,0 +1,118 @@
+"""
+Builds the tables behind the ``clean`` and ``rollup`` catalog variants.
+
+- ``trip_clean``: trips with a non-negative duration, indexed for the metrics
+- ``trip_daily_vendor``: trips/miles/revenue per pickup day and vendor, from
+  ``trip_clean`` so the ``clean`` and ``rollup`` variants agree (build it second)
+
+Each table is built under a temporary name and swapped in within one
+transaction, so readers never see a half-built table. ``refresh()`` rebuilds
+both after ingestion (``analytics.tasks.refresh_after_ingest``) and bumps the
+data version, so cached responses computed from the previous tables expire.
+Until the tables exist, ``available_variant()`` makes v3 fall back to ``raw``.
+"""
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import dataversion
+from NYT.routers import analytics_db
+
+# Serializes rebuilds across workers: concurrent builds would collide on the __new tables
+REFRESH_LOCK_KEY = 7_304_213
+
+BUILD_STEPS = {
+    "trip_clean": [
+        """
+        CREATE TABLE trip_clean__new AS
+        SELECT * FROM core_trip
+        WHERE tpep_dropoff_datetime >= tpep_pickup_datetime
+          AND trip_distance >= 0 AND fare_amount >= 0 AND total_amount >= 0
+        ORDER BY tpep_pickup_datetime
+        """,
+        "CREATE INDEX ON trip_clean__new USING brin (tpep_pickup_datetime)",
+        "CREATE INDEX ON trip_clean__new (do_location_id)",
+        "ANALYZE trip_clean__new",
+    ],
+    "trip_daily_vendor": [
+        """
+        CREATE TABLE trip_daily_vendor__new AS
+        SELECT date(tpep_pickup_datetime) AS d, vendor_id,
+               COUNT(*) AS trips,
+               SUM(trip_distance)::float8 AS miles,
+               SUM(total_amount) AS revenue
+        FROM trip_clean
+        GROUP BY 1, 2
+        """,
+        "CREATE UNIQUE INDEX ON trip_daily_vendor__new (d, vendor_id)",
+        "ANALYZE trip_daily_vendor__new",
+    ],
+}
+
+
+def build(table: str, using: str = DEFAULT_DB_ALIAS) -> float:
+    """
+    (Re)build one optimized table; returns elapsed ms.
+    """
+    t0 = time.perf_counter()
+    with connections[using].cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table}__new")
+        for step in BUILD_STEPS[table]:
+            cur.execute(step)
+        with transaction.atomic(using=using):
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+            cur.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def build_all(using: str = DEFAULT_DB_ALIAS) -> dict[str, float]:
+    return {table: build(table, using) for table in BUILD_STEPS}
+
+
+def refresh(using: str = DEFAULT_DB_ALIAS) -> dict[str, float]:
+    """
+    Rebuild all tables from the current core_trip and bump the data version.
+    """
+    with connections[using].cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", [REFRESH_LOCK_KEY])
+        try:
+            timings = build_all(using)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", [REFRESH_LOCK_KEY])
+    dataversion.bump()
+    return timings
+
+
+# Tables only appear or change through a build, which bumps the data version
+_existing = {"version": None, "tables": frozenset()}
+_existing_lock = threading.Lock()
+
+
+def existing_tables() -> frozenset:
+    version = dataversion.current()
+    if _existing["version"] != version:
+        with _existing_lock:
+            if _existing["version"] != version:
+                with connections[analytics_db()].cursor() as cur:
+                    cur.execute("SELECT t FROM unnest(%s::text[]) t WHERE to_regclass(t) IS NOT NULL",
+                                [list(BUILD_STEPS)])
+                    _existing["tables"] = frozenset(r[0] for r in cur.fetchall())
+                _existing["version"] = version
+    return _existing["tables"]
+
+
+VARIANT_TABLES = {
+    "raw": (),
+    "clean": ("trip_clean",),
+    "rollup": ("trip_clean", "trip_daily_vendor"),
+}
+
+
+def available_variant(metric) -> str:
+    # Best variant of `metric` whose tables have been built
+    tables = existing_tables()
+    for variant in reversed(metric.variants):
+        if all(t in tables for t in VARIANT_TABLES[variant]):
+            return variant
+    return "raw"
@@ -0,0 +1,230 @@
+"""
+In-process engine for rolling statistics over daily series.
+
+The per-day totals (trips, miles, revenue) are loaded once per data version
+into NumPy arrays, from the published snapshot if there is one, otherwise from
+the ``trip_daily_vendor`` rollup, otherwise from ``core_trip``. Missing days
+are filled with 0, so windows and lags are calendar days (the SQL
+``rolling_7day_avg_trips`` counts rows instead). Every rolling mean, sum,
+min/max, quantile or period-over-period delta is then computed from those
+arrays (``analytics.timeseries``); asking for another window costs no query.
+Order statistics (min/max/median/pNN) materialise a days x window matrix, so
+their windows are capped at ``MAX_ORDER_WINDOW`` and they run as ``heavy``
+queries under admission control.
+
+Served by ``/api/v3/series/?metric=trips&window=7,30&stat=mean,p90&delta=364``.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+from django.db import connections
+from django.utils.dateparse import parse_date
+
+from analytics import snapshots
+from analytics.timeseries import (
+    period_delta, trailing_max, trailing_mean, trailing_min, trailing_quantile, trailing_sum,
+)
+from core import dataversion
+from NYT.routers import analytics_db
+
+METRICS = ("trips", "miles", "revenue")
+MAX_WINDOW = 3660
+MAX_ORDER_WINDOW = 366
+MAX_COLUMNS = 32
+
+SERIES_SQL = {
+    "rollup": """
+        SELECT d, SUM(trips)::float8, SUM(miles)::float8, SUM(revenue)::float8
+        FROM trip_daily_vendor
+        GROUP BY d
+        ORDER BY d
+    """,
+    "raw": """
+        SELECT date(tpep_pickup_datetime) AS d, COUNT(*)::float8,
+               SUM(trip_distance)::float8, SUM(total_amount)::float8
+        FROM core_trip
+        GROUP BY d
+        ORDER BY d
+    """,
+}
+
+STATS = {
+    "mean": trailing_mean,
+    "sum": trailing_sum,
+    "min": trailing_min,
+    "max": trailing_max,
+    "median": lambda v, w: trailing_quantile(v, w, 0.5),
+}
+# Computed from prefix sums, cheap for any window
+LINEAR_STATS = ("mean", "sum")
+
+
+@dataclass(frozen=True)
+class DailySeries:
+    days: np.ndarray  # datetime64[D], one entry per calendar day
+    columns: dict
+    source: str
+
+    @classmethod
+    def dense(cls, days: np.ndarray, columns: dict, source: str) -> "DailySeries":
+        if not len(days):
+            return cls(days.astype("datetime64[D]"), {m: np.zeros(0) for m in METRICS}, source)
+        days = days.astype("datetime64[D]")
+        full = np.arange(days.min(), days.max() + 1)
+        pos = (days - full[0]).astype(np.int64)
+        out = {}
+        for name, values in columns.items():
+            filled = np.zeros(len(full))
+            filled[pos] = np.nan_to_num(np.asarray(values, dtype=np.float64))
+            out[name] = filled
+        return cls(full, out, source)
+
+
+def _from_snapshot() -> DailySeries:
+    daily = snapshots.load("daily")
+    return DailySeries.dense(
+        daily.column("d").to_numpy(),
+        {m: daily.column(m).to_numpy(zero_copy_only=False) for m in METRICS},
+        "snapshot",
+    )
+
+
+def _from_db() -> DailySeries:
+    with connections[analytics_db()].cursor() as cur:
+        cur.execute("SELECT to_regclass('trip_daily_vendor') IS NOT NULL")
+        source = "rollup" if cur.fetchone()[0] else "raw"
+        cur.execute(SERIES_SQL[source])
+        rows = cur.fetchall()
+    days = np.array([r[0] for r in rows], dtype="datetime64[D]")
+    return DailySeries.dense(
+        days, {m: np.array([r[i + 1] for r in rows], dtype=np.float64) for i, m in enumerate(METRICS)}, source,
+    )
+
+
+def load() -> DailySeries:
+    if snapshots.enabled() and snapshots.current_version() is not None:
+        return _from_snapshot()
+    return _from_db()
+
+
+_cache = {"key": None, "series": None}
+_lock = threading.Lock()
+
+
+def current() -> DailySeries:
+    """
+    The daily series for the current data (and snapshot) version, loaded at most once per process.
+    """
+    key = dataversion.current()
+    if snapshots.enabled():
+        key = f"{key}:{snapshots.current_version()}"
+    if _cache["key"] != key:
+        with _lock:
+            if _cache["key"] != key:
+                _cache["series"] = load()
+                _cache["key"] = key
+    return _cache["series"]
+
+
+@dataclass(frozen=True)
+class SeriesQuery:
+    metric: str = "trips"
+    windows: tuple[int, ...] = (7,)
+    stats: tuple[str, ...] = ("mean",)
+    deltas: tuple[int, ...] = ()
+    start: date | None = None
+    end: date | None = None
+
+    @property
+    def query_class(self) -> str:
+        return "light" if all(s in LINEAR_STATS for s in self.stats) else "heavy"
+
+    def describe(self) -> str:
+        return (f"series:{self.metric} window={','.join(map(str, self.windows))} stat={','.join(self.stats)}"
+                f" delta={','.join(map(str, self.deltas))} start={self.start} end={self.end}")
+
+
+def _days(value: str, name: str) -> tuple[int, ...]:
+    try:
+        out = tuple(int(v) for v in value.split(",") if v.strip())
+    except ValueError:
+        raise ValueError(f"{name} takes day counts, e.g. 7,30")
+    if any(not 1 <= n <= MAX_WINDOW for n in out):
+        raise ValueError(f"{name} must be between 1 and {MAX_WINDOW} days")
+    return out
+
+
+def _stat(name: str) -> str:
+    # mean/sum/min/max/median or a percentile pNN
+    if name in STATS or (name[:1] == "p" and name[1:].isdigit() and 1 <= int(name[1:]) <= 99):
+        return name
+    raise ValueError(f"Unknown stat {name!r} (mean, sum, min, max, median or p1..p99)")
+
+
+def _date(value: str | None, name: str) -> date | None:
+    if not value:
+        return None
+    d = parse_date(value)
+    if d is None:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+    return d
+
+
+def parse(params) -> SeriesQuery:
+    """
+    SeriesQuery from ``metric``, ``window``, ``stat``, ``delta``, ``start`` and ``end``. Raises ValueError.
+    """
+    metric = params.get("metric", "trips")
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+    q = SeriesQuery(
+        metric=metric,
+        windows=_days(params.get("window", "7"), "window"),
+        stats=tuple(_stat(s.strip()) for s in params.get("stat", "mean").split(",") if s.strip()),
+        deltas=_days(params.get("delta", ""), "delta"),
+        start=_date(params.get("start"), "start"),
+        end=_date(params.get("end"), "end"),
+    )
+    if len(q.windows) * len(q.stats) + 2 * len(q.deltas) > MAX_COLUMNS:
+        raise ValueError(f"At most {MAX_COLUMNS} computed columns per request")
+    if q.query_class == "heavy" and max(q.windows, default=0) > MAX_ORDER_WINDOW:
+        raise ValueError(f"min, max, median and percentiles take windows of at most {MAX_ORDER_WINDOW} days")
+    return q
+
+
+def _compute(values: np.ndarray, stat: str, window: int) -> np.ndarray:
+    if stat in STATS:
+        return STATS[stat](values, window)
+    return trailing_quantile(values, window, int(stat[1:]) / 100.0)
+
+
+def _json_values(a: np.ndarray) -> list:
+    # NaN is not valid JSON
+    return np.where(np.isnan(a), None, np.round(a, 4)).tolist()
+
+
+def evaluate(q: SeriesQuery, series: DailySeries | None = None) -> list[dict]:
+    """
+    One row per day in [start, end]: the metric, each stat per window and each delta.
+    Windows and lags reach back before `start`, so the first rows are complete.
+    """
+    s = series or current()
+    values = s.columns[q.metric]
+    columns = {q.metric: values}
+    for stat in q.stats:
+        for window in q.windows:
+            columns[f"{stat}_{window}d"] = _compute(values, stat, window)
+    for lag in q.deltas:
+        columns[f"delta_{lag}d"], columns[f"delta_{lag}d_pct"] = period_delta(values, lag)
+
+    lo, hi = 0, len(s.days)
+    if q.start:
+        lo = int(np.searchsorted(s.days, np.datetime64(q.start, "D")))
+    if q.end:
+        hi = int(np.searchsorted(s.days, np.datetime64(q.end, "D"), side="right"))
+    out = {"d": s.days[lo:hi].astype(object).tolist()}
+    out.update((name, _json_values(a[lo:hi])) for name, a in columns.items())
+    names = list(out)
+    return [dict(zip(names, row)) for row in zip(*out.values())]
@@ -0,0 +1,183 @@
+"""
+Shared, memory-mapped snapshots of hot aggregates.
+
+After ingestion, ``publish()`` computes a few small aggregate tables once and
+writes them as uncompressed Arrow IPC files into a new version directory under
+``ANALYTICS_SNAPSHOT_DIR``, then atomically repoints the ``CURRENT`` file at it.
+Every web worker memory-maps the files of the current version (zero-copy, so
+all processes share the same page-cache pages) and only reopens them when
+``CURRENT`` changes; there is no per-worker warm-up or private copy.
+
+Served through ``?engine=snapshot`` on the V2 API for the metrics listed in
+``METRICS``; the zone table is also used by the lake engine.
+"""
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection
+
+from analytics.timeseries import trailing_mean
+from core import dataversion
+
+CURRENT_NAME = "CURRENT"
+KEEP_VERSIONS = 3
+
+SNAPSHOT_SQL = {
+    # One row per day; enough for the daily/rolling series and the time-series engine
+    "daily": """
+        SELECT date(tpep_pickup_datetime) AS d,
+               COUNT(*) AS trips,
+               SUM(trip_distance)::float8 AS miles,
+               SUM(total_amount)::float8 AS revenue,
+               SUM(tip_amount)::float8 AS tips
+        FROM core_trip
+        GROUP BY d
+        ORDER BY d
+    """,
+    "pickup_totals": """
+        SELECT pu_location_id, SUM(trip_distance)::float8 AS total_miles, COUNT(*) AS trips
+        FROM core_trip
+        GROUP BY pu_location_id
+        ORDER BY total_miles DESC
+    """,
+    "zones": """
+        SELECT location_id, borough, zone, service_zone
+        FROM core_location
+        ORDER BY location_id
+    """,
+}
+
+_state = {"mtime_ns": None, "version": None, "tables": {}}
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "ANALYTICS_SNAPSHOT_DIR", ""))
+
+
+def snapshot_dir() -> str:
+    return str(settings.ANALYTICS_SNAPSHOT_DIR)
+
+
+def _query_table(sql: str):
+    import pyarrow as pa
+
+    with connection.cursor() as cur:
+        cur.execute(sql)
+        cols = [c[0] for c in cur.description]
+        rows = cur.fetchall()
+    return pa.table({c: list(v) for c, v in zip(cols, zip(*rows))} if rows else {c: [] for c in cols})
+
+
+def publish() -> str:
+    """
+    Build all snapshots into a fresh version directory and switch CURRENT to it.
+    """
+    import pyarrow as pa
+
+    base = snapshot_dir()
+    os.makedirs(base, exist_ok=True)
+    version = f"{dataversion.current()}-{uuid.uuid4().hex[:8]}"
+    tmp = os.path.join(base, f".tmp-{version}")
+    os.makedirs(tmp)
+    try:
+        for name, sql in SNAPSHOT_SQL.items():
+            table = _query_table(sql)
+            with pa.OSFile(os.path.join(tmp, f"{name}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        os.rename(tmp, os.path.join(base, version))
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(base, CURRENT_NAME)
+    with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(f"{pointer}.tmp", pointer)
+    _prune(base, keep=version)
+    return version
+
+
+def _prune(base: str, keep: str) -> None:
+    # Old versions may still be mapped by workers; unlinking is safe on POSIX
+    versions = sorted(
+        (d for d in os.listdir(base) if not d.startswith(".") and os.path.isdir(os.path.join(base, d))),
+        key=lambda d: os.path.getmtime(os.path.join(base, d)),
+    )
+    for d in versions[:-KEEP_VERSIONS]:
+        if d != keep:
+            shutil.rmtree(os.path.join(base, d), ignore_errors=True)
+
+
+def current_version() -> str | None:
+    pointer = os.path.join(snapshot_dir(), CURRENT_NAME)
+    try:
+        mtime_ns = os.stat(pointer).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime_ns != _state["mtime_ns"]:
+        with open(pointer, encoding="utf-8") as f:
+            version = f.read().strip()
+        # Drop the old mappings; the next load() maps the new version
+        _state.update(mtime_ns=mtime_ns, version=version, tables={version: {}})
+    return _state["version"]
+
+
+def load(name: str):
+    """
+    The snapshot table `name` of the current version, memory-mapped. Raises
+    LookupError if nothing has been published yet.
+    """
+    import pyarrow as pa
+
+    version = current_version()
+    if version is None:
+        raise LookupError("No analytics snapshot has been published")
+    # Cached per version: another thread may switch versions between the lines above and below
+    tables = _state["tables"].setdefault(version, {})
+    table = tables.get(name)
+    if table is None:
+        source = pa.memory_map(os.path.join(snapshot_dir(), version, f"{name}.arrow"), "r")
+        table = pa.ipc.open_file(source).read_all()
+        tables[name] = table
+    return table
+
+
+def zone_names() -> dict[int, str] | None:
+    if not enabled():
+        return None
+    try:
+        zones = load("zones")
+    except (LookupError, FileNotFoundError):
+        return None
+    return dict(zip(zones.column("location_id").to_pylist(), zones.column("zone").to_pylist()))
+
+
+def daily_trips():
+    return load("daily").select(["d", "trips"]).to_pylist()
+
+
+def rolling_7day_avg_trips():
+    daily = load("daily")
+    avg = trailing_mean(daily.column("trips").to_numpy(), 7)
+    return [{"d": d, "avg_7d": float(a)} for d, a in zip(daily.column("d").to_pylist(), avg)]
+
+
+def total_distance_by_pickup():
+    return load("pickup_totals").select(["pu_location_id", "total_miles"]).slice(0, 50).to_pylist()
+
+
+METRICS = {
+    "daily_trips": daily_trips,
+    "rolling_7day_avg_trips": rolling_7day_avg_trips,
+    "total_distance_by_pickup": total_distance_by_pickup,
+}
+
+
+def publish_timed() -> dict:
+    t0 = time.perf_counter()
+    version = publish()
+    return {"version": version, "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 2)}
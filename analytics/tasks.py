@@ -0,0 +1,18 @@
+from celery import shared_task
+
+from analytics import optimize, snapshots
+
+
+@shared_task
+def publish_snapshots():
+    # Rebuild the shared Arrow snapshots after ingestion; no-op when disabled
+    if not snapshots.enabled():
+        return None
+    return snapshots.publish_timed()
+
+
+@shared_task
+def refresh_after_ingest():
+    # New trips: rebuild trip_clean/trip_daily_vendor (v3, ?optimized=1), then the snapshots
+    timings = optimize.refresh()
+    return {"optimize_ms": {t: round(ms, 2) for t, ms in timings.items()}, "snapshots": publish_snapshots()}
@@ -1,3 +1,227 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+import numpy as np
+from django.test import RequestFactory, SimpleTestCase
+
+from analytics import downsample, series
+from analytics.timeseries import (
+    period_delta, trailing_max, trailing_mean, trailing_min, trailing_quantile, trailing_sum,
+)
+
+
+class LttbTests(SimpleTestCase):
+    def test_returns_all_rows_when_n_covers_the_series(self):
+        x = np.arange(5, dtype=np.float64)
+        self.assertEqual(downsample.lttb(x, x, 5).tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(downsample.lttb(x, x, 50).tolist(), [0, 1, 2, 3, 4])
+
+    def test_keeps_ends_and_one_row_per_bucket(self):
+        size, n = 101, 12
+        x = np.arange(size, dtype=np.float64)
+        y = np.sin(x / 5.0)
+        out = downsample.lttb(x, y, n)
+        self.assertEqual(len(out), n)
+        self.assertEqual((out[0], out[-1]), (0, size - 1))
+        # Inner row b comes from [edges[b], edges[b + 1]) over rows 1 .. size - 2
+        edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+        for b, idx in enumerate(out[1:-1]):
+            self.assertTrue(edges[b] <= idx < edges[b + 1], (b, idx))
+
+    def test_keeps_a_spike(self):
+        x = np.arange(101, dtype=np.float64)
+        y = np.zeros(101)
+        y[37] = 100.0
+        self.assertIn(37, downsample.lttb(x, y, 10).tolist())
+
+
+class MinMaxTests(SimpleTestCase):
+    def test_returns_all_rows_when_n_covers_the_series(self):
+        y = np.array([3.0, 1.0, 2.0])
+        self.assertEqual(downsample.minmax(np.arange(3.0), y, 4).tolist(), [0, 1, 2])
+
+    def test_four_points_is_one_bucket_plus_ends(self):
+        y = np.array([5.0, 1.0, 9.0, 3.0, 7.0, 2.0])
+        self.assertEqual(downsample.minmax(np.arange(6.0), y, 4).tolist(), [0, 1, 2, 5])
+
+    def test_min_and_max_per_bucket(self):
+        # (6 - 2) // 2 = 2 buckets: rows 0-4 and 5-9
+        y = np.array([4.0, 0.0, 3.0, 8.0, 1.0, 6.0, 2.0, 9.0, 5.0, 7.0])
+        self.assertEqual(downsample.minmax(np.arange(10.0), y, 6).tolist(), [0, 1, 3, 6, 7, 9])
+
+    def test_bucket_edges_do_not_overlap(self):
+        y = np.arange(10, dtype=np.float64)
+        self.assertEqual(downsample.minmax(np.arange(10.0), y, 6).tolist(), [0, 4, 5, 9])
+
+
+class SelectTests(SimpleTestCase):
+    def rows(self, n):
+        start = date(2024, 1, 1)
+        return [{"d": start + timedelta(days=i), "v": float(i % 7)} for i in range(n)]
+
+    def test_short_series_unchanged(self):
+        rows = self.rows(10)
+        self.assertIs(downsample.select(rows, ("d", "v"), 10), rows)
+
+    def test_keeps_first_and_last_row(self):
+        rows = self.rows(500)
+        for method in downsample.METHODS:
+            out = downsample.select(rows, ("d", "v"), 20, method)
+            self.assertLessEqual(len(out), 20)
+            self.assertIs(out[0], rows[0])
+            self.assertIs(out[-1], rows[-1])
+            self.assertEqual([r["d"] for r in out], sorted(r["d"] for r in out))
+
+    def test_null_values_count_as_zero(self):
+        rows = self.rows(100)
+        rows[50]["v"] = None
+        self.assertEqual(len(downsample.select(rows, ("d", "v"), 10)), 10)
+
+    def test_timed_keeps_the_full_row_count(self):
+        rows = self.rows(100)
+        result = downsample.timed({"rows": 100, "data": rows}, ("d", "v"), (10, "lttb"))
+        self.assertEqual((result["rows"], result["points"], result["downsample"]), (100, 10, "lttb"))
+        self.assertEqual(len(result["data"]), 10)
+
+
+class RequestedTests(SimpleTestCase):
+    def requested(self, query, series=("d", "trips")):
+        return downsample.requested(RequestFactory().get("/", query), series)
+
+    def test_no_points(self):
+        self.assertIsNone(self.requested({}))
+
+    def test_defaults_to_lttb(self):
+        self.assertEqual(self.requested({"points": "100"}), (100, "lttb"))
+        self.assertEqual(self.requested({"points": "100", "downsample": "minmax"}), (100, "minmax"))
+
+    def test_rejects_invalid_requests(self):
+        for query, kwargs in [
+            ({"points": "x"}, {}),
+            ({"points": str(downsample.MIN_POINTS - 1)}, {}),
+            ({"points": str(downsample.MAX_POINTS + 1)}, {}),
+            ({"points": "100", "downsample": "avg"}, {}),
+            ({"points": "100", "format": "arrow"}, {}),
+            ({"points": "100"}, {"series": None}),
+        ]:
+            with self.subTest(query=query, **kwargs), self.assertRaises(ValueError):
+                self.requested(query, **kwargs)
+
+
+def sql_window(values, window):
+    # What ROWS BETWEEN window-1 PRECEDING AND CURRENT ROW sees for every row
+    return [values[max(0, i - window + 1):i + 1] for i in range(len(values))]
+
+
+class TimeseriesTests(SimpleTestCase):
+    values = [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0]
+
+    def test_trailing_stats_match_sql_windows(self):
+        for window in (1, 3, 5, len(self.values) + 2):
+            frames = sql_window(self.values, window)
+            with self.subTest(window=window):
+                np.testing.assert_allclose(trailing_mean(self.values, window), [np.mean(f) for f in frames])
+                np.testing.assert_allclose(trailing_sum(self.values, window), [np.sum(f) for f in frames])
+                np.testing.assert_allclose(trailing_min(self.values, window), [np.min(f) for f in frames])
+                np.testing.assert_allclose(trailing_max(self.values, window), [np.max(f) for f in frames])
+                np.testing.assert_allclose(trailing_quantile(self.values, window, 0.9),
+                                           [np.percentile(f, 90) for f in frames])
+
+    def test_period_delta(self):
+        delta, pct = period_delta([2.0, 0.0, 3.0, 6.0], 2)
+        np.testing.assert_allclose(delta, [np.nan, np.nan, 1.0, 6.0])
+        # No percentage against a zero
+        np.testing.assert_allclose(pct, [np.nan, np.nan, 50.0, np.nan])
+
+    def test_empty_input(self):
+        for fn in (trailing_mean, trailing_sum, trailing_min, trailing_max):
+            self.assertEqual(len(fn([], 7)), 0)
+        self.assertEqual(len(trailing_quantile([], 7, 0.5)), 0)
+
+    def test_period_delta_lag_beyond_series(self):
+        for lag in (3, 10):
+            delta, pct = period_delta([1.0, 2.0, 3.0], lag)
+            self.assertTrue(np.isnan(delta).all())
+            self.assertTrue(np.isnan(pct).all())
+
+
+class DailySeriesTests(SimpleTestCase):
+    def test_dense_fills_missing_days_with_zero(self):
+        days = np.array(["2024-01-01", "2024-01-04"], dtype="datetime64[D]")
+        s = series.DailySeries.dense(days, {"trips": [1.0, np.nan]}, "raw")
+        self.assertEqual(s.days.astype(object).tolist(), [date(2024, 1, 1) + timedelta(days=i) for i in range(4)])
+        self.assertEqual(s.columns["trips"].tolist(), [1.0, 0.0, 0.0, 0.0])
+
+    def test_dense_empty(self):
+        s = series.DailySeries.dense(np.array([], dtype="datetime64[D]"), {}, "raw")
+        self.assertEqual(len(s.days), 0)
+        self.assertEqual(set(s.columns), set(series.METRICS))
+
+    def test_evaluate_empty_series(self):
+        # No trips loaded yet: every stat, including the order statistics, gives no rows
+        s = series.DailySeries.dense(np.array([], dtype="datetime64[D]"), {}, "raw")
+        q = series.SeriesQuery(windows=(7, 30), stats=("mean", "sum", "min", "max", "median", "p90"), deltas=(7,))
+        self.assertEqual(series.evaluate(q, s), [])
+
+
+class SeriesParseTests(SimpleTestCase):
+    def test_defaults(self):
+        q = series.parse({})
+        self.assertEqual((q.metric, q.windows, q.stats, q.deltas), ("trips", (7,), ("mean",), ()))
+        self.assertEqual(q.query_class, "light")
+
+    def test_order_statistics_are_heavy(self):
+        self.assertEqual(series.parse({"stat": "mean,p90"}).query_class, "heavy")
+        self.assertEqual(series.parse({"stat": "sum,median"}).query_class, "heavy")
+
+    def test_rejects_invalid_parameters(self):
+        for params in [
+            {"metric": "tips"},
+            {"window": "0"},
+            {"window": "7,x"},
+            {"window": str(series.MAX_WINDOW + 1)},
+            {"delta": "0"},
+            {"stat": "avg"},
+            {"stat": "p100"},
+            {"stat": "p0"},
+            {"start": "2024-13-01"},
+            {"end": "yesterday"},
+            {"window": str(series.MAX_ORDER_WINDOW + 1), "stat": "median"},
+            {"window": "1,2,3,4,5,6,7,8,9", "stat": "mean,sum,min,max"},
+        ]:
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                series.parse(params)
+
+    def test_long_windows_for_linear_stats(self):
+        q = series.parse({"window": str(series.MAX_WINDOW), "stat": "mean,sum"})
+        self.assertEqual(q.windows, (series.MAX_WINDOW,))
+
+
+class SeriesEvaluateTests(SimpleTestCase):
+    def setUp(self):
+        days = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-11"))
+        self.series = series.DailySeries.dense(
+            days, {m: np.arange(1.0, 11.0) for m in series.METRICS}, "raw",
+        )
+
+    def test_columns_per_stat_window_and_delta(self):
+        q = series.SeriesQuery(windows=(3,), stats=("mean", "sum", "max", "p50"), deltas=(2,))
+        rows = series.evaluate(q, self.series)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(list(rows[0]), ["d", "trips", "mean_3d", "sum_3d", "max_3d", "p50_3d",
+                                         "delta_2d", "delta_2d_pct"])
+        self.assertEqual(rows[0], {"d": date(2024, 1, 1), "trips": 1.0, "mean_3d": 1.0, "sum_3d": 1.0,
+                                   "max_3d": 1.0, "p50_3d": 1.0, "delta_2d": None, "delta_2d_pct": None})
+        self.assertAlmostEqual(rows[4].pop("delta_2d_pct"), 66.6667)
+        self.assertEqual(rows[4], {"d": date(2024, 1, 5), "trips": 5.0, "mean_3d": 4.0, "sum_3d": 12.0,
+                                   "max_3d": 5.0, "p50_3d": 4.0, "delta_2d": 2.0})
+
+    def test_start_end_slice_keeps_earlier_days_in_windows(self):
+        q = series.SeriesQuery(windows=(3,), deltas=(2,), start=date(2024, 1, 3), end=date(2024, 1, 5))
+        rows = series.evaluate(q, self.series)
+        self.assertEqual([r["d"] for r in rows], [date(2024, 1, 3), date(2024, 1, 4), date(2024, 1, 5)])
+        self.assertEqual(rows[0]["mean_3d"], 2.0)
+        self.assertEqual(rows[0]["delta_2d"], 2.0)
+
+    def test_range_outside_the_series(self):
+        q = series.SeriesQuery(start=date(2025, 1, 1))
+        self.assertEqual(series.evaluate(q, self.series), [])
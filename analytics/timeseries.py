@@ -0,0 +1,68 @@
+"""
+Vectorized helpers for daily time series held in NumPy arrays.
+"""
+import numpy as np
+
+
+def trailing_mean(values, window: int) -> np.ndarray:
+    """
+    Mean over the current and up to `window - 1` preceding rows, like
+    ``AVG(...) OVER (ORDER BY d ROWS BETWEEN window-1 PRECEDING AND CURRENT ROW)``.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    csum = np.concatenate([[0.0], np.cumsum(v)])
+    idx = np.arange(len(v))
+    lo = np.maximum(idx - (window - 1), 0)
+    return (csum[idx + 1] - csum[lo]) / (idx + 1 - lo)
+
+
+def trailing_sum(values, window: int) -> np.ndarray:
+    """
+    Sum over the current and up to `window - 1` preceding rows.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    csum = np.concatenate([[0.0], np.cumsum(v)])
+    idx = np.arange(len(v))
+    lo = np.maximum(idx - (window - 1), 0)
+    return csum[idx + 1] - csum[lo]
+
+
+def _trailing_windows(values, window: int) -> np.ndarray:
+    # (rows, window) view; the first rows see NaN where the window starts before the series
+    v = np.asarray(values, dtype=np.float64)
+    if not len(v):
+        return np.empty((0, window))
+    padded = np.concatenate([np.full(window - 1, np.nan), v])
+    return np.lib.stride_tricks.sliding_window_view(padded, window)
+
+
+def trailing_quantile(values, window: int, q: float) -> np.ndarray:
+    """
+    Linear-interpolated quantile `q` (0..1) of each trailing window, like ``percentile_cont``.
+    """
+    windows = _trailing_windows(values, window)
+    if not len(windows):
+        return np.empty(0)
+    return np.nanquantile(windows, q, axis=1)
+
+
+def trailing_min(values, window: int) -> np.ndarray:
+    return np.nanmin(_trailing_windows(values, window), axis=1)
+
+
+def trailing_max(values, window: int) -> np.ndarray:
+    return np.nanmax(_trailing_windows(values, window), axis=1)
+
+
+def period_delta(values, lag: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (difference, percent change) against the row `lag` positions earlier; NaN where there is none.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    prev = np.full_like(v, np.nan)
+    if lag < len(v):
+        prev[lag:] = v[:len(v) - lag]
+    delta = v - prev
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(prev != 0, delta / prev * 100.0, np.nan)
+    return delta, pct
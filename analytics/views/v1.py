@@ -1,129 +1,38 @@
 # V1
-from django.http import JsonResponse
-from django.db import connection
 
-from perfmetrics.utils import run_sql_logged_return_data  # <-- add
-
-def run_sql(sql: str, params=None):
-    # Keep the old V1 JSON shape; just log internally
-    # Label will be like "V1.<view_name>"
-    import inspect
-    caller = inspect.stack()[1].function  # view function name
-    label = f"V1.{caller}"
-    data = run_sql_logged_return_data(sql=sql, label=label, view_name=caller, optimized=False, params=params)
-    return data
-
-
-def daily_trips(request):
-    sql = """
-    SELECT date(tpep_pickup_datetime) AS d, COUNT(*) AS trips
-    FROM core_trip
-    GROUP BY d
-    ORDER BY d
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def avg_fare_by_vendor(request):
-    sql = """
-    SELECT vendor_id, AVG(fare_amount) AS avg_fare
-    FROM core_trip
-    GROUP BY vendor_id
-    ORDER BY avg_fare DESC
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def total_distance_by_pickup(request):
-    sql = """
-    SELECT pu_location_id, SUM(trip_distance) AS total_miles
-    FROM core_trip
-    GROUP BY pu_location_id
-    ORDER BY total_miles DESC
-    LIMIT 50
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def avg_tip_by_payment(request):
-    sql = """
-    SELECT payment_type, AVG(tip_amount) AS avg_tip
-    FROM core_trip
-    GROUP BY payment_type
-    ORDER BY avg_tip DESC
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def monthly_revenue_by_dropoff(request):
-    sql = """
-    SELECT date_trunc('month', tpep_dropoff_datetime) AS month, do_location_id, SUM(total_amount) AS revenue
-    FROM core_trip
-    GROUP BY month, do_location_id
-    ORDER BY month, revenue DESC
-    LIMIT 500
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def rolling_7day_avg_trips(request):
-    sql = """
-    WITH daily AS (
-        SELECT date(tpep_pickup_datetime) AS d, COUNT(*) AS trips
-        FROM core_trip
-        GROUP BY d
-    )
-    SELECT d,
-           AVG(trips) OVER (ORDER BY d ROWS BETWEEN 6 PRECEDING AND CURRENT ROW) AS avg_7d
-    FROM daily
-    ORDER BY d
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def top10_pairs_by_revenue(request):
-    sql = """
-    SELECT pu_location_id, do_location_id, SUM(total_amount) AS revenue
-    FROM core_trip
-    GROUP BY pu_location_id, do_location_id
-    ORDER BY revenue DESC
-    LIMIT 10
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def daily_p90_distance(request):
-    sql = """
-    SELECT d, percentile_cont(0.90) WITHIN GROUP (ORDER BY trip_distance) AS p90
-    FROM (
-        SELECT date(tpep_pickup_datetime) AS d, trip_distance
-        FROM core_trip
-    ) t
-    GROUP BY d
-    ORDER BY d
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def neighborhood_tip_ranking(request):
-    sql = """
-    SELECT l.zone, AVG(CASE WHEN fare_amount > 0 THEN (tip_amount / fare_amount) ELSE 0 END) AS tip_ratio
-    FROM core_trip t
-    JOIN core_location l ON l.location_id = t.do_location_id
-    GROUP BY l.zone
-    ORDER BY tip_ratio DESC
-    LIMIT 50
-    """
-    return JsonResponse(run_sql(sql), safe=False)
-
-def vendor_95th_percentile_days(request):
-    sql = """
-    WITH daily_vendor AS (
-        SELECT date(tpep_pickup_datetime) AS d, vendor_id, COUNT(*) AS trips
-        FROM core_trip
-        GROUP BY d, vendor_id
-    ),
-    percentile AS (
-        SELECT d, percentile_cont(0.95) WITHIN GROUP (ORDER BY trips) AS p95
-        FROM daily_vendor
-        GROUP BY d
-    )
-    SELECT dv.d, dv.vendor_id, dv.trips, p.p95
-    FROM daily_vendor dv
-    JOIN percentile p ON p.d = dv.d
-    WHERE dv.trips > p.p95
-    ORDER BY dv.d, dv.trips DESC
-    """
-    return JsonResponse(run_sql(sql), safe=False)
+from django.http import HttpResponseBadRequest
+
+from analytics import downsample
+from analytics.caching import data_versioned
+from analytics.catalog import METRICS
+from analytics.formats import requested_format, stream_sql_response
+from perfmetrics.admission import guard
+from perfmetrics.timing import json_response
+from perfmetrics.utils import run_sql_logged_return_data
+
+
+def make_view(metric):
+    # Legacy JSON list by default; ?format=columnar|arrow streams from a server-side cursor.
+    # Label and SQL are fixed per metric, so nothing is looked up per request.
+    label = f"V1.{metric.name}"
+    sql = metric.render("raw")
+
+    @guard
+    def view(request):
+        try:
+            ds = downsample.requested(request, metric.series)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        fmt = requested_format(request)
+        if fmt == "json":
+            data = run_sql_logged_return_data(sql=sql, label=label, view_name=metric.name, optimized=False, **metric.run_options)
+            if ds:
+                data = downsample.select(data, metric.series, *ds)
+            return json_response(data, safe=False)
+        return stream_sql_response(fmt, sql=sql, label=label, view_name=metric.name, optimized=False, **metric.run_options)
+
+    view.__name__ = view.__qualname__ = metric.name
+    return data_versioned(view) if metric.cacheable else view
+
+
+VIEWS = {m.name: make_view(m) for m in METRICS}
@@ -0,0 +1,71 @@
+#V3
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from analytics import downsample, optimize, series as series_engine
+from analytics.caching import data_versioned
+from analytics.catalog import METRICS
+from analytics.views.v2 import engine_switch, respond_timed
+from core import dataversion
+from perfmetrics.admission import guard
+from perfmetrics.timing import json_response
+from perfmetrics.utils import run_logged_return_timed
+
+
+def make_view(metric):
+    # Optimized by default: each metric runs against the best source it declares
+    # (rollup where available, otherwise trip_clean), or raw until those are built
+    sources = {
+        v: (metric.render(v), f"V3.{metric.name}" if v == metric.best_variant else f"V3.{metric.name}.{v}")
+        for v in metric.variants
+    }
+
+    @guard
+    def view(request):
+        variant = optimize.available_variant(metric)
+        sql, label = sources[variant]
+        return respond_timed(request, sql, label, metric.name, variant != "raw", metric.run_options, metric.series)
+
+    view.__name__ = view.__qualname__ = metric.name
+    view = engine_switch(view, metric.name, version="V3", series=metric.series, query_class=metric.query_class)
+    return data_versioned(view) if metric.cacheable else view
+
+
+VIEWS = {m.name: make_view(m) for m in METRICS}
+
+
+@staff_member_required
+@require_POST
+def build_optimized(request):
+    # (Re)build trip_clean and the rollups the v3 queries read from
+    table = request.GET.get("table")
+    if table:
+        if table not in optimize.BUILD_STEPS:
+            return JsonResponse({"error": f"Unknown table {table!r}"}, status=400)
+        timings = {table: optimize.build(table)}
+        dataversion.bump()
+    else:
+        timings = optimize.refresh()
+    return JsonResponse({"elapsed_ms": {t: round(ms, 2) for t, ms in timings.items()}})
+
+
+@require_GET
+@guard
+def series(request):
+    # Rolling stats and period-over-period deltas of a daily series, computed in-process
+    try:
+        q = series_engine.parse(request.GET)
+        ds = downsample.requested(request, ("d", q.metric))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    result = run_logged_return_timed(
+        lambda: series_engine.evaluate(q), label=f"V3.series.{q.metric}", view_name="series", sql_text=q.describe(),
+        query_class=q.query_class,
+    )
+    result["source"] = series_engine.current().source
+    return json_response(downsample.timed(result, ("d", q.metric), ds))
+
+
+# The daily series is read from the published snapshot when there is one
+series = data_versioned(series, snapshot_backed=True)
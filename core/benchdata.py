@@ -0,0 +1,105 @@
+"""
+Scale-factor benchmark datasets in the dedicated ``bench`` database.
+
+``populate(scale)`` replaces ``core_trip`` / ``core_location`` in the bench
+database with ``scale * SCALE_ROWS`` synthetic trips (``core.synthetic`` with
+hour/weekday and zone skew, pickups over one year) plus the matching zone
+table, streamed with COPY. The same scale and seed always give the same data,
+so latency-vs-rows curves can be reproduced offline on any machine.
+
+The loaded dataset is recorded as a comment on ``core_trip``; populating the
+same scale and seed again is a no-op unless forced. The optimized tables
+(``trip_clean`` / ``trip_daily_vendor``) are dropped on reload since they would
+describe the previous dataset.
+"""
+import io
+
+import pyarrow.csv as pacsv
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import lake, synthetic
+from core.models import Location, Trip
+from NYT.routers import BENCH_ALIAS
+from perfmetrics import prom
+
+SCALE_ROWS = 1_000_000
+START = "2024-01-01"
+DAYS = 366
+TRIP_COLUMNS = list(lake.SOURCE_COLUMNS.values())
+
+
+def require_alias(using: str = BENCH_ALIAS) -> None:
+    # populate() truncates core_trip: never let it run against anything but the bench database
+    if using != BENCH_ALIAS:
+        raise ValueError(f"Benchmark data can only be loaded into the {BENCH_ALIAS!r} database, not {using!r}")
+    if using not in settings.DATABASES:
+        raise ValueError(f"No {using!r} database configured (set BENCH_DB_NAME)")
+    bench, default = settings.DATABASES[using], settings.DATABASES[DEFAULT_DB_ALIAS]
+    if (bench.get("NAME"), bench.get("HOST") or "", str(bench.get("PORT") or "")) == (
+            default.get("NAME"), default.get("HOST") or "", str(default.get("PORT") or "")):
+        raise ValueError(f"The {using!r} database points at the default database ({bench.get('NAME')!r}); "
+                         "set BENCH_DB_NAME to a separate database")
+
+
+def _tag(scale: int, seed: int) -> str:
+    return f"benchdata sf={scale} seed={seed} rows={scale * SCALE_ROWS}"
+
+
+def loaded(using: str = BENCH_ALIAS) -> str | None:
+    """
+    Tag of the dataset currently in the bench database, if any.
+    """
+    with connections[using].cursor() as cur:
+        cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", [Trip._meta.db_table])
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _copy(cur, table: str, columns: list[str], buf: io.BytesIO) -> None:
+    buf.seek(0)
+    prom.count_copy_bytes("in", buf.getbuffer().nbytes)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT CSV, NULL '')", buf)
+
+
+def populate(scale: int, seed: int = 0, using: str = BENCH_ALIAS, force: bool = False, log=None) -> dict:
+    """
+    Load scale factor `scale` into `using`; returns {"scale", "rows", "skipped"}.
+    """
+    require_alias(using)
+    rows = scale * SCALE_ROWS
+    tag = _tag(scale, seed)
+    call_command("migrate", "core", database=using, verbosity=0)
+    if not force and loaded(using) == tag:
+        return {"scale": scale, "rows": rows, "skipped": True}
+
+    trip_table, loc_table = Trip._meta.db_table, Location._meta.db_table
+    with connections[using].cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS trip_clean, trip_daily_vendor")
+        cur.execute(f"TRUNCATE {trip_table}, {loc_table}")
+        cur.execute(f"COMMENT ON TABLE {trip_table} IS NULL")
+        # Bulk load: nothing here needs to survive a crash mid-load
+        cur.execute("SET synchronous_commit = off")
+
+        buf = io.StringIO()
+        for loc in synthetic.locations():
+            buf.write(",".join(str(v) for v in loc) + "\n")
+        _copy(cur, loc_table, ["location_id", "borough", "zone", "service_zone"], io.BytesIO(buf.getvalue().encode()))
+
+        done = 0
+        # Ingestion drops negative amounts, so the dataset has none
+        for chunk in synthetic.chunks(rows, seed=seed, negative_rate=0.0, tz_aware=True, start=START, days=DAYS):
+            table = chunk.select(list(lake.SOURCE_COLUMNS)).rename_columns(TRIP_COLUMNS)
+            out = io.BytesIO()
+            pacsv.write_csv(table, out, pacsv.WriteOptions(include_header=False))
+            _copy(cur, trip_table, TRIP_COLUMNS, out)
+            done += table.num_rows
+            if log:
+                log(f"sf={scale}: {done}/{rows} rows")
+
+        cur.execute(f"ANALYZE {trip_table}")
+        cur.execute(f"ANALYZE {loc_table}")
+        cur.execute(f"COMMENT ON TABLE {trip_table} IS %s", [tag])
+        cur.execute("RESET synchronous_commit")
+    return {"scale": scale, "rows": rows, "skipped": False}
@@ -0,0 +1,42 @@
+"""
+Ingest data version.
+
+A token stored in a small local file and replaced whenever trips or zones are
+ingested. Readers (e.g. analytics ETags) only stat the file, so they can tell
+whether data changed without touching the database.
+"""
+import os
+import time
+
+from django.conf import settings
+
+_cache = {"mtime_ns": None, "version": "0"}
+
+
+def _path() -> str:
+    return str(settings.DATA_VERSION_FILE)
+
+
+def current() -> str:
+    path = _path()
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    if mtime_ns != _cache["mtime_ns"]:
+        with open(path, encoding="utf-8") as f:
+            _cache["version"] = f.read().strip() or "0"
+        _cache["mtime_ns"] = mtime_ns
+    return _cache["version"]
+
+
+def bump() -> str:
+    # Write-then-rename so readers never see a partial token
+    path = _path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    version = f"{time.time_ns():x}"
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, path)
+    return version
@@ -0,0 +1,238 @@
+"""
+Raw trip export streamed from ``COPY (SELECT ...) TO STDOUT``.
+
+Rows never become Python objects: Postgres writes CSV into an OS pipe from a
+helper thread and the caller reads it in fixed-size blocks. Parquet is produced
+by feeding that same CSV stream through pyarrow's streaming CSV reader into an
+incremental ``ParquetWriter``, one row group per block. Memory stays constant
+whatever the size of the slice. Timestamps are exported as UTC.
+"""
+import os
+import threading
+from datetime import datetime, time as dtime, timezone as tz
+
+from django.db import connections
+
+from NYT.routers import analytics_db
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.models import Trip
+from core.streams import ChunkSink
+from perfmetrics import prom
+
+EXPORT_COLUMNS = [
+    "vendor_id",
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "passenger_count",
+    "trip_distance",
+    "ratecode_id",
+    "store_and_fwd_flag",
+    "pu_location_id",
+    "do_location_id",
+    "payment_type",
+    "fare_amount",
+    "extra",
+    "mta_tax",
+    "tip_amount",
+    "tolls_amount",
+    "total_amount",
+]
+TIMESTAMP_COLUMNS = ("tpep_pickup_datetime", "tpep_dropoff_datetime")
+
+READ_BLOCK_BYTES = 1024 * 1024
+PARQUET_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def _parse_when(value: str, end: bool = False):
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValueError(f"Invalid date/datetime: {value!r}")
+        dt = datetime.combine(d, dtime.max if end else dtime.min)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone=tz.utc)
+    return dt
+
+
+def _parse_ids(value: str) -> list[int]:
+    try:
+        return [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid id list: {value!r}")
+
+
+def parse_filters(params) -> dict:
+    """
+    Build export filters from a QueryDict / dict: start, end (ISO date or datetime,
+    end inclusive), vendor, pu, do (comma-separated ids). Raises ValueError.
+    """
+    filters = {}
+    if params.get("start"):
+        filters["start"] = _parse_when(params["start"])
+    if params.get("end"):
+        filters["end"] = _parse_when(params["end"], end=True)
+    for key in ("vendor", "pu", "do"):
+        if params.get(key):
+            filters[key] = _parse_ids(params[key])
+    return filters
+
+
+def build_copy_sql(cur, filters: dict) -> str:
+    where, params = [], []
+    if "start" in filters:
+        where.append("tpep_pickup_datetime >= %s")
+        params.append(filters["start"])
+    if "end" in filters:
+        where.append("tpep_pickup_datetime <= %s")
+        params.append(filters["end"])
+    for key, col in (("vendor", "vendor_id"), ("pu", "pu_location_id"), ("do", "do_location_id")):
+        if key in filters:
+            where.append(f"{col} = ANY(%s)")
+            params.append(filters[key])
+
+    cols = ", ".join(
+        f"{c} AT TIME ZONE 'UTC' AS {c}" if c in TIMESTAMP_COLUMNS else c for c in EXPORT_COLUMNS
+    )
+    select = f"SELECT {cols} FROM {Trip._meta.db_table}"
+    if where:
+        select += " WHERE " + " AND ".join(where)
+    # COPY does not take bind parameters, so interpolate them client-side
+    select = cur.mogrify(select, params).decode()
+    return f"COPY ({select}) TO STDOUT WITH (FORMAT CSV, HEADER)"
+
+
+class _CountingWriter:
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.nbytes = 0
+
+    def write(self, data):
+        self.nbytes += len(data)
+        return self._fileobj.write(data)
+
+
+def copy_csv_to(fileobj, filters: dict, using: str | None = None) -> None:
+    out = _CountingWriter(fileobj)
+    try:
+        with connections[using or analytics_db()].cursor() as cur:
+            cur.copy_expert(build_copy_sql(cur, filters), out)
+    finally:
+        prom.count_copy_bytes("out", out.nbytes)
+
+
+def _start_copy_pipe(filters: dict):
+    """
+    Run COPY in a thread writing into an OS pipe and return (reader, thread, errors).
+    Closing the reader makes the writer fail with EPIPE, which aborts the COPY.
+    """
+    r, w = os.pipe()
+    reader = os.fdopen(r, "rb")
+    writer = os.fdopen(w, "wb")
+    errors: list[BaseException] = []
+    using = analytics_db()
+
+    def run():
+        try:
+            copy_csv_to(writer, filters, using)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                writer.close()
+            except OSError:
+                pass
+            # Each thread gets its own Django connection; don't leak it
+            connections[using].close()
+
+    thread = threading.Thread(target=run, name="trip-export-copy", daemon=True)
+    thread.start()
+    return reader, thread, errors
+
+
+def _finish(reader, thread, errors, completed: bool):
+    reader.close()
+    thread.join()
+    # A consumer that stops early breaks the pipe on purpose; only report real failures
+    if completed and errors:
+        raise errors[0]
+
+
+def iter_csv(filters: dict, block_size: int = READ_BLOCK_BYTES):
+    reader, thread, errors = _start_copy_pipe(filters)
+    completed = False
+    try:
+        while True:
+            block = reader.read(block_size)
+            if not block:
+                break
+            yield block
+        completed = True
+    finally:
+        _finish(reader, thread, errors, completed)
+
+
+def _arrow_schemas():
+    import pyarrow as pa
+
+    money = pa.decimal128(10, 2)
+    types = {
+        "vendor_id": pa.int16(),
+        "tpep_pickup_datetime": pa.timestamp("us"),
+        "tpep_dropoff_datetime": pa.timestamp("us"),
+        "passenger_count": pa.int16(),
+        "trip_distance": pa.float64(),
+        "ratecode_id": pa.int16(),
+        "store_and_fwd_flag": pa.string(),
+        "pu_location_id": pa.int32(),
+        "do_location_id": pa.int32(),
+        "payment_type": pa.int16(),
+        "fare_amount": money,
+        "extra": money,
+        "mta_tax": money,
+        "tip_amount": money,
+        "tolls_amount": money,
+        "total_amount": money,
+    }
+    # CSV carries naive UTC timestamps; the Parquet file records the zone
+    out = pa.schema([
+        (c, pa.timestamp("us", tz="UTC") if c in TIMESTAMP_COLUMNS else types[c]) for c in EXPORT_COLUMNS
+    ])
+    return types, out
+
+
+def iter_parquet(filters: dict, block_size: int = PARQUET_BLOCK_BYTES, compression: str = "zstd"):
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    types, schema = _arrow_schemas()
+    reader, thread, errors = _start_copy_pipe(filters)
+    completed = False
+    try:
+        batches = pacsv.open_csv(
+            reader,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=pacsv.ConvertOptions(column_types=types, strings_can_be_null=True),
+        )
+        sink = ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression=compression)
+        try:
+            for batch in batches:
+                writer.write_batch(batch.cast(schema))
+                out = sink.drain()
+                if out:
+                    yield out
+        finally:
+            writer.close()
+        yield sink.drain()
+        completed = True
+    finally:
+        _finish(reader, thread, errors, completed)
+
+
+EXPORTERS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet", "parquet"),
+}
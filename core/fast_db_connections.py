@@ -6,6 +6,7 @@ import pyarrow as pa
 import pyarrow.parquet as pq
 
 from core.models import Trip
+from perfmetrics import prom
 
 
 # Map None/NaN safely to Python types
@@ -175,6 +176,7 @@ def _ingest_parquet_fast(file_path: str) -> int:
                             tolls,
                             total,
                         ])
+                    prom.count_copy_bytes("in", buf.tell())
                     buf.seek(0)
                     # COPY expects NULL as empty by default; safer to set explicitly
                     copy_sql = f"COPY {db_table} ({', '.join(db_cols)}) FROM STDIN WITH (FORMAT CSV, NULL '');"
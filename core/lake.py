@@ -0,0 +1,414 @@
+"""
+Optional local Parquet trip lake.
+
+When ``TRIP_LAKE_DIR`` is set, every ingested trip file is also written to a
+Hive-partitioned (``year=YYYY/month=M``) Parquet dataset before the downloaded
+file is removed. Rows are cleaned with the same rules as the database load
+(non-null, non-negative distance/fare/total) and use the ``core_trip`` column
+names, with timestamps stored as UTC and money as float64.
+
+The set of live files is recorded in ``_manifest.json`` (replaced atomically
+under a lock), so ``open_dataset()`` never sees half-written files and readers
+switch to compacted files in one step. ``compact_partition()`` merges a month's
+small files into files sorted by pickup time and location, with fixed-size row
+groups whose min/max statistics let filtered scans skip most of the data.
+Replaced files are kept for ``RETIRED_GRACE_S`` so in-flight scans can finish.
+"""
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Source (TLC yellow-taxi) column -> lake column
+SOURCE_COLUMNS = {
+    "VendorID": "vendor_id",
+    "tpep_pickup_datetime": "tpep_pickup_datetime",
+    "tpep_dropoff_datetime": "tpep_dropoff_datetime",
+    "passenger_count": "passenger_count",
+    "trip_distance": "trip_distance",
+    "RatecodeID": "ratecode_id",
+    "store_and_fwd_flag": "store_and_fwd_flag",
+    "PULocationID": "pu_location_id",
+    "DOLocationID": "do_location_id",
+    "payment_type": "payment_type",
+    "fare_amount": "fare_amount",
+    "extra": "extra",
+    "mta_tax": "mta_tax",
+    "tip_amount": "tip_amount",
+    "tolls_amount": "tolls_amount",
+    "total_amount": "total_amount",
+}
+# The DB ingest stores a missing value of these as 0
+ZERO_DEFAULTS = ("vendor_id", "extra", "mta_tax", "tolls_amount")
+
+READ_BATCH_ROWS = 500_000
+
+MANIFEST_NAME = "_manifest.json"
+LOCK_NAME = "_manifest.lock"
+COMPACT_PREFIX = "compact-"
+ROW_GROUP_ROWS = 250_000
+FILE_ROWS = 8_000_000
+RETIRED_GRACE_S = 15 * 60
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "TRIP_LAKE_DIR", ""))
+
+
+def lake_dir() -> str:
+    return str(settings.TRIP_LAKE_DIR)
+
+
+def lake_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("vendor_id", pa.int16()),
+        ("tpep_pickup_datetime", pa.timestamp("us", tz="UTC")),
+        ("tpep_dropoff_datetime", pa.timestamp("us", tz="UTC")),
+        ("passenger_count", pa.int16()),
+        ("trip_distance", pa.float64()),
+        ("ratecode_id", pa.int16()),
+        ("store_and_fwd_flag", pa.string()),
+        ("pu_location_id", pa.int32()),
+        ("do_location_id", pa.int32()),
+        ("payment_type", pa.int16()),
+        ("fare_amount", pa.float64()),
+        ("extra", pa.float64()),
+        ("mta_tax", pa.float64()),
+        ("tip_amount", pa.float64()),
+        ("tolls_amount", pa.float64()),
+        ("total_amount", pa.float64()),
+        ("year", pa.int16()),
+        ("month", pa.int8()),
+    ])
+
+
+def partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive")
+
+
+def _partition_dir(year: int, month: int) -> str:
+    return f"year={year}/month={month}"
+
+
+@contextmanager
+def _locked():
+    os.makedirs(lake_dir(), exist_ok=True)
+    with open(os.path.join(lake_dir(), LOCK_NAME), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _discover_files() -> list[str]:
+    base = lake_dir()
+    found = []
+    for root, _dirs, files in os.walk(base):
+        for name in files:
+            if name.endswith(".parquet") and not name.startswith(("_", ".")):
+                found.append(os.path.relpath(os.path.join(root, name), base))
+    return sorted(found)
+
+
+def read_manifest() -> dict | None:
+    try:
+        with open(os.path.join(lake_dir(), MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(manifest: dict) -> None:
+    path = os.path.join(lake_dir(), MANIFEST_NAME)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def commit_files(added: list[str], removed: list[str] = (), require_removed: bool = False) -> dict | None:
+    """
+    Atomically publish a new file list: current files + added - removed (paths
+    relative to the lake). Removed files are retired, not deleted. With
+    `require_removed`, nothing is committed (returns None) unless every removed
+    file is still live, i.e. no one else replaced them in the meantime.
+    """
+    with _locked():
+        manifest = read_manifest() or {"version": 0, "files": _discover_files(), "retired": []}
+        if require_removed and not set(removed) <= set(manifest["files"]):
+            return None
+        gone = set(removed)
+        files = [f for f in manifest["files"] if f not in gone]
+        files += [f for f in added if f not in files]
+        now = time.time()
+        manifest = {
+            "version": manifest["version"] + 1,
+            "updated_at": now,
+            "files": sorted(files),
+            "retired": manifest.get("retired", []) + [{"path": f, "at": now} for f in removed],
+        }
+        _write_manifest(manifest)
+    return manifest
+
+
+def vacuum(grace_s: int = RETIRED_GRACE_S) -> int:
+    """
+    Delete retired files older than the grace period. Returns files deleted.
+    """
+    deleted = 0
+    with _locked():
+        manifest = read_manifest()
+        if not manifest:
+            return 0
+        keep = []
+        for r in manifest.get("retired", []):
+            if time.time() - r["at"] < grace_s:
+                keep.append(r)
+                continue
+            try:
+                os.remove(os.path.join(lake_dir(), r["path"]))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        if len(keep) != len(manifest.get("retired", [])):
+            manifest["retired"] = keep
+            _write_manifest(manifest)
+    return deleted
+
+
+def normalize_batch(batch):
+    """
+    Rename/cast a source record batch to the lake schema, drop invalid rows and
+    add the year/month partition columns (from pickup time, UTC). Missing
+    ``ZERO_DEFAULTS`` values become 0, as in the database ingest.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    schema = lake_schema()
+    n = batch.num_rows
+    names = {SOURCE_COLUMNS.get(name, name): i for i, name in enumerate(batch.schema.names)}
+    columns = {}
+    for field in schema:
+        if field.name in ("year", "month"):
+            continue
+        if field.name in names:
+            # Naive timestamps are UTC by convention; aware ones keep their instant
+            columns[field.name] = pc.cast(batch.column(names[field.name]), field.type, safe=False)
+        else:
+            columns[field.name] = pa.nulls(n, type=field.type)
+        if field.name in ZERO_DEFAULTS:
+            columns[field.name] = pc.fill_null(columns[field.name], pa.scalar(0, type=field.type))
+
+    valid = pc.and_(
+        pc.and_(pc.greater_equal(columns["trip_distance"], 0), pc.greater_equal(columns["fare_amount"], 0)),
+        pc.and_(pc.greater_equal(columns["total_amount"], 0), pc.is_valid(columns["tpep_pickup_datetime"])),
+    )
+    table = pa.table(columns).filter(valid)
+    pickup = table.column("tpep_pickup_datetime")
+    table = table.append_column("year", pc.cast(pc.year(pickup), pa.int16()))
+    table = table.append_column("month", pc.cast(pc.month(pickup), pa.int8()))
+    return table.cast(schema)
+
+
+def write_trips(file_path: str) -> int:
+    """
+    Append a source trip Parquet file to the lake. Returns rows written.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(file_path)
+    wanted = [c for c in SOURCE_COLUMNS if c in pf.schema_arrow.names]
+    written = 0
+    new_files = []
+
+    def batches():
+        nonlocal written
+        for batch in pf.iter_batches(batch_size=READ_BATCH_ROWS, columns=wanted):
+            table = normalize_batch(batch)
+            written += table.num_rows
+            yield from table.to_batches()
+
+    os.makedirs(lake_dir(), exist_ok=True)
+    ds.write_dataset(
+        batches(),
+        lake_dir(),
+        schema=lake_schema(),
+        format="parquet",
+        partitioning=partitioning(),
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda f: new_files.append(os.path.relpath(f.path, lake_dir())),
+    )
+    # Files only become visible to readers once they are in the manifest
+    commit_files(new_files)
+    return written
+
+
+def append_ingested(file_path: str) -> None:
+    """
+    Called by ingestion after the database load: keep a columnar copy of the file
+    when the lake is enabled. Failures are logged, not raised, since the rows are
+    already committed to Postgres.
+    """
+    if not enabled():
+        return
+    try:
+        write_trips(file_path)
+    except Exception:
+        logger.exception("Writing %s to the trip lake failed", file_path)
+
+
+def open_dataset(files: list[str] | None = None):
+    """
+    Dataset over the files listed in the manifest (or `files`, relative to the lake).
+    Falls back to directory discovery for a lake that predates the manifest.
+    """
+    import pyarrow.dataset as ds
+
+    if files is None:
+        manifest = read_manifest()
+        if manifest is None:
+            return ds.dataset(lake_dir(), schema=lake_schema(), format="parquet", partitioning=partitioning())
+        files = manifest["files"]
+    paths = [os.path.join(lake_dir(), f) for f in files]
+    return ds.dataset(
+        paths, schema=lake_schema(), format="parquet", partitioning=partitioning(), partition_base_dir=lake_dir(),
+    )
+
+
+def partition_files(year: int, month: int) -> list[str]:
+    manifest = read_manifest()
+    files = manifest["files"] if manifest else _discover_files()
+    prefix = _partition_dir(year, month) + "/"
+    return [f for f in files if f.startswith(prefix)]
+
+
+def partitions() -> list[tuple[int, int]]:
+    manifest = read_manifest()
+    files = manifest["files"] if manifest else _discover_files()
+    out = set()
+    for f in files:
+        parts = dict(p.split("=", 1) for p in f.split("/")[:-1] if "=" in p)
+        if "year" in parts and "month" in parts:
+            out.add((int(parts["year"]), int(parts["month"])))
+    return sorted(out)
+
+
+def needs_compaction(files: list[str]) -> bool:
+    # Ingested files are unsorted; compacted ones only need merging if there are several
+    if any(not os.path.basename(f).startswith(COMPACT_PREFIX) for f in files):
+        return True
+    return len(files) > 1 and sum(_file_rows(f) for f in files) <= FILE_ROWS
+
+
+def _file_rows(rel_path: str) -> int:
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(os.path.join(lake_dir(), rel_path)).metadata.num_rows
+
+
+def scan_stats(files: list[str]) -> dict:
+    """
+    Time a full scan and a one-day filtered scan (the partition's first day) over
+    `files`; the latter shows how much row-group pruning the layout allows.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    dataset = open_dataset(files)
+    t0 = time.perf_counter()
+    full = dataset.to_table(columns=["tpep_pickup_datetime", "pu_location_id", "trip_distance"])
+    full_s = time.perf_counter() - t0
+    stats = {
+        "files": len(files),
+        "row_groups": sum(pq.ParquetFile(os.path.join(lake_dir(), f)).metadata.num_row_groups for f in files),
+        "rows": full.num_rows,
+        "full_scan_s": round(full_s, 4),
+        "full_scan_rows_per_s": round(full.num_rows / full_s) if full_s else None,
+    }
+    if full.num_rows:
+        first = pc.min(full.column("tpep_pickup_datetime")).as_py()
+        day_end = first.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        day = pc.field("tpep_pickup_datetime") < pa.scalar(day_end, type=pa.timestamp("us", tz="UTC"))
+        t0 = time.perf_counter()
+        n = dataset.count_rows(filter=day)
+        stats["day_scan_s"] = round(time.perf_counter() - t0, 4)
+        stats["day_scan_rows"] = n
+    return stats
+
+
+def compact_partition(year: int, month: int, force: bool = False, row_group_rows: int = ROW_GROUP_ROWS) -> dict | None:
+    """
+    Rewrite one month partition as sorted files with `row_group_rows`-row groups
+    and column statistics, then swap them in through the manifest. Returns scan
+    stats before/after, or None if the partition did not need compaction.
+    """
+    import pyarrow.dataset as ds
+
+    files = partition_files(year, month)
+    if not files or not (force or needs_compaction(files)):
+        return None
+
+    before = scan_stats(files)
+    table = open_dataset(files).to_table().drop_columns(["year", "month"])
+    table = table.sort_by([("tpep_pickup_datetime", "ascending"), ("pu_location_id", "ascending")])
+
+    part_dir = os.path.join(lake_dir(), _partition_dir(year, month))
+    new_files = []
+    file_format = ds.ParquetFileFormat()
+    ds.write_dataset(
+        table,
+        part_dir,
+        format=file_format,
+        file_options=file_format.make_write_options(compression="zstd", write_statistics=True),
+        basename_template=f"{COMPACT_PREFIX}{uuid.uuid4().hex}-{{i}}.parquet",
+        max_rows_per_group=row_group_rows,
+        min_rows_per_group=row_group_rows,
+        max_rows_per_file=FILE_ROWS,
+        preserve_order=True,
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda f: new_files.append(os.path.relpath(f.path, lake_dir())),
+    )
+    if commit_files(new_files, removed=files, require_removed=True) is None:
+        # A concurrent compaction already replaced these files; committing ours would duplicate the rows
+        for f in new_files:
+            try:
+                os.remove(os.path.join(lake_dir(), f))
+            except FileNotFoundError:
+                pass
+        logger.info("Partition %s was compacted concurrently; discarded this rewrite", _partition_dir(year, month))
+        return None
+    after = scan_stats(new_files)
+    return {"partition": _partition_dir(year, month), "before": before, "after": after}
+
+
+def compact(year: int | None = None, month: int | None = None, force: bool = False) -> list[dict]:
+    """
+    Compact every partition (or one year/month), then delete expired retired files.
+    """
+    results = []
+    for y, m in partitions():
+        if (year is not None and y != year) or (month is not None and m != month):
+            continue
+        res = compact_partition(y, m, force=force)
+        if res:
+            results.append(res)
+    vacuum()
+    return results
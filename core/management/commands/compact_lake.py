@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from core import lake
+
+
+class Command(BaseCommand):
+    help = "Compact the local Parquet trip lake: merge and sort small files per month partition."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int)
+        parser.add_argument("--month", type=int)
+        parser.add_argument("--force", action="store_true", help="Rewrite partitions even if already compacted")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        if not lake.enabled():
+            raise CommandError("TRIP_LAKE_DIR is not set")
+
+        results = lake.compact(year=options["year"], month=options["month"], force=options["force"])
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        if not results:
+            self.stdout.write("Nothing to compact.")
+        for r in results:
+            b, a = r["before"], r["after"]
+            self.stdout.write(self.style.SUCCESS(
+                f"{r['partition']}: files {b['files']}->{a['files']} row_groups {b['row_groups']}->{a['row_groups']} | "
+                f"full scan {b['full_scan_rows_per_s']}->{a['full_scan_rows_per_s']} rows/s | "
+                f"1-day scan {b.get('day_scan_s')}s->{a.get('day_scan_s')}s"
+            ))
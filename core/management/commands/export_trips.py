@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from core import export
+
+
+class Command(BaseCommand):
+    help = "Stream a filtered slice of core_trip to CSV or Parquet via COPY ... TO STDOUT."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(export.EXPORTERS), default="csv")
+        parser.add_argument("--output", "-o", default="-", help="File path, or - for stdout (default)")
+        parser.add_argument("--start", help="Pickup time lower bound (ISO date or datetime, UTC)")
+        parser.add_argument("--end", help="Pickup time upper bound, inclusive")
+        parser.add_argument("--vendor", help="Comma-separated vendor ids")
+        parser.add_argument("--pu", help="Comma-separated pickup location ids")
+        parser.add_argument("--do", help="Comma-separated dropoff location ids")
+
+    def handle(self, *args, **options):
+        try:
+            filters = export.parse_filters(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        iter_rows = export.EXPORTERS[options["format"]][0]
+        out = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        written = 0
+        try:
+            for block in iter_rows(filters):
+                out.write(block)
+                written += len(block)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+        if options["output"] != "-":
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+
+class Command(BaseCommand):
+    help = "Write a deterministic synthetic yellow-taxi Parquet file (same arguments, same file) for ingestion benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output .parquet file")
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--null-rate", type=float, default=0.02,
+                            help="Share of rows with the nullable TLC columns set to null (default: 0.02)")
+        parser.add_argument("--negative-rate", type=float, default=0.01,
+                            help="Share of rows with negative money amounts, which ingestion drops (default: 0.01)")
+        parser.add_argument("--tz-aware", action="store_true", help="Write timestamp[us, tz=UTC] instead of tz-naive")
+        parser.add_argument("--start", default="2024-01-01", help="First pickup date (default: 2024-01-01)")
+        parser.add_argument("--days", type=int, default=31, help="Days the pickups are spread over (default: 31)")
+        parser.add_argument("--uniform", action="store_true",
+                            help="Uniform pickup times and zones instead of the hour/weekday and zone skew")
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["days"] < 1:
+            raise CommandError("--rows and --days must be >= 1")
+        try:
+            info = synthetic.generate(
+                options["path"], options["rows"], seed=options["seed"], null_rate=options["null_rate"],
+                negative_rate=options["negative_rate"], tz_aware=options["tz_aware"],
+                start=options["start"], days=options["days"], skew=not options["uniform"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {info['rows']} rows to {info['path']} ({info['bytes'] / 1e6:.1f} MB)"))
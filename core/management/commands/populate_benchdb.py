@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchdata
+from NYT.routers import BENCH_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        f"Load a deterministic scale-factor dataset (scale x {benchdata.SCALE_ROWS} synthetic trips plus zones) "
+        "into the benchmark database. Replaces its trips."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, default=1, help="Scale factor: SF1, SF10, SF100 ... (default: 1)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--database", default=BENCH_ALIAS, help=f"DB alias (default: {BENCH_ALIAS})")
+        parser.add_argument("--force", action="store_true", help="Reload even if this scale and seed is loaded")
+
+    def handle(self, *args, **options):
+        if options["scale"] < 1:
+            raise CommandError("--scale must be >= 1")
+        try:
+            res = benchdata.populate(options["scale"], options["seed"], options["database"], options["force"],
+                                     log=self.stdout.write)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if res["skipped"]:
+            self.stdout.write(f"SF{res['scale']} ({res['rows']} rows) already loaded; use --force to reload")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Loaded SF{res['scale']}: {res['rows']} trips"))
@@ -0,0 +1,33 @@
+"""
+Byte-stream helpers for streaming responses.
+"""
+import io
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only sink that buffers bytes until drained. Unlike a truncated BytesIO
+    it keeps a monotonic tell(), which Arrow/Parquet writers use for offsets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
@@ -0,0 +1,185 @@
+"""
+Deterministic synthetic yellow-taxi Parquet files for ingestion benchmarks.
+
+``generate()`` writes a file with the TLC yellow-taxi trip schema (the columns
+the ingestion paths in ``core.ingest`` and ``core.fast_db_connections``
+read, plus the surcharge columns of the real
+files). The same arguments always produce the same file.
+
+- ``null_rate``: share of rows where passenger_count, RatecodeID,
+  store_and_fwd_flag, congestion_surcharge and Airport_fee are null and
+  payment_type is 0, as in the real monthly files
+- ``negative_rate``: share of rows with negated money columns (refunds/voids),
+  which every ingestion path must drop
+- ``tz_aware``: timestamps typed ``timestamp[us, tz=UTC]`` instead of the
+  tz-naive ``timestamp[us]`` the TLC publishes
+- ``skew``: pickups follow a weekday/hour-of-day demand curve and zones a
+  Zipf-like popularity (a few Manhattan zones take most trips, see
+  ``locations()``); without it both are uniform
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = 500_000
+N_ZONES = 265
+ZONE_SEED = 265  # zone popularity/borough layout is fixed, independent of the trip seed
+
+# Relative demand per pickup hour (0-23) and weekday (Mon-Sun)
+HOUR_WEIGHTS = np.array([3.0, 2.0, 1.4, 1.0, 0.9, 1.2, 2.5, 4.0, 5.0, 5.0, 4.8, 5.0,
+                         5.3, 5.3, 5.6, 5.7, 5.6, 6.2, 6.8, 6.5, 6.0, 5.8, 5.2, 4.0])
+WEEKDAY_WEIGHTS = np.array([0.9, 1.0, 1.05, 1.1, 1.1, 1.05, 0.85])
+ZIPF_S = 1.1
+# Borough share of zones, most popular zones first
+BOROUGHS = [("Manhattan", 69, "Yellow Zone"), ("Queens", 69, "Boro Zone"), ("Brooklyn", 61, "Boro Zone"),
+            ("Bronx", 43, "Boro Zone"), ("Staten Island", 20, "Boro Zone"), ("EWR", 1, "EWR"), ("Unknown", 2, "N/A")]
+
+
+def _zone_order() -> np.ndarray:
+    # Zone ids from most to least popular
+    return np.random.default_rng(ZONE_SEED).permutation(np.arange(1, N_ZONES + 1))
+
+
+def zone_weights() -> np.ndarray:
+    """
+    Pickup/dropoff probability per zone id (index 0 is zone 1).
+    """
+    p = np.empty(N_ZONES)
+    p[_zone_order() - 1] = 1.0 / np.arange(1, N_ZONES + 1) ** ZIPF_S
+    return p / p.sum()
+
+
+def locations() -> list[tuple[int, str, str, str]]:
+    """
+    (location_id, borough, zone, service_zone) for all zones; the most popular zones are in Manhattan.
+    """
+    out, order = [], iter(_zone_order())
+    for borough, n, service in BOROUGHS:
+        for i in range(n):
+            zid = int(next(order))
+            out.append((zid, borough, f"{borough} {i + 1}", service))
+    return sorted(out)
+
+
+def schema(tz_aware: bool = False) -> pa.Schema:
+    ts = pa.timestamp("us", tz="UTC") if tz_aware else pa.timestamp("us")
+    return pa.schema([
+        ("VendorID", pa.int32()),
+        ("tpep_pickup_datetime", ts),
+        ("tpep_dropoff_datetime", ts),
+        ("passenger_count", pa.int64()),
+        ("trip_distance", pa.float64()),
+        ("RatecodeID", pa.int64()),
+        ("store_and_fwd_flag", pa.string()),
+        ("PULocationID", pa.int32()),
+        ("DOLocationID", pa.int32()),
+        ("payment_type", pa.int64()),
+        ("fare_amount", pa.float64()),
+        ("extra", pa.float64()),
+        ("mta_tax", pa.float64()),
+        ("tip_amount", pa.float64()),
+        ("tolls_amount", pa.float64()),
+        ("improvement_surcharge", pa.float64()),
+        ("total_amount", pa.float64()),
+        ("congestion_surcharge", pa.float64()),
+        ("Airport_fee", pa.float64()),
+    ])
+
+
+def _pickups(rng: np.random.Generator, n: int, start: np.datetime64, days: int, skew: bool) -> np.ndarray:
+    if not skew:
+        return start + rng.integers(0, days * 86_400_000_000, n).astype("timedelta64[us]")
+    weekday = (np.arange(days) + (start.astype("datetime64[D]").astype(int) + 3)) % 7  # 1970-01-01 was a Thursday
+    day_p = WEEKDAY_WEIGHTS[weekday] / WEEKDAY_WEIGHTS[weekday].sum()
+    day = rng.choice(days, n, p=day_p)
+    hour = rng.choice(24, n, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    us = (day * 86_400 + hour * 3_600) * 1_000_000 + rng.integers(0, 3_600_000_000, n)
+    return start + us.astype("timedelta64[us]")
+
+
+def _chunk(rng: np.random.Generator, n: int, start: np.datetime64, days: int,
+           null_rate: float, negative_rate: float, skew: bool, sch: pa.Schema) -> pa.Table:
+    pickup = _pickups(rng, n, start, days, skew)
+    duration_s = np.exp(rng.normal(6.5, 0.6, n))  # median ~11 minutes
+    dropoff = pickup + (duration_s * 1e6).astype("timedelta64[us]")
+    distance = np.round(np.exp(rng.normal(0.5, 0.8, n)), 2)
+
+    payment = rng.choice([1, 2, 3, 4], n, p=[0.75, 0.2, 0.03, 0.02])
+    fare = np.round(3.0 + 2.5 * distance + 0.35 * duration_s / 60.0, 2)
+    extra = rng.choice([0.0, 1.0, 2.5], n, p=[0.5, 0.3, 0.2])
+    mta_tax = np.full(n, 0.5)
+    tip = np.where(payment == 1, np.round(fare * rng.uniform(0.1, 0.3, n), 2), 0.0)
+    tolls = np.where(rng.random(n) < 0.05, 6.94, 0.0)
+    improvement = np.full(n, 1.0)
+    congestion = np.where(rng.random(n) < 0.9, 2.5, 0.0)
+    airport = np.where(rng.random(n) < 0.05, 1.75, 0.0)
+
+    negative = rng.random(n) < negative_rate
+    sign = np.where(negative, -1.0, 1.0)
+    fare, extra, mta_tax, tip, tolls, improvement, congestion, airport = (
+        a * sign for a in (fare, extra, mta_tax, tip, tolls, improvement, congestion, airport)
+    )
+    total = np.round(fare + extra + mta_tax + tip + tolls + improvement + congestion + airport, 2)
+
+    null = rng.random(n) < null_rate
+    payment = np.where(null, 0, payment)
+    zone_p = zone_weights() if skew else None
+    zones = lambda: rng.choice(N_ZONES, n, p=zone_p) + 1
+    ts_type = sch.field("tpep_pickup_datetime").type
+    columns = {
+        "VendorID": pa.array(rng.choice([1, 2], n, p=[0.25, 0.75]), pa.int32()),
+        "tpep_pickup_datetime": pa.array(pickup, ts_type),
+        "tpep_dropoff_datetime": pa.array(dropoff, ts_type),
+        "passenger_count": pa.array(rng.choice([1, 2, 3, 4, 5, 6], n, p=[0.72, 0.15, 0.05, 0.03, 0.03, 0.02]),
+                                    pa.int64(), mask=null),
+        "trip_distance": pa.array(distance),
+        "RatecodeID": pa.array(rng.choice([1, 2, 5], n, p=[0.94, 0.04, 0.02]), pa.int64(), mask=null),
+        "store_and_fwd_flag": pa.array(np.where(rng.random(n) < 0.005, "Y", "N"), pa.string(), mask=null),
+        "PULocationID": pa.array(zones(), pa.int32()),
+        "DOLocationID": pa.array(zones(), pa.int32()),
+        "payment_type": pa.array(payment, pa.int64()),
+        "fare_amount": pa.array(fare),
+        "extra": pa.array(extra),
+        "mta_tax": pa.array(mta_tax),
+        "tip_amount": pa.array(tip),
+        "tolls_amount": pa.array(tolls),
+        "improvement_surcharge": pa.array(improvement),
+        "total_amount": pa.array(total),
+        "congestion_surcharge": pa.array(congestion, mask=null),
+        "Airport_fee": pa.array(airport, mask=null),
+    }
+    return pa.Table.from_pydict(columns, schema=sch)
+
+
+def chunks(rows: int, seed: int = 0, null_rate: float = 0.02, negative_rate: float = 0.01, tz_aware: bool = False,
+           start: str = "2024-01-01", days: int = 31, skew: bool = True):
+    """
+    Yield the synthetic trips as Arrow tables of at most CHUNK_ROWS rows.
+    """
+    if not 0 <= null_rate <= 1 or not 0 <= negative_rate <= 1:
+        raise ValueError("rates must be between 0 and 1")
+    rng = np.random.default_rng(seed)
+    start64 = np.datetime64(datetime.fromisoformat(start), "us")
+    sch = schema(tz_aware)
+    written = 0
+    while written < rows:
+        n = min(CHUNK_ROWS, rows - written)
+        yield _chunk(rng, n, start64, days, null_rate, negative_rate, skew, sch)
+        written += n
+
+
+def generate(path: str, rows: int, seed: int = 0, null_rate: float = 0.02, negative_rate: float = 0.01,
+             tz_aware: bool = False, start: str = "2024-01-01", days: int = 31, skew: bool = True) -> dict:
+    """
+    Write `rows` synthetic trips with pickups spread over `days` from `start`; returns
+    {"path", "rows", "bytes"}.
+    """
+    if not 0 <= null_rate <= 1 or not 0 <= negative_rate <= 1:
+        raise ValueError("rates must be between 0 and 1")
+    with pq.ParquetWriter(path, schema(tz_aware)) as writer:
+        for table in chunks(rows, seed, null_rate, negative_rate, tz_aware, start, days, skew):
+            writer.write_table(table)
+    return {"path": path, "rows": rows, "bytes": os.path.getsize(path)}
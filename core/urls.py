@@ -12,4 +12,5 @@ urlpatterns = [
     path("upload/process/<int:pk>/", process_upload, name="process_upload"),
     path("ingest/process-urls/", process_urls, name="process_urls"),
     path("ingest/status/<int:pk>/", upload_status, name="upload_status"),
+    path("export/trips/", export_trips, name="export_trips"),
 ]
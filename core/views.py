@@ -1,12 +1,22 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpRequest, HttpResponseBadRequest, JsonResponse
-from django.utils import timezone
-from datetime import timezone as tz
-from core.tasks import process_url_item
-from core.models import UploadedFile, Trip, Location, URLBatch, URLItem
-import csv, os, tempfile, requests
-import pyarrow.parquet as pq
+from django.http import HttpRequest, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from analytics.catalog import METRICS
+from core import dataversion, export
+from core.models import UploadedFile, URLBatch, URLItem
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _refresh_derived():
+    # Ingested here rather than in a URL batch task: rebuild the optimized tables and snapshots too
+    from analytics.tasks import refresh_after_ingest
+    try:
+        refresh_after_ingest.delay()
+    except Exception:
+        logger.warning("Could not queue refresh_after_ingest", exc_info=True)
+
 
 @login_required(login_url='/admin/login/?next=/')
 def upload_page(request: HttpRequest):
@@ -20,93 +30,6 @@ def upload_page(request: HttpRequest):
     return render(request, "dashboard/upload.html", {})
 
 
-def _valid_trip_row(row: dict) -> bool:
-    try:
-        if float(row.get("trip_distance", 0)) < 0: return False
-        if float(row.get("fare_amount", 0)) < 0: return False
-        if float(row.get("total_amount", 0)) < 0: return False
-        return True
-    except Exception:
-        return False
-
-
-def _ingest_parquet(file_path: str) -> int:
-    table = pq.read_table(file_path)
-    total = 0
-    for batch in table.to_batches(max_chunksize=350000):
-        pyd = batch.to_pydict()
-        size = len(pyd.get("VendorID", []))
-        objs = []
-        for i in range(size):
-            row = {
-                "VendorID": pyd.get("VendorID", [None] * size)[i],
-                "tpep_pickup_datetime": pyd.get("tpep_pickup_datetime")[i],
-                "tpep_dropoff_datetime": pyd.get("tpep_dropoff_datetime")[i],
-                "passenger_count": pyd.get("passenger_count", [None] * size)[i],
-                "trip_distance": pyd.get("trip_distance")[i],
-                "RatecodeID": pyd.get("RatecodeID", [None] * size)[i],
-                "store_and_fwd_flag": pyd.get("store_and_fwd_flag", [None] * size)[i],
-                "PULocationID": pyd.get("PULocationID")[i],
-                "DOLocationID": pyd.get("DOLocationID")[i],
-                "payment_type": pyd.get("payment_type")[i],
-                "fare_amount": pyd.get("fare_amount")[i],
-                "extra": pyd.get("extra", [0] * size)[i],
-                "mta_tax": pyd.get("mta_tax", [0] * size)[i],
-                "tip_amount": pyd.get("tip_amount")[i],
-                "tolls_amount": pyd.get("tolls_amount", [0] * size)[i],
-                "total_amount": pyd.get("total_amount")[i],
-            }
-            if not _valid_trip_row(row):
-                continue
-            objs.append(Trip(
-                vendor_id=int(row["VendorID"]) if row["VendorID"] is not None else 0,
-                tpep_pickup_datetime=timezone.make_aware(row["tpep_pickup_datetime"], timezone=tz.utc) if row[
-                    "tpep_pickup_datetime"] else None,
-                tpep_dropoff_datetime=timezone.make_aware(row["tpep_dropoff_datetime"], timezone=tz.utc) if row[
-                    "tpep_dropoff_datetime"] else None,
-                passenger_count=int(row["passenger_count"]) if row["passenger_count"] is not None else None,
-                trip_distance=float(row["trip_distance"]),
-                ratecode_id=int(row["RatecodeID"]) if row["RatecodeID"] is not None else None,
-                store_and_fwd_flag=(row["store_and_fwd_flag"] or None),
-                pu_location_id=int(row["PULocationID"]),
-                do_location_id=int(row["DOLocationID"]),
-                payment_type=int(row["payment_type"]),
-                fare_amount=row["fare_amount"],
-                extra=row.get("extra") or 0,
-                mta_tax=row.get("mta_tax") or 0,
-                tip_amount=row["tip_amount"],
-                tolls_amount=row.get("tolls_amount") or 0,
-                total_amount=row["total_amount"],
-            ))
-        if objs:
-            Trip.objects.bulk_create(objs, batch_size=350000)
-
-            total += len(objs)
-    return total
-
-
-def _ingest_zones_csv(file_path: str) -> int:
-    cnt = 0
-    with open(file_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        bulk = []
-        for r in reader:
-            try:
-                bulk.append(Location(
-                    location_id=int(r.get("LocationID")),
-                    borough=r.get("Borough") or "",
-                    zone=r.get("Zone") or "",
-                    service_zone=r.get("service_zone") or "",
-                ))
-            except Exception:
-                continue
-        if bulk:
-            Location.objects.all().delete()
-            Location.objects.bulk_create(bulk, batch_size=2000)
-            cnt = len(bulk)
-    return cnt
-
-
 @login_required(login_url='/admin/login/?next=/')
 def process_upload(request: HttpRequest, pk: int):
     uf = get_object_or_404(UploadedFile, pk=pk)
@@ -115,11 +38,13 @@ def process_upload(request: HttpRequest, pk: int):
     uf.status = "processing";
     uf.save(update_fields=["status"])
     file_path = uf.file.path
+    from core import ingest  # pyarrow is only loaded once something is ingested
+
     try:
         if uf.kind == "parquet":
-            rows = _ingest_parquet(file_path)
+            rows = ingest.ingest_trips(file_path, "upload")
         elif uf.kind == "zones_csv":
-            rows = _ingest_zones_csv(file_path)
+            rows = ingest.ingest_zones_csv(file_path)
         else:
             return HttpResponseBadRequest("Unknown file kind")
         uf.status = "done";
@@ -131,6 +56,9 @@ def process_upload(request: HttpRequest, pk: int):
         uf.error_message = str(e)
         uf.save(update_fields=["status", "error_message"])
         return render(request, "dashboard/done.html", {"uf": uf})
+    finally:
+        dataversion.bump()
+        _refresh_derived()
 
 
 @login_required(login_url='/admin/login/?next=/')
@@ -150,6 +78,7 @@ def upload_urls(request: HttpRequest):
         URLItem.objects.bulk_create(items, batch_size=1000)
 
         # Enqueue Celery tasks per item (lightweight loop)
+        from core.tasks import process_url_item
         for item_id in batch.items.values_list("id", flat=True):
             process_url_item.delay(item_id)
 
@@ -178,31 +107,20 @@ def upload_status_api(request: HttpRequest, pk: int):
         "items": items
     })
 
-def _download_to_temp(url: str) -> str:
-    with requests.get(url, stream=True, timeout=120) as r:
-        r.raise_for_status()
-        suffix = ".parquet" if url.lower().endswith(".parquet") else (".csv" if url.lower().endswith(".csv") else "")
-        fd, tmp = tempfile.mkstemp(suffix=suffix)
-        with os.fdopen(fd, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk: f.write(chunk)
-        return tmp
-
-
 @login_required(login_url='/admin/login/?next=/')
 def process_urls(request: HttpRequest):
+    from core import ingest  # pyarrow is only loaded once something is ingested
+
     pending = URLItem.objects.filter(status="pending").order_by("id")
     for item in pending:
         item.status = "processing";
         item.save(update_fields=["status"])
         try:
-            path = _download_to_temp(item.url)
-            if item.kind == "parquet":
-                rows = _ingest_parquet(path)
-            elif item.kind == "zones_csv":
-                rows = _ingest_zones_csv(path)
+            path = ingest.download_to_temp(item.url)
+            if item.kind == "zones_csv":
+                rows = ingest.ingest_zones_csv(path)
             else:
-                rows = _ingest_parquet(path)
+                rows = ingest.ingest_trips(path, "url")
             item.processed_rows = rows
             item.status = "done"
             item.save(update_fields=["processed_rows", "status"])
@@ -210,6 +128,7 @@ def process_urls(request: HttpRequest):
             item.status = "error";
             item.error_message = str(e)
             item.save(update_fields=["status", "error_message"])
+        dataversion.bump()
         batch = item.batch
         batch.done = batch.items.filter(status__in=["done", "error"]).count()
         if batch.done >= batch.total:
@@ -217,9 +136,27 @@ def process_urls(request: HttpRequest):
         else:
             batch.status = "processing"
         batch.save(update_fields=["done", "status"])
+    if pending:
+        _refresh_derived()
     return redirect("upload_urls")
 
 
+@login_required(login_url='/admin/login/?next=/')
+def export_trips(request: HttpRequest):
+    # Stream a filtered slice of core_trip via COPY ... TO STDOUT (?format=csv|parquet)
+    fmt = request.GET.get("format", "csv")
+    if fmt not in export.EXPORTERS:
+        return HttpResponseBadRequest("format must be csv or parquet")
+    try:
+        filters = export.parse_filters(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    iter_rows, content_type, ext = export.EXPORTERS[fmt]
+    response = StreamingHttpResponse(iter_rows(filters), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="trips.{ext}"'
+    return response
+
+
 @login_required(login_url='/admin/login/?next=/')
 def v1(request):
     return render(request, "dashboard/index/v1.html", {})
@@ -235,4 +172,5 @@ def v3(request):
 
 @login_required(login_url='/admin/login/?next=/compare')
 def compare(request):
-    return render(request, "dashboard/compare.html", {})
+    endpoints = [[m.slug, f"/api/v1/{m.slug}/", f"/api/v2/{m.slug}/"] for m in METRICS]
+    return render(request, "dashboard/compare.html", {"endpoints": endpoints})
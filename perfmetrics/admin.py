@@ -1,9 +1,68 @@
 from django.contrib import admin
-from .models import QueryHit
+from .models import (
+    BenchmarkBaseline, BenchmarkRun, DbStatsSnapshot, LoadTestResult, LoadTestRun, QueryHit, QueryHitRollup, QueryPlan,
+    RequestProfile,
+)
 
 @admin.register(QueryHit)
 class QueryHitAdmin(admin.ModelAdmin):
-    list_display = ("created_at", "label", "view_name", "elapsed_ms", "rows", "optimized")
+    list_display = ("created_at", "label", "view_name", "elapsed_ms", "queue_ms", "rows", "optimized")
     list_filter = ("label", "view_name", "optimized", "created_at")
     search_fields = ("sql_text",)
     readonly_fields = ("created_at", "sql_text")
+
+
+@admin.register(QueryHitRollup)
+class QueryHitRollupAdmin(admin.ModelAdmin):
+    list_display = ("bucket_start", "resolution", "label", "count", "min_ms", "max_ms")
+    list_filter = ("resolution", "label")
+    readonly_fields = ("histogram",)
+
+
+@admin.register(BenchmarkRun)
+class BenchmarkRunAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "label", "target", "phase", "concurrency", "scale_factor", "p50_ms", "p95_ms", "p99_ms",
+                    "throughput_qps")
+    list_filter = ("label", "target", "phase", "scale_factor")
+    readonly_fields = ("created_at", "sql_text", "samples_ms", "stats_before", "stats_after")
+
+
+@admin.register(BenchmarkBaseline)
+class BenchmarkBaselineAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at", "description")
+    filter_horizontal = ("runs",)
+
+
+@admin.register(QueryPlan)
+class QueryPlanAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "label", "fingerprint", "execution_ms", "max_estimate_error", "plan_changed", "flagged")
+    list_filter = ("flagged", "plan_changed", "label")
+    readonly_fields = ("created_at", "sql_text", "plan")
+
+
+@admin.register(DbStatsSnapshot)
+class DbStatsSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "database", "blks_hit", "blks_read", "has_statements")
+
+
+class LoadTestResultInline(admin.TabularInline):
+    model = LoadTestResult
+    extra = 0
+    fields = ("endpoint", "requests", "errors", "statuses", "p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+    readonly_fields = fields
+
+
+@admin.register(LoadTestRun)
+class LoadTestRunAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "name", "mode", "transport", "concurrency", "target_rps", "achieved_rps",
+                    "errors", "p95_ms")
+    list_filter = ("mode", "transport", "name")
+    readonly_fields = ("created_at", "mix")
+    inlines = [LoadTestResultInline]
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ("bucket_start", "endpoint", "requests", "samples", "interval_ms")
+    list_filter = ("endpoint",)
+    readonly_fields = ("stacks",)
@@ -0,0 +1,156 @@
+"""
+Admission control for analytics queries.
+
+Each catalog metric belongs to a query class (``light`` / ``heavy``). A class
+has a fixed number of execution slots, a bounded queue of requests waiting for
+a slot and a default ``statement_timeout``; all configurable through
+``ANALYTICS_ADMISSION``:
+
+- a free slot is taken immediately (no locking beyond the semaphore)
+- otherwise the request waits up to ``wait_s`` if fewer than ``queue`` are waiting
+- a full queue is rejected at once with 429, a wait that times out with 503;
+  both carry ``Retry-After``
+
+Limits are per process (threads of one runserver/WSGI worker share them).
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError
+from django.http import JsonResponse
+
+from perfmetrics import prom
+
+DEFAULT_CLASSES = {
+    "light": {"concurrency": 8, "queue": 32, "wait_s": 5.0, "timeout_ms": 15_000},
+    "heavy": {"concurrency": 2, "queue": 8, "wait_s": 15.0, "timeout_ms": 60_000},
+}
+
+QUERY_CANCELED = "57014"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, query_class: str, status: int, retry_after: int):
+        self.query_class = query_class
+        self.status = status
+        self.retry_after = retry_after
+        reason = "queue full" if status == 429 else "timed out waiting for a slot"
+        super().__init__(f"{query_class} queries: {reason}")
+
+
+class Gate:
+    def __init__(self, name: str, concurrency: int, queue: int, wait_s: float, timeout_ms: int | None):
+        self.name = name
+        self.queue = queue
+        self.wait_s = wait_s
+        self.timeout_ms = timeout_ms
+        self.retry_after = max(1, math.ceil(wait_s))
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self.waiting = 0
+
+    def acquire(self) -> float:
+        """
+        Take a slot; returns the time spent queued in ms. Raises AdmissionRejected.
+        """
+        if self._slots.acquire(blocking=False):
+            return 0.0
+        with self._lock:
+            if self.waiting >= self.queue:
+                raise AdmissionRejected(self.name, 429, self.retry_after)
+            self.waiting += 1
+        t0 = time.perf_counter()
+        try:
+            ok = self._slots.acquire(timeout=self.wait_s)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not ok:
+            raise AdmissionRejected(self.name, 503, self.retry_after)
+        return (time.perf_counter() - t0) * 1000.0
+
+    def release(self) -> None:
+        self._slots.release()
+
+
+_gates: dict[str, Gate] = {}
+_gates_lock = threading.Lock()
+
+
+def gate(query_class: str) -> Gate:
+    g = _gates.get(query_class)
+    if g is None:
+        with _gates_lock:
+            g = _gates.get(query_class)
+            if g is None:
+                classes = getattr(settings, "ANALYTICS_ADMISSION", None) or DEFAULT_CLASSES
+                if query_class not in classes:
+                    raise KeyError(f"Unknown query class {query_class!r}")
+                g = _gates[query_class] = Gate(query_class, **classes[query_class])
+    return g
+
+
+class Admitted:
+    """
+    Iterator wrapper for streamed responses: the slot is given back when the
+    stream is exhausted, fails, or the response is closed (even if never iterated).
+    `head` holds chunks already pulled from the stream, sent before the rest.
+    """
+
+    def __init__(self, gate: Gate, iterable, head=()):
+        self._gate = gate
+        self._it = iter(iterable)
+        self._head = list(head)
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._head:
+            return self._head.pop(0)
+        try:
+            return next(self._it)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        try:
+            close = getattr(self._it, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._gate.release()
+
+
+def _error(message: str, status: int, retry_after: int | None = None) -> JsonResponse:
+    response = JsonResponse({"error": message}, status=status)
+    if retry_after is not None:
+        response["Retry-After"] = str(retry_after)
+    # Never let a rejection be stored (or revalidated against the data-version ETag)
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def guard(view):
+    # Turn admission rejections into 429/503 and statement timeouts into 504
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except AdmissionRejected as e:
+            prom.observe_error(e.status)
+            return _error(str(e), e.status, e.retry_after)
+        except OperationalError as e:
+            if getattr(e.__cause__, "pgcode", None) != QUERY_CANCELED:
+                raise
+            prom.observe_error(504)
+            return _error("Query exceeded its statement timeout", 504)
+    return wrapped
@@ -0,0 +1,308 @@
+"""
+Index advisor for ``core_trip`` driven by the analytics workload.
+
+1. The catalog queries (``analytics.catalog``, raw variant) are EXPLAINed with
+   ``VERBOSE`` to find the ``core_trip`` scans, the columns they read, their
+   filters and the plain-column GROUP BY keys above them. Queries are weighted
+   by how often their label was hit recently (``QueryHit``).
+2. Candidates are derived from those scans:
+   - ``covering``: btree on the group key (or first column) ``INCLUDE``-ing the
+     other columns, so the aggregate can use an index-only scan
+   - ``partial``: the same columns restricted to the scan's filter
+   - ``brin``: BRIN on ``tpep_pickup_datetime`` when rows are physically in
+     pickup order (``pg_stats.correlation``), as a far smaller replacement
+     for the btree
+   - ``drop``: existing non-unique indexes that are never scanned, that no
+     workload plan uses, or that duplicate / are a prefix of another index
+3. Optionally each candidate is tested: ``hypo`` uses HypoPG hypothetical
+   indexes (planner cost only), ``sample`` builds real indexes on a sampled
+   copy of ``core_trip`` and measures query time and the per-row insert cost.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from analytics.catalog import METRICS
+from core.models import Trip
+from NYT.routers import analytics_db
+
+TABLE = Trip._meta.db_table
+SAMPLE_TABLE = "advisor_trip_sample"
+COLUMNS = {f.column for f in Trip._meta.fields}
+IDENT_RE = re.compile(r"\b(?:\w+\.)?(\w+)\b")
+BRIN_MIN_CORRELATION = 0.9
+INSERT_PROBE_ROWS = 10_000
+
+INDEXES_SQL = """
+    SELECT i.indexrelname, x.indisunique, x.indisprimary, i.idx_scan, pg_relation_size(i.indexrelid),
+           pg_get_indexdef(i.indexrelid),
+           ARRAY(SELECT a.attname FROM unnest(x.indkey) WITH ORDINALITY k(attnum, n)
+                 JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+                 ORDER BY k.n)
+    FROM pg_stat_user_indexes i
+    JOIN pg_index x ON x.indexrelid = i.indexrelid
+    WHERE i.relname = %s
+"""
+
+
+@dataclass
+class Query:
+    name: str
+    sql: str
+    weight: float
+    cost: float = 0.0
+    scans: list = field(default_factory=list)      # [(columns, filter, group_cols)]
+    indexes_used: set = field(default_factory=set)
+
+
+@dataclass
+class Candidate:
+    kind: str
+    ddl: str
+    reason: str
+    queries: list = field(default_factory=list)
+    index_name: str = ""
+    cost_before: float | None = None
+    cost_after: float | None = None
+    ms_before: float | None = None
+    ms_after: float | None = None
+    size_bytes: int | None = None
+    insert_ms_per_10k: float | None = None
+    weight: float = 0.0  # recent hits of the affected queries
+
+    @property
+    def score(self) -> float:
+        # Expected benefit across the workload: relative gain x how often the queries run
+        return (self.gain_pct or 0.0) * self.weight
+
+    @property
+    def gain_pct(self) -> float | None:
+        before, after = (self.ms_before, self.ms_after) if self.ms_before else (self.cost_before, self.cost_after)
+        if not before or after is None:
+            return None
+        return round((before - after) / before * 100.0, 1)
+
+
+def _columns(text: str) -> list[str]:
+    return [c for c in IDENT_RE.findall(text or "") if c in COLUMNS]
+
+
+def _unqualify(text: str) -> str:
+    return re.sub(r"\b\w+\.(\w+)\b", r"\1", text)
+
+
+def _walk(node: dict, groups: tuple = ()):
+    keys = node.get("Group Key") or []
+    plain = tuple(_unqualify(k) for k in keys if _unqualify(k) in COLUMNS)
+    if node.get("Node Type") == "Aggregate" and plain:
+        groups = plain
+    yield node, groups
+    for child in node.get("Plans") or []:
+        yield from _walk(child, groups)
+
+
+def explain(cur, sql: str, analyze: bool = False) -> dict:
+    opts = "ANALYZE, VERBOSE, FORMAT JSON" if analyze else "VERBOSE, FORMAT JSON"
+    cur.execute(f"EXPLAIN ({opts}) {sql}")
+    doc = cur.fetchone()[0]
+    return doc[0] if isinstance(doc, list) else doc
+
+
+def workload(days: int = 7) -> list[Query]:
+    from perfmetrics.models import QueryHit
+
+    since = timezone.now() - timedelta(days=days)
+    hits = dict(
+        QueryHit.objects.filter(created_at__gte=since).values_list("view_name").annotate(n=Count("id"))
+    )
+    return [Query(m.name, m.render("raw"), weight=float(hits.get(m.name, 0)) or 1.0) for m in METRICS]
+
+
+def analyze_workload(cur, queries: list[Query]) -> None:
+    for q in queries:
+        doc = explain(cur, q.sql)
+        q.cost = doc["Plan"]["Total Cost"]
+        for node, groups in _walk(doc["Plan"]):
+            if node.get("Relation Name") != TABLE:
+                continue
+            if "Index Name" in node:
+                q.indexes_used.add(node["Index Name"])
+            if node["Node Type"] == "Seq Scan":
+                cols = list(dict.fromkeys(
+                    c for text in (node.get("Output") or []) + [node.get("Filter", "")] for c in _columns(text)
+                ))
+                q.scans.append((cols, _unqualify(node["Filter"]) if node.get("Filter") else None, groups))
+
+
+def existing_indexes(cur) -> list[dict]:
+    cur.execute(INDEXES_SQL, [TABLE])
+    return [
+        {"name": r[0], "unique": r[1] or r[2], "idx_scan": r[3], "size_bytes": r[4], "ddl": r[5], "columns": list(r[6])}
+        for r in cur.fetchall()
+    ]
+
+
+def _pickup_correlation(cur) -> float | None:
+    cur.execute(
+        "SELECT correlation FROM pg_stats WHERE tablename = %s AND attname = 'tpep_pickup_datetime'", [TABLE]
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def candidates(cur, queries: list[Query], indexes: list[dict]) -> list[Candidate]:
+    out: dict[str, Candidate] = {}
+
+    def add(kind, ddl, reason, query):
+        c = out.setdefault(ddl, Candidate(kind, ddl, reason))
+        if query and query not in c.queries:
+            c.queries.append(query)
+
+    for q in queries:
+        for cols, flt, groups in q.scans:
+            if not cols or len(cols) > 5:
+                continue
+            key = [c for c in groups if c in cols] or cols[:1]
+            include = [c for c in cols if c not in key]
+            body = f"{TABLE} ({', '.join(key)})" + (f" INCLUDE ({', '.join(include)})" if include else "")
+            add("covering", f"CREATE INDEX ON {body}",
+                "index-only scan instead of a full heap scan for the aggregate", q.name)
+            if flt:
+                add("partial", f"CREATE INDEX ON {body} WHERE {flt}", f"only rows matching {flt}", q.name)
+
+    used = set().union(*(q.indexes_used for q in queries)) if queries else set()
+    correlation = _pickup_correlation(cur)
+    if correlation is not None and abs(correlation) >= BRIN_MIN_CORRELATION:
+        btrees = [i for i in indexes if i["columns"] == ["tpep_pickup_datetime"] and " brin " not in i["ddl"].lower()]
+        add("brin", f"CREATE INDEX ON {TABLE} USING brin (tpep_pickup_datetime)",
+            f"pickup correlation {correlation:.2f}; can replace " + (", ".join(i["name"] for i in btrees) or "range scans"),
+            None)
+
+    for i in indexes:
+        if i["unique"]:
+            continue
+        reasons = []
+        if not i["idx_scan"] and i["name"] not in used:
+            reasons.append("never scanned")
+        for other in indexes:
+            if other is i or other["columns"][: len(i["columns"])] != i["columns"]:
+                continue
+            if other["columns"] == i["columns"]:
+                # Keep one of each set of duplicates
+                if other["name"] < i["name"]:
+                    reasons.append(f"duplicate of {other['name']}")
+            else:
+                reasons.append(f"prefix of {other['name']}")
+        if reasons:
+            c = Candidate("drop", f"DROP INDEX {i['name']}", "; ".join(reasons), index_name=i["name"])
+            c.size_bytes = i["size_bytes"]
+            out[c.ddl] = c
+    return list(out.values())
+
+
+def _costs(cur, queries: list[Query], names: list[str]) -> float:
+    by_name = {q.name: q for q in queries}
+    return sum(explain(cur, by_name[n].sql)["Plan"]["Total Cost"] for n in names)
+
+
+def test_hypothetical(cur, queries: list[Query], cands: list[Candidate]) -> None:
+    """
+    Planner cost of the affected queries with each candidate as a HypoPG hypothetical index.
+    """
+    for c in cands:
+        if c.kind == "drop" or not c.queries:
+            continue
+        c.cost_before = _costs(cur, queries, c.queries)
+        cur.execute("SELECT indexrelid FROM hypopg_create_index(%s)", [c.ddl])
+        oid = cur.fetchone()[0]
+        try:
+            c.cost_after = _costs(cur, queries, c.queries)
+            cur.execute("SELECT hypopg_relation_size(%s)", [oid])
+            c.size_bytes = cur.fetchone()[0]
+        finally:
+            cur.execute("SELECT hypopg_reset()")
+
+
+def _sample_sql(q: Query) -> str:
+    return q.sql.replace(TABLE, SAMPLE_TABLE)
+
+
+def _timed(cur, sql: str) -> float:
+    t0 = time.perf_counter()
+    cur.execute(sql)
+    cur.fetchall()
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def _insert_ms(cur, using: str) -> float:
+    # Time inserting INSERT_PROBE_ROWS rows into the sample, rolled back afterwards
+    with transaction.atomic(using=using):
+        t0 = time.perf_counter()
+        cur.execute(f"INSERT INTO {SAMPLE_TABLE} SELECT * FROM {SAMPLE_TABLE} LIMIT {INSERT_PROBE_ROWS}")
+        ms = (time.perf_counter() - t0) * 1000.0
+        transaction.set_rollback(True, using=using)
+    return ms
+
+
+def test_on_sample(cur, using: str, queries: list[Query], cands: list[Candidate], pct: float, runs: int = 3) -> None:
+    """
+    Build each candidate for real on a TABLESAMPLE copy of core_trip and measure the affected
+    queries (best of `runs`) and the insert cost, with and without it.
+    """
+    by_name = {q.name: q for q in queries}
+    cur.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}")
+    cur.execute(f"CREATE TABLE {SAMPLE_TABLE} AS SELECT * FROM {TABLE} TABLESAMPLE SYSTEM (%s)", [pct])
+    try:
+        cur.execute(f"VACUUM ANALYZE {SAMPLE_TABLE}")
+        base_insert = _insert_ms(cur, using)
+        for c in cands:
+            if c.kind == "drop":
+                continue
+            names = c.queries
+            c.ms_before = sum(min(_timed(cur, _sample_sql(by_name[n])) for _ in range(runs))
+                              for n in names) if names else None
+            cur.execute(c.ddl.replace(f"ON {TABLE}", f"ON {SAMPLE_TABLE}").replace("CREATE INDEX ON",
+                        "CREATE INDEX advisor_candidate ON"))
+            try:
+                # Index-only scans need an up-to-date visibility map
+                cur.execute(f"VACUUM ANALYZE {SAMPLE_TABLE}")
+                cur.execute("SELECT pg_relation_size('advisor_candidate')")
+                c.size_bytes = cur.fetchone()[0]
+                c.ms_after = sum(min(_timed(cur, _sample_sql(by_name[n])) for _ in range(runs))
+                                 for n in names) if names else None
+                c.insert_ms_per_10k = round((_insert_ms(cur, using) - base_insert) * 10_000 / INSERT_PROBE_ROWS, 2)
+            finally:
+                cur.execute("DROP INDEX IF EXISTS advisor_candidate")
+    finally:
+        cur.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}")
+
+
+def has_hypopg(cur) -> bool:
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+    return cur.fetchone() is not None
+
+
+def advise(using: str | None = None, test: str | None = None, sample_pct: float = 1.0, days: int = 7) -> dict:
+    # The sampled copy is written, so it cannot go to a read-only replica
+    using = using or ("default" if test == "sample" else analytics_db())
+    queries = workload(days)
+    with connections[using].cursor() as cur:
+        analyze_workload(cur, queries)
+        indexes = existing_indexes(cur)
+        cands = candidates(cur, queries, indexes)
+        if test == "hypo":
+            if not has_hypopg(cur):
+                raise RuntimeError("HypoPG is not installed (CREATE EXTENSION hypopg)")
+            test_hypothetical(cur, queries, cands)
+        elif test == "sample":
+            test_on_sample(cur, using, queries, cands, sample_pct)
+    weights = {q.name: q.weight for q in queries}
+    for c in cands:
+        c.weight = sum(weights[n] for n in c.queries)
+    cands.sort(key=lambda c: (c.kind == "drop", -c.score))
+    return {"queries": queries, "indexes": indexes, "candidates": cands}
@@ -0,0 +1,263 @@
+"""
+Periodic snapshots of database-side statistics for the analytics database.
+
+``collect()`` (Celery beat, ``perfmetrics.tasks.collect_db_stats``) stores the
+cumulative counters of ``pg_stat_database``, ``pg_stat_user_tables`` +
+``pg_statio_user_tables``, ``pg_stat_user_indexes`` + ``pg_statio_user_indexes``
+and, when the extension is installed, the top ``pg_stat_statements`` entries.
+Only raw counters are stored; ``window_report()`` turns two snapshots into
+per-interval deltas: seq vs index scans per table, unused indexes, heap/index
+cache hit ratios and the statements that used the most time.
+
+Snapshots are always taken on the same alias (``DBSTATS_ALIAS``, by default
+the ``analytics`` alias if configured, else ``default``), never on whichever
+database ``analytics_db()`` currently falls back to. Each records the server
+address and ``stats_reset``; two snapshots are only diffed when both match, so
+a failover or ``pg_stat_reset()`` never shows up as a bogus delta.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from NYT.routers import ANALYTICS_ALIAS
+from perfmetrics.models import DbStatsSnapshot, IndexStat, StatementStat, TableStat
+
+TOP_STATEMENTS = 200
+RETENTION_DAYS_DEFAULT = 14
+
+DATABASE_SQL = """
+    SELECT datname, blks_hit, blks_read, xact_commit, temp_bytes, stats_reset,
+           COALESCE(host(inet_server_addr()), 'local') || ':' || COALESCE(inet_server_port(), 0)
+    FROM pg_stat_database WHERE datname = current_database()
+"""
+
+TABLES_SQL = """
+    SELECT t.relname, t.seq_scan, t.seq_tup_read, COALESCE(t.idx_scan, 0), COALESCE(t.idx_tup_fetch, 0),
+           t.n_tup_ins, t.n_live_tup,
+           COALESCE(io.heap_blks_read, 0), COALESCE(io.heap_blks_hit, 0),
+           COALESCE(io.idx_blks_read, 0), COALESCE(io.idx_blks_hit, 0)
+    FROM pg_stat_user_tables t
+    JOIN pg_statio_user_tables io ON io.relid = t.relid
+"""
+
+INDEXES_SQL = """
+    SELECT i.relname, i.indexrelname, i.idx_scan, i.idx_tup_read,
+           COALESCE(io.idx_blks_read, 0), COALESCE(io.idx_blks_hit, 0),
+           pg_relation_size(i.indexrelid), x.indisunique
+    FROM pg_stat_user_indexes i
+    JOIN pg_statio_user_indexes io ON io.indexrelid = i.indexrelid
+    JOIN pg_index x ON x.indexrelid = i.indexrelid
+"""
+
+# total_exec_time is PG13+; older servers call it total_time
+STATEMENTS_SQL = """
+    SELECT s.queryid, s.query, s.calls, s.{total}, s.rows, s.shared_blks_hit, s.shared_blks_read
+    FROM pg_stat_statements s
+    WHERE s.dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND s.queryid IS NOT NULL
+    ORDER BY s.{total} DESC
+    LIMIT %s
+"""
+
+
+def _has_statements(cur) -> bool:
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+    return cur.fetchone() is not None
+
+
+def _statements(cur) -> list[tuple]:
+    cur.execute(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'pg_stat_statements' AND column_name = 'total_exec_time'"
+    )
+    total = "total_exec_time" if cur.fetchone() else "total_time"
+    cur.execute(STATEMENTS_SQL.format(total=total), [TOP_STATEMENTS])
+    return cur.fetchall()
+
+
+def stats_alias() -> str:
+    default = ANALYTICS_ALIAS if ANALYTICS_ALIAS in settings.DATABASES else "default"
+    return getattr(settings, "DBSTATS_ALIAS", default)
+
+
+def collect(using: str | None = None) -> DbStatsSnapshot:
+    with connections[using or stats_alias()].cursor() as cur:
+        # One consistent view of the statistics for the whole snapshot
+        cur.execute("SELECT pg_stat_clear_snapshot()")
+        cur.execute(DATABASE_SQL)
+        db = cur.fetchone()
+        cur.execute(TABLES_SQL)
+        tables = cur.fetchall()
+        cur.execute(INDEXES_SQL)
+        indexes = cur.fetchall()
+        has_statements = _has_statements(cur)
+        statements = _statements(cur) if has_statements else []
+
+    with transaction.atomic():
+        snap = DbStatsSnapshot.objects.create(
+            database=db[0], blks_hit=db[1], blks_read=db[2], xact_commit=db[3], temp_bytes=db[4],
+            stats_reset=db[5], server=db[6], has_statements=has_statements,
+        )
+        TableStat.objects.bulk_create([
+            TableStat(snapshot=snap, relname=r[0], seq_scan=r[1], seq_tup_read=r[2], idx_scan=r[3],
+                      idx_tup_fetch=r[4], n_tup_ins=r[5], n_live_tup=r[6], heap_blks_read=r[7],
+                      heap_blks_hit=r[8], idx_blks_read=r[9], idx_blks_hit=r[10])
+            for r in tables
+        ])
+        IndexStat.objects.bulk_create([
+            IndexStat(snapshot=snap, relname=r[0], indexrelname=r[1], idx_scan=r[2], idx_tup_read=r[3],
+                      idx_blks_read=r[4], idx_blks_hit=r[5], size_bytes=r[6], is_unique=r[7])
+            for r in indexes
+        ])
+        StatementStat.objects.bulk_create([
+            StatementStat(snapshot=snap, queryid=r[0], query=(r[1] or "")[:4000], calls=r[2], total_exec_ms=r[3],
+                          rows=r[4], shared_blks_hit=r[5], shared_blks_read=r[6])
+            for r in statements
+        ])
+    return snap
+
+
+def purge(now=None) -> int:
+    days = getattr(settings, "DBSTATS_RETENTION_DAYS", RETENTION_DAYS_DEFAULT)
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return DbStatsSnapshot.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def _delta(new: int, old: int | None) -> int:
+    # Counters restart from zero after a stats reset
+    if old is None or new < old:
+        return new
+    return new - old
+
+
+def _ratio(hit: float, read: float) -> float | None:
+    return round(100.0 * hit / (hit + read), 2) if hit + read else None
+
+
+def comparable(older: DbStatsSnapshot, newer: DbStatsSnapshot) -> bool:
+    # Counters of different servers, or from before a stats reset, cannot be subtracted
+    return older.server == newer.server and older.stats_reset == newer.stats_reset
+
+
+def snapshots_for_window(window: timedelta, now=None,
+                         using: str = DEFAULT_DB_ALIAS) -> tuple[DbStatsSnapshot | None, DbStatsSnapshot | None]:
+    """
+    (older, newer): the latest snapshot and the latest one of the same server and stats reset taken
+    at or before now - window (or the oldest such one).
+    """
+    now = now or timezone.now()
+    newer = DbStatsSnapshot.objects.using(using).order_by("-created_at").first()
+    if newer is None:
+        return None, None
+    same = DbStatsSnapshot.objects.using(using).filter(server=newer.server, stats_reset=newer.stats_reset)
+    older = (
+        same.filter(created_at__lte=now - window).order_by("-created_at").first()
+        or same.order_by("created_at").first()
+    )
+    return (older if older.pk != newer.pk else None), newer
+
+
+def diff(older: DbStatsSnapshot | None, newer: DbStatsSnapshot) -> dict:
+    if older is not None and not comparable(older, newer):
+        older = None
+    old_tables = {t.relname: t for t in older.tables.all()} if older else {}
+    old_indexes = {(i.relname, i.indexrelname): i for i in older.indexes.all()} if older else {}
+    old_statements = {s.queryid: s for s in older.statements.all()} if older else {}
+
+    tables = []
+    for t in newer.tables.order_by("relname"):
+        o = old_tables.get(t.relname)
+        d = {f: _delta(getattr(t, f), getattr(o, f, None)) for f in (
+            "seq_scan", "seq_tup_read", "idx_scan", "idx_tup_fetch", "n_tup_ins",
+            "heap_blks_read", "heap_blks_hit", "idx_blks_read", "idx_blks_hit")}
+        tables.append({
+            "table": t.relname,
+            **d,
+            "n_live_tup": t.n_live_tup,
+            "idx_scan_pct": _ratio(d["idx_scan"], d["seq_scan"]),
+            "heap_hit_pct": _ratio(d["heap_blks_hit"], d["heap_blks_read"]),
+            "idx_hit_pct": _ratio(d["idx_blks_hit"], d["idx_blks_read"]),
+        })
+
+    indexes, unused = [], []
+    for i in newer.indexes.order_by("relname", "indexrelname"):
+        o = old_indexes.get((i.relname, i.indexrelname))
+        scans = _delta(i.idx_scan, getattr(o, "idx_scan", None))
+        row = {"table": i.relname, "index": i.indexrelname, "idx_scan": scans, "idx_scan_total": i.idx_scan,
+               "size_bytes": i.size_bytes, "unique": i.is_unique}
+        indexes.append(row)
+        # Unique indexes enforce constraints even when never scanned
+        if scans == 0 and not i.is_unique:
+            unused.append(row)
+
+    statements = []
+    for s in newer.statements.all():
+        o = old_statements.get(s.queryid)
+        calls = _delta(s.calls, getattr(o, "calls", None))
+        if not calls:
+            continue
+        total = s.total_exec_ms - o.total_exec_ms if o and s.total_exec_ms >= o.total_exec_ms else s.total_exec_ms
+        statements.append({
+            "queryid": s.queryid, "query": s.query[:500], "calls": calls, "total_ms": round(total, 2),
+            "mean_ms": round(total / calls, 2), "rows": _delta(s.rows, getattr(o, "rows", None)),
+            "hit_pct": _ratio(_delta(s.shared_blks_hit, getattr(o, "shared_blks_hit", None)),
+                              _delta(s.shared_blks_read, getattr(o, "shared_blks_read", None))),
+        })
+    statements.sort(key=lambda r: r["total_ms"], reverse=True)
+
+    heap_hit = sum(t["heap_blks_hit"] for t in tables)
+    heap_read = sum(t["heap_blks_read"] for t in tables)
+    idx_hit = sum(t["idx_blks_hit"] for t in tables)
+    idx_read = sum(t["idx_blks_read"] for t in tables)
+    return {
+        "from": older.created_at.isoformat() if older else None,
+        "to": newer.created_at.isoformat(),
+        "server": newer.server,
+        "stats_reset": newer.stats_reset.isoformat() if newer.stats_reset else None,
+        "cache": {
+            "db_hit_pct": _ratio(_delta(newer.blks_hit, getattr(older, "blks_hit", None)),
+                                 _delta(newer.blks_read, getattr(older, "blks_read", None))),
+            "heap_hit_pct": _ratio(heap_hit, heap_read),
+            "idx_hit_pct": _ratio(idx_hit, idx_read),
+            "temp_bytes": _delta(newer.temp_bytes, getattr(older, "temp_bytes", None)),
+        },
+        "tables": tables,
+        "indexes": indexes,
+        "unused_indexes": unused,
+        "top_statements": statements[:20],
+        "has_statements": newer.has_statements,
+    }
+
+
+def window_report(window: timedelta, now=None, using: str = DEFAULT_DB_ALIAS) -> dict | None:
+    older, newer = snapshots_for_window(window, now, using)
+    if newer is None:
+        return None
+    return diff(older, newer)
+
+
+def table_series(table: str, window: timedelta, now=None, using: str = DEFAULT_DB_ALIAS) -> list[dict]:
+    # Per-interval deltas for one table across consecutive snapshots in the window
+    now = now or timezone.now()
+    rows = list(
+        TableStat.objects.using(using).filter(relname=table, snapshot__created_at__gte=now - window)
+        .select_related("snapshot").order_by("snapshot__created_at")
+    )
+    out = []
+    for prev, cur in zip(rows, rows[1:]):
+        if not comparable(prev.snapshot, cur.snapshot):
+            continue
+        seq = _delta(cur.seq_scan, prev.seq_scan)
+        idx = _delta(cur.idx_scan, prev.idx_scan)
+        out.append({
+            "ts": cur.snapshot.created_at.isoformat(),
+            "seq_scan": seq,
+            "idx_scan": idx,
+            "seq_tup_read": _delta(cur.seq_tup_read, prev.seq_tup_read),
+            "n_tup_ins": _delta(cur.n_tup_ins, prev.n_tup_ins),
+            "heap_hit_pct": _ratio(_delta(cur.heap_blks_hit, prev.heap_blks_hit),
+                                   _delta(cur.heap_blks_read, prev.heap_blks_read)),
+        })
+    return out
@@ -0,0 +1,58 @@
+"""
+Mergeable log-bucketed latency histograms.
+
+Bucket ``i`` covers ``[MIN_MS * GROWTH**i, MIN_MS * GROWTH**(i+1))`` (bucket 0
+also takes everything faster), so percentiles read back from a histogram are
+within about ``GROWTH - 1`` (5%) of the true value, whatever the range. A
+histogram is a sparse ``{str(bucket): count}`` dict, stored as JSON in
+``QueryHitRollup.histogram``; merging is adding counts. Counts may be
+fractional because sampled hits are re-weighted by ``1 / sample_rate``.
+"""
+import math
+
+MIN_MS = 0.1
+GROWTH = 1.1
+BUCKETS = 180  # MIN_MS * GROWTH**180 is about 2.8e6 ms; slower hits share the last bucket
+
+
+def bucket(ms: float) -> int:
+    if ms <= MIN_MS:
+        return 0
+    return min(BUCKETS - 1, int(math.log(ms / MIN_MS) / math.log(GROWTH)))
+
+
+def add(hist: dict, ms: float, weight: float = 1.0) -> dict:
+    key = str(bucket(ms))
+    hist[key] = hist.get(key, 0) + weight
+    return hist
+
+
+def merge(into: dict, other: dict) -> dict:
+    for key, n in other.items():
+        into[key] = into.get(key, 0) + n
+    return into
+
+
+def quantiles(hist: dict, qs=(0.5, 0.95, 0.99), lo: float | None = None, hi: float | None = None) -> list[float | None]:
+    """
+    Approximate quantiles (geometric bucket midpoints), clamped to [lo, hi] when
+    the exact min/max are known.
+    """
+    items = sorted((int(k), n) for k, n in hist.items() if n > 0)
+    total = sum(n for _, n in items)
+    if not total:
+        return [None for _ in qs]
+    out = []
+    for q in qs:
+        target, seen = q * total, 0.0
+        for i, n in items:
+            seen += n
+            if seen >= target:
+                break
+        value = MIN_MS * GROWTH ** (i + 0.5)
+        if lo is not None:
+            value = max(value, lo)
+        if hi is not None:
+            value = min(value, hi)
+        out.append(value)
+    return out
@@ -0,0 +1,318 @@
+"""
+Closed- and open-loop load generation against the dashboard API.
+
+A mix is a list of ``Endpoint(name, path, weight)``; every request picks one at
+random by weight. Two load models:
+
+- closed loop (``rps=None``): ``concurrency`` virtual users, each sending its
+  next request ``think_ms`` after the previous response. Throughput is whatever
+  the server sustains at that concurrency.
+- open loop (``rps``): arrivals are scheduled at a fixed (or Poisson) rate
+  regardless of how the server keeps up, and latency is measured from the
+  scheduled start, so time spent waiting for a free client counts instead of
+  being hidden (coordinated omission). ``concurrency`` caps the requests in
+  flight; requests still queued when the run ends are counted as ``dropped``.
+
+Requests go over HTTP to a running server (``HttpTransport``) or in-process
+through the project's WSGI application (``WsgiTransport``). Responses with
+status >= 400 and transport exceptions are errors and are kept out of the
+latency histograms (``perfmetrics.histogram``). ``save()`` stores a run as
+``LoadTestRun`` + one ``LoadTestResult`` per endpoint.
+"""
+import queue
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.db import connections
+
+from analytics.catalog import METRICS
+from perfmetrics import histogram
+
+# Default mix: every catalog metric per API version, plus the metrics endpoints the dashboard polls
+API_PATHS = {"v1": "/api/v1/{slug}/", "v2": "/api/v2/{slug}/", "v3": "/api/v3/{slug}/"}
+METRICS_PATHS = ("/metrics/hits/latest/", "/metrics/hits/summary/")
+
+
+@dataclass
+class Endpoint:
+    name: str
+    path: str
+    weight: float = 1.0
+
+
+def default_mix(versions=("v1", "v2"), with_metrics: bool = True) -> list[Endpoint]:
+    mix = [Endpoint(f"{v}.{m.name}", API_PATHS[v].format(slug=m.slug)) for v in versions for m in METRICS]
+    if with_metrics:
+        mix += [Endpoint("metrics." + p.strip("/").split("/", 1)[1].replace("/", "."), p) for p in METRICS_PATHS]
+    return mix
+
+
+def parse_endpoint(spec: str) -> Endpoint:
+    """
+    "PATH" or "PATH=WEIGHT", e.g. "/api/v2/daily-trips/=3".
+    """
+    path, _, weight = spec.partition("=")
+    if not path.startswith("/"):
+        raise ValueError(f"Endpoint path must start with '/': {spec!r}")
+    w = float(weight) if weight else 1.0
+    if w <= 0:
+        raise ValueError(f"Endpoint weight must be > 0: {spec!r}")
+    return Endpoint(path.strip("/").replace("/", ".") or "root", path, w)
+
+
+class HttpTransport:
+    name = "http"
+
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        self.target = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def client(self):
+        import requests
+
+        session = requests.Session()
+
+        def call(path: str) -> int:
+            # The body is read in full (stream=False), as a dashboard would
+            return session.get(self.target + path, timeout=self.timeout).status_code
+        return call
+
+
+class WsgiTransport:
+    """
+    Calls the WSGI application in this process: no sockets or server workers,
+    but the full middleware and view stack, including the DB queries.
+    """
+    name = "wsgi"
+    target = "wsgi"
+
+    def __init__(self):
+        from django.core.wsgi import get_wsgi_application
+
+        self.app = get_wsgi_application()
+
+    def client(self):
+        from io import BytesIO
+        from wsgiref.util import setup_testing_defaults
+
+        def call(path: str) -> int:
+            path_info, _, query = path.partition("?")
+            environ = {"PATH_INFO": path_info, "QUERY_STRING": query, "wsgi.input": BytesIO(),
+                       "wsgi.errors": sys.stderr, "wsgi.multithread": True}
+            setup_testing_defaults(environ)
+            status = []
+
+            def start_response(s, headers, exc_info=None):
+                status.append(int(s.split(" ", 1)[0]))
+                return lambda data: None
+
+            result = self.app(environ, start_response)
+            try:
+                for _ in result:
+                    pass
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            return status[0]
+        return call
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+    hist: dict = field(default_factory=dict)
+    sum_ms: float = 0.0
+    min_ms: float | None = None
+    max_ms: float | None = None
+
+    def add(self, status, ms: float):
+        self.requests += 1
+        key = str(status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+            return
+        histogram.add(self.hist, ms)
+        self.sum_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = ms if self.max_ms is None else max(self.max_ms, ms)
+
+    def merge(self, other: "EndpointStats"):
+        self.requests += other.requests
+        self.errors += other.errors
+        for k, n in other.statuses.items():
+            self.statuses[k] = self.statuses.get(k, 0) + n
+        histogram.merge(self.hist, other.hist)
+        self.sum_ms += other.sum_ms
+        for attr, fn in (("min_ms", min), ("max_ms", max)):
+            a, b = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, b if a is None else a if b is None else fn(a, b))
+
+    def summary(self, seconds: float) -> dict:
+        ok = self.requests - self.errors
+        p50, p95, p99 = histogram.quantiles(self.hist, lo=self.min_ms, hi=self.max_ms)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_pct": round(100.0 * self.errors / self.requests, 2) if self.requests else None,
+            "statuses": self.statuses,
+            "avg_ms": self.sum_ms / ok if ok else None,
+            "min_ms": self.min_ms,
+            "max_ms": self.max_ms,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "throughput_rps": ok / seconds if seconds else None,
+            "histogram": self.hist,
+        }
+
+
+def _picker(mix: list[Endpoint], rnd: random.Random):
+    weights = [e.weight for e in mix]
+    return lambda: rnd.choices(mix, weights)[0]
+
+
+def _send(call, path: str):
+    try:
+        return call(path)
+    except Exception as e:
+        return type(e).__name__
+
+
+def run(mix: list[Endpoint], transport, duration_s: float, concurrency: int = 1, rps: float | None = None,
+        think_ms: float = 0.0, warmup_s: float = 0.0, poisson: bool = False, seed: int | None = None) -> dict:
+    """
+    Drive `mix` for warmup_s + duration_s seconds and return per-endpoint and total summaries
+    of the measured part.
+    """
+    start = time.perf_counter()
+    measure_from = start + warmup_s
+    end = measure_from + duration_s
+    per_worker: list[dict[str, EndpointStats]] = []
+    dropped = [0]
+    lock = threading.Lock()
+
+    def record(stats, ep, status, t0):
+        if t0 >= measure_from:
+            stats.setdefault(ep.name, EndpointStats()).add(status, (time.perf_counter() - t0) * 1000.0)
+
+    def closed_worker(i: int):
+        stats, rnd = {}, random.Random(None if seed is None else seed + i)
+        pick = _picker(mix, rnd)
+        try:
+            call = transport.client()
+            while (t0 := time.perf_counter()) < end:
+                ep = pick()
+                record(stats, ep, _send(call, ep.path), t0)
+                if think_ms:
+                    time.sleep(think_ms / 1000.0)
+        finally:
+            connections.close_all()
+            with lock:
+                per_worker.append(stats)
+
+    arrivals: queue.Queue = queue.Queue()
+
+    def open_worker(i: int):
+        stats, lost = {}, 0
+        try:
+            call = transport.client()
+            while (item := arrivals.get()) is not None:
+                ep, intended = item
+                if time.perf_counter() >= end:
+                    lost += 1
+                    continue
+                # Latency from the scheduled start: queueing for a free client counts
+                record(stats, ep, _send(call, ep.path), intended)
+        finally:
+            connections.close_all()
+            with lock:
+                per_worker.append(stats)
+                dropped[0] += lost
+
+    def schedule():
+        rnd = random.Random(seed)
+        pick = _picker(mix, rnd)
+        t = start
+        while t < end:
+            delay = t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            arrivals.put((pick(), t))
+            t += rnd.expovariate(rps) if poisson else 1.0 / rps
+        for _ in range(concurrency):
+            arrivals.put(None)
+
+    target = closed_worker if rps is None else open_worker
+    threads = [threading.Thread(target=target, args=(i,), name=f"loadgen-{i}", daemon=True) for i in range(concurrency)]
+    if rps is not None:
+        threads.append(threading.Thread(target=schedule, name="loadgen-schedule", daemon=True))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Closed-loop users finish their last request after `end`; count the time they took
+    seconds = max(time.perf_counter(), end) - measure_from if rps is None else duration_s
+
+    merged: dict[str, EndpointStats] = {}
+    for stats in per_worker:
+        for name, st in stats.items():
+            merged.setdefault(name, EndpointStats()).merge(st)
+    total = EndpointStats()
+    for st in merged.values():
+        total.merge(st)
+    paths = {e.name: e.path for e in mix}
+    return {
+        "mode": "closed" if rps is None else "open",
+        "transport": transport.name,
+        "target": transport.target,
+        "concurrency": concurrency,
+        "target_rps": rps,
+        "think_ms": think_ms,
+        "duration_s": duration_s,
+        "warmup_s": warmup_s,
+        "seconds": seconds,
+        "dropped": dropped[0],
+        "mix": [{"name": e.name, "path": e.path, "weight": e.weight} for e in mix],
+        "total": total.summary(seconds),
+        "endpoints": {name: {"path": paths[name], **st.summary(seconds)} for name, st in sorted(merged.items())},
+    }
+
+
+def save(result: dict, name: str = ""):
+    from perfmetrics.models import LoadTestResult, LoadTestRun
+
+    t = result["total"]
+    lr = LoadTestRun.objects.create(
+        name=name,
+        mode=result["mode"],
+        transport=result["transport"],
+        target=result["target"],
+        concurrency=result["concurrency"],
+        target_rps=result["target_rps"],
+        think_ms=result["think_ms"],
+        duration_s=result["duration_s"],
+        warmup_s=result["warmup_s"],
+        requests=t["requests"],
+        errors=t["errors"],
+        dropped=result["dropped"],
+        achieved_rps=t["throughput_rps"],
+        p50_ms=t["p50_ms"],
+        p95_ms=t["p95_ms"],
+        p99_ms=t["p99_ms"],
+        mix=result["mix"],
+    )
+    LoadTestResult.objects.bulk_create([
+        LoadTestResult(
+            run=lr, endpoint=ep, path=r["path"], requests=r["requests"], errors=r["errors"], statuses=r["statuses"],
+            avg_ms=r["avg_ms"], min_ms=r["min_ms"], max_ms=r["max_ms"], p50_ms=r["p50_ms"], p95_ms=r["p95_ms"],
+            p99_ms=r["p99_ms"], throughput_rps=r["throughput_rps"], histogram=r["histogram"],
+        )
+        for ep, r in result["endpoints"].items()
+    ])
+    return lr
@@ -0,0 +1,65 @@
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perfmetrics import advisor
+
+
+def _mb(n):
+    return "-" if n is None else f"{n / 1024 / 1024:.1f}MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Suggest covering, partial and BRIN indexes for core_trip from the analytics query catalog and flag "
+        "existing indexes to drop. Optionally test candidates with HypoPG (--test hypo) or on a sampled copy "
+        "of the table (--test sample)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", help="DB alias (default: the analytics alias; 'default' for --test sample)")
+        parser.add_argument("--test", choices=["hypo", "sample"], help="Measure each candidate")
+        parser.add_argument("--sample-pct", type=float, default=1.0,
+                            help="TABLESAMPLE SYSTEM percentage for --test sample (default: 1)")
+        parser.add_argument("--days", type=int, default=7, help="QueryHit history used to weight queries (default: 7)")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if not 0 < options["sample_pct"] <= 100:
+            raise CommandError("--sample-pct must be in (0, 100]")
+        try:
+            report = advisor.advise(options["database"], options["test"], options["sample_pct"], options["days"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        if options["json"]:
+            self.stdout.write(json.dumps({
+                "queries": [{"name": q.name, "weight": q.weight, "cost": q.cost,
+                             "indexes_used": sorted(q.indexes_used)} for q in report["queries"]],
+                "indexes": report["indexes"],
+                "candidates": [{**asdict(c), "gain_pct": c.gain_pct, "score": c.score} for c in report["candidates"]],
+            }, indent=2))
+            return
+
+        self.stdout.write(self.style.WARNING(f"Existing indexes on {advisor.TABLE}"))
+        for i in report["indexes"]:
+            self.stdout.write(f"  {i['name']:<48} scans={i['idx_scan']:<10} {_mb(i['size_bytes']):>9}"
+                              f"{'  unique' if i['unique'] else ''}")
+
+        self.stdout.write(self.style.WARNING("Candidates"))
+        for c in report["candidates"]:
+            self.stdout.write(f"  [{c.kind}] {c.ddl}")
+            self.stdout.write(f"      {c.reason}")
+            if c.queries:
+                self.stdout.write(f"      queries: {', '.join(c.queries)} (hits={c.weight:.0f})")
+            if c.ms_before is not None:
+                self.stdout.write(f"      sample: {c.ms_before:.1f} -> {c.ms_after:.1f} ms")
+            elif c.cost_before is not None:
+                self.stdout.write(f"      cost: {c.cost_before:.0f} -> {c.cost_after:.0f}")
+            if c.gain_pct is not None:
+                self.stdout.write(f"      gain: {c.gain_pct:+.1f}%")
+            if c.size_bytes is not None:
+                self.stdout.write(f"      size: {_mb(c.size_bytes)}")
+            if c.insert_ms_per_10k is not None:
+                self.stdout.write(f"      ingest: +{c.insert_ms_per_10k:.2f} ms per 10k rows")
@@ -0,0 +1,66 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perfmetrics import regression
+from perfmetrics.models import BenchmarkBaseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Save the latest benchmark runs as a named baseline, or compare two run sets (baseline names or "
+        "'latest') with bootstrap confidence intervals. Exits 1 when a regression exceeds --threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--save", metavar="NAME", help="Save the latest run per query as baseline NAME")
+        parser.add_argument("--description", default="", help="Description for --save")
+        parser.add_argument("--label-prefix", help="Only include labels starting with this (for --save)")
+        parser.add_argument("--replace", action="store_true", help="Overwrite an existing baseline with --save")
+        parser.add_argument("--base", help="Baseline name (or 'latest') to compare against")
+        parser.add_argument("--new", default=regression.LATEST, help="Run set to compare (default: latest)")
+        parser.add_argument("--stat", choices=sorted(regression.STATS), default="p50")
+        parser.add_argument("--threshold", type=float, default=5.0,
+                            help="Minimum slowdown in percent to count as a regression (default: 5)")
+        parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+
+    def handle(self, *args, **options):
+        if options["save"]:
+            if not options["replace"] and BenchmarkBaseline.objects.filter(name=options["save"]).exists():
+                raise CommandError(f"Baseline {options['save']!r} exists; use --replace")
+            b = regression.create_baseline(options["save"], options["description"],
+                                           options["label_prefix"], options["replace"])
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline {b.name} with {b.runs.count()} runs"))
+            if not options["base"]:
+                return
+        if not options["base"]:
+            raise CommandError("Pass --save NAME and/or --base NAME")
+
+        try:
+            report = regression.compare(options["base"], options["new"], options["stat"], options["threshold"])
+        except BenchmarkBaseline.DoesNotExist:
+            raise CommandError("Unknown baseline")
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"{options['stat']} {report['base']} -> {report['new']} "
+                              f"({int(report['confidence'] * 100)}% bootstrap CI)")
+            for r in report["results"]:
+                style = {"regression": self.style.ERROR, "improvement": self.style.SUCCESS}.get(r["status"], str)
+                delta = (f"{r['delta_pct']:>+8.2f}% [{r['ci_low_pct']:+.2f}, {r['ci_high_pct']:+.2f}]"
+                         if r["delta_pct"] is not None else f"{'n/a':>9}")
+                self.stdout.write(style(
+                    f"{r['label']:<44} {r['phase']:<5} c={r['concurrency']:<3} "
+                    f"{'SF' + str(r['scale_factor']) if r['scale_factor'] else '':<6} {r['base_ms']:>10.2f} -> "
+                    f"{r['new_ms']:>10.2f} ms {delta} {r['status']}"
+                ))
+            for key in report["only_in_base"]:
+                self.stdout.write(f"only in {report['base']}: {key}")
+            for key in report["only_in_new"]:
+                self.stdout.write(f"only in {report['new']}: {key}")
+
+        if report["regressions"]:
+            self.stderr.write(self.style.ERROR(f"{report['regressions']} regression(s) beyond {options['threshold']}%"))
+            sys.exit(1)
@@ -0,0 +1,163 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from core import benchdata, synthetic
+from core.models import Trip
+from NYT.routers import BENCH_ALIAS
+
+# Ingestion paths to compare: name -> dotted path of a callable(file_path) -> rows reported
+ENGINES = {
+    "orm": "core.ingest.ingest_parquet",
+    "fast": "core.fast_db_connections._ingest_parquet_fast",
+}
+
+
+def _csv(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _child_env(using: str) -> dict:
+    # The engines write through the default connection, so point the child's default at the bench database
+    db = settings.DATABASES[using]
+    return {
+        **os.environ,
+        "POSTGRES_DB": str(db["NAME"]),
+        "POSTGRES_USER": str(db.get("USER") or ""),
+        "POSTGRES_PASSWORD": str(db.get("PASSWORD") or ""),
+        "POSTGRES_HOST": str(db.get("HOST") or ""),
+        "POSTGRES_PORT": str(db.get("PORT") or ""),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every Parquet ingestion path on the same files, each in a fresh process, and report rows/s, "
+        "peak RSS and the growth of core_trip and the database. Runs against the benchmark database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help="Parquet files (default: one generated with --rows)")
+        parser.add_argument("--engines", default=",".join(ENGINES),
+                            help=f"Comma-separated engine names ({', '.join(ENGINES)}) or dotted paths to "
+                                 "callable(file_path) -> rows")
+        parser.add_argument("--rows", type=int, default=200_000, help="Rows of the generated file (default: 200000)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--tz-aware", action="store_true", help="Generate tz-aware timestamps")
+        parser.add_argument("--repeat", type=int, default=1, help="Runs per engine and file (default: 1)")
+        parser.add_argument("--database", default=BENCH_ALIAS, help=f"DB alias (default: {BENCH_ALIAS})")
+        parser.add_argument("--truncate", action="store_true",
+                            help="TRUNCATE core_trip in the benchmark database before every run, so each starts "
+                                 "from an empty table")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+        parser.add_argument("--child", help="Internal: run one engine on one file in this process")
+
+    # -- child: one engine, one file, fresh interpreter so RSS is not shared
+
+    def _child(self, spec, path):
+        fn = import_string(ENGINES.get(spec, spec))
+        base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        rows = fn(path)
+        seconds = time.perf_counter() - t0
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(json.dumps({"rows": rows, "seconds": seconds, "base_rss_kb": base_kb, "peak_rss_kb": peak_kb}))
+
+    # -- parent
+
+    def _sizes(self):
+        with connections[self.using].cursor() as cur:
+            cur.execute("SELECT pg_total_relation_size(%s), pg_database_size(current_database()), count(*) FROM "
+                        f"{Trip._meta.db_table}", [Trip._meta.db_table])
+            return cur.fetchone()
+
+    def _run(self, spec, path):
+        if self.truncate:
+            with connections[self.using].cursor() as cur:
+                cur.execute(f"TRUNCATE {Trip._meta.db_table}")
+        table_before, db_before, rows_before = self._sizes()
+        proc = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_ingest", "--child", spec, path],
+            capture_output=True, text=True, env=_child_env(self.using),
+        )
+        table_after, db_after, rows_after = self._sizes()
+        out = {"engine": spec, "file": os.path.basename(path), "rows_inserted": rows_after - rows_before,
+               "table_growth_bytes": table_after - table_before, "db_growth_bytes": db_after - db_before}
+        if proc.returncode != 0:
+            return {**out, "error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+        res = json.loads(proc.stdout.strip().splitlines()[-1])
+        return {
+            **out,
+            "rows_reported": res["rows"],
+            "seconds": round(res["seconds"], 3),
+            "rows_per_s": round(out["rows_inserted"] / res["seconds"], 1) if res["seconds"] else None,
+            "peak_rss_mb": round(res["peak_rss_kb"] / 1024, 1),
+            "rss_growth_mb": round((res["peak_rss_kb"] - res["base_rss_kb"]) / 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        if options["child"]:
+            if len(options["files"]) != 1:
+                raise CommandError("--child takes exactly one file")
+            return self._child(options["child"], options["files"][0])
+
+        engines = _csv(options["engines"])
+        for spec in engines:
+            try:
+                import_string(ENGINES.get(spec, spec))
+            except ImportError as e:
+                raise CommandError(f"Unknown engine {spec!r}: {e}")
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be >= 1")
+        try:
+            benchdata.require_alias(options["database"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.using = options["database"]
+        self.truncate = options["truncate"]
+
+        files, generated = list(options["files"]), None
+        if not files:
+            fd, generated = tempfile.mkstemp(suffix=".parquet")
+            os.close(fd)
+            info = synthetic.generate(generated, options["rows"], seed=options["seed"], tz_aware=options["tz_aware"])
+            self.stdout.write(f"Generated {info['rows']} rows ({info['bytes'] / 1e6:.1f} MB) in {generated}")
+            files = [generated]
+        if not self.truncate:
+            self.stderr.write("core_trip is not truncated between runs; growth is measured on top of earlier rows")
+
+        results = []
+        try:
+            for path in files:
+                for spec in engines:
+                    for _ in range(options["repeat"]):
+                        self.stdout.write(self.style.WARNING(f"Ingesting {os.path.basename(path)} with {spec}"))
+                        results.append(self._run(spec, path))
+        finally:
+            if generated:
+                os.remove(generated)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write("")
+        self.stdout.write(f"{'engine':<12} {'file':<24} {'inserted':>9} {'reported':>9} {'rows/s':>10} {'peak MB':>8} "
+                          f"{'+RSS MB':>8} {'table +MB':>9} {'db +MB':>8}")
+        for r in results:
+            if "error" in r:
+                self.stdout.write(self.style.ERROR(f"{r['engine']:<12} {r['file']:<24} error: {r['error']}"))
+                continue
+            self.stdout.write(
+                f"{r['engine']:<12} {r['file'][:24]:<24} {r['rows_inserted']:>9} {r['rows_reported']:>9} "
+                f"{r['rows_per_s'] or 0:>10.0f} {r['peak_rss_mb']:>8.1f} {r['rss_growth_mb']:>8.1f} "
+                f"{r['table_growth_bytes'] / 1e6:>9.1f} {r['db_growth_bytes'] / 1e6:>8.1f}"
+            )
@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from NYT.routers import analytics_db
+from analytics.catalog import BY_NAME, METRICS
+from perfmetrics import prepared
+
+MODES = ("fresh", "persistent", "prepared")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request DB overhead: a fresh connection per request vs. a persistent "
+        "connection vs. a persistent connection with prepared statements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sql", action="append", help="Query to run (repeatable)")
+        parser.add_argument("--metric", action="append", choices=sorted(BY_NAME) + ["all"],
+                            help="Catalog metric to run (repeatable; 'all' for every metric)")
+        parser.add_argument("--variant", default="raw", help="Catalog source variant for --metric (default: raw)")
+        parser.add_argument("--runs", type=int, default=200, help="Requests per mode (default: 200)")
+        parser.add_argument("--plan-only", action="store_true",
+                            help="Wrap each query in LIMIT 0 so only connect/parse/plan cost is measured")
+
+    def _once(self, mode: str, sql: str) -> float:
+        conn = connections[self.alias]
+        if mode == "fresh":
+            conn.close()
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            if mode == "prepared":
+                prepared.execute(conn, cur, sql)
+            else:
+                cur.execute(sql)
+            cur.fetchall()
+        return (time.perf_counter() - t0) * 1000.0
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        if runs < 1:
+            raise CommandError("runs must be >= 1")
+        queries = list(options["sql"] or [])
+        names = options["metric"] or []
+        variant = options["variant"]
+        if "all" in names:
+            metrics = [m for m in METRICS if variant in m.variants]
+        else:
+            metrics = [BY_NAME[n] for n in names]
+        try:
+            queries += [m.render(variant) for m in metrics]
+        except KeyError as e:
+            raise CommandError(str(e))
+        queries = queries or ["SELECT 1"]
+        if options["plan_only"]:
+            queries = [f"SELECT * FROM ({q}) q LIMIT 0" for q in queries]
+        self.alias = analytics_db()
+
+        results = {}
+        for mode in MODES:
+            samples = []
+            for _ in range(runs):
+                for sql in queries:
+                    samples.append(self._once(mode, sql))
+            samples.sort()
+            results[mode] = {
+                "mean_ms": statistics.fmean(samples),
+                "p50_ms": samples[len(samples) // 2],
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            }
+
+        base = results["fresh"]["mean_ms"]
+        for mode, r in results.items():
+            saved = base - r["mean_ms"]
+            self.stdout.write(
+                f"{mode:<11} mean={r['mean_ms']:.3f} ms p50={r['p50_ms']:.3f} ms p95={r['p95_ms']:.3f} ms "
+                f"saved/request={saved:.3f} ms"
+            )
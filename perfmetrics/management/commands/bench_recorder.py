@@ -0,0 +1,56 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perfmetrics import recorder
+from perfmetrics.models import QueryHit
+
+MODES = ("sync", "thread")
+BENCH_LABEL = "bench.recorder"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request cost of recording a QueryHit: one INSERT per hit (sync) "
+        "vs. the buffered recorder (thread). Benchmark rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=2000, help="Hits recorded per mode (default: 2000)")
+        parser.add_argument("--flush-size", type=int, default=500, help="Buffered flush size (default: 500)")
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        if runs < 1:
+            raise CommandError("runs must be >= 1")
+
+        results = {}
+        try:
+            for mode in MODES:
+                # Long interval: only size-triggered and final flushes, so timings are repeatable
+                rec = recorder.Recorder(mode=mode, flush_size=options["flush_size"], flush_interval_s=3600,
+                                        max_buffer=runs * 2, sampling={"*": 1.0})
+                samples = []
+                t_all = time.perf_counter()
+                for i in range(runs):
+                    t0 = time.perf_counter()
+                    rec.record(label=BENCH_LABEL, view_name=mode, sql_text="SELECT 1",
+                               elapsed_ms=1.0, queue_ms=0.0, rows=1, optimized=False)
+                    samples.append((time.perf_counter() - t0) * 1000.0)
+                rec.flush()
+                total_ms = (time.perf_counter() - t_all) * 1000.0
+                samples.sort()
+                results[mode] = {
+                    "mean_ms": statistics.fmean(samples),
+                    "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                    "amortized_ms": total_ms / runs,
+                }
+        finally:
+            QueryHit.objects.filter(label=BENCH_LABEL).delete()
+
+        for mode, r in results.items():
+            self.stdout.write(
+                f"{mode:<7} in-request mean={r['mean_ms']:.4f} ms p99={r['p99_ms']:.4f} ms "
+                f"amortized incl. writes={r['amortized_ms']:.4f} ms"
+            )
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics import optimize
+from analytics.catalog import BY_NAME, METRICS
+from core import benchdata
+from NYT.routers import BENCH_ALIAS
+from perfmetrics.models import BenchmarkRun
+from perfmetrics.utils import counter_pcts, fetch_db_counters, run_latency_benchmark
+
+
+def _csv(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the analytics query catalog against deterministic scale-factor datasets (populate_benchdb) in the "
+        "benchmark database and store one BenchmarkRun per metric, variant and scale factor (target 'bench')."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="1,10", help="Scale factors, comma-separated (default: 1,10)")
+        parser.add_argument("--metric", action="append", choices=sorted(BY_NAME),
+                            help="Catalog metric (repeatable; default: all)")
+        parser.add_argument("--variant", default="raw,clean,rollup",
+                            help="Catalog source variants, comma-separated (default: raw,clean,rollup)")
+        parser.add_argument("--runs", type=int, default=10, help="Timed runs per query (default: 10)")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed runs per query (default: 2)")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--database", default=BENCH_ALIAS, help=f"DB alias (default: {BENCH_ALIAS})")
+
+    def handle(self, *args, **options):
+        try:
+            scales = sorted(int(s) for s in _csv(options["scales"]))
+        except ValueError:
+            raise CommandError("--scales takes integers, e.g. 1,10,100")
+        if not scales or scales[0] < 1 or options["runs"] < 1:
+            raise CommandError("scale factors and --runs must be >= 1")
+        using = options["database"]
+        try:
+            benchdata.require_alias(using)
+        except ValueError as e:
+            raise CommandError(str(e))
+        metrics = [BY_NAME[n] for n in options["metric"]] if options["metric"] else METRICS
+        variants = _csv(options["variant"])
+
+        saved = []
+        for sf in scales:
+            res = benchdata.populate(sf, options["seed"], using, log=lambda msg: self.stdout.write(msg, ending="\r"))
+            self.stdout.write(self.style.WARNING(f"SF{sf}: {res['rows']} trips"
+                                                 f"{' (already loaded)' if res['skipped'] else ''}"))
+            if set(variants) - {"raw"}:
+                ms = sum(optimize.build_all(using).values())
+                self.stdout.write(f"SF{sf}: built optimized tables in {ms:.0f} ms")
+
+            for m in metrics:
+                for variant in variants:
+                    if variant not in m.variants:
+                        continue
+                    label = f"{m.name}.{variant}"
+                    self.stdout.write(f"SF{sf}: {label}")
+                    before = fetch_db_counters(using)
+                    try:
+                        r = run_latency_benchmark(m.render(variant), options["runs"], m.params, options["warmup"],
+                                                  options["concurrency"], using=using)
+                    except RuntimeError as e:
+                        self.stderr.write(f"SF{sf} {label}: {e}")
+                        continue
+                    after = fetch_db_counters(using)
+                    pcts = counter_pcts(before, after)
+                    saved.append(BenchmarkRun.objects.create(
+                        label=label, sql_text=m.render(variant), target="bench", phase="warm",
+                        concurrency=options["concurrency"], runs=options["runs"], warmup_runs=options["warmup"],
+                        scale_factor=sf, dataset_rows=res["rows"], errors=r.get("errors", 0),
+                        avg_ms=r["avg_ms"], min_ms=r["min_ms"], max_ms=r["max_ms"], p50_ms=r["p50_ms"],
+                        p95_ms=r["p95_ms"], p99_ms=r["p99_ms"], throughput_qps=r["throughput_qps"],
+                        samples_ms=r["samples_ms"], idx_usage_pct=pcts.get("idx_usage_pct"),
+                        db_cache_hit_pct=pcts.get("db_cache_hit_pct"), stats_before=before, stats_after=after,
+                    ))
+
+        # p50 per label across scale factors: the scaling curve
+        table = {}
+        for br in saved:
+            table.setdefault(br.label, {})[br.scale_factor] = br.p50_ms
+        self.stdout.write("")
+        self.stdout.write(f"{'p50 ms':<44}" + "".join(f"{'SF' + str(sf):>11}" for sf in scales))
+        for label, by_sf in table.items():
+            self.stdout.write(f"{label:<44}" + "".join(
+                f"{by_sf[sf]:>11.2f}" if sf in by_sf else f"{'-':>11}" for sf in scales
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Saved {len(saved)} BenchmarkRun rows (target=bench)"))
@@ -1,51 +1,210 @@
+import subprocess
+
 from django.core.management.base import BaseCommand, CommandError
-from perfmetrics.utils import run_latency_benchmark, fetch_idx_usage_pct, fetch_db_cache_hit_pct
+from django.db import connections
+
+from perfmetrics.utils import counter_pcts, fetch_db_counters, latency_stats, measure, run_latency_benchmark
 from perfmetrics.models import BenchmarkRun
+from analytics.catalog import BY_NAME, METRICS
+from NYT.routers import analytics_db
+
+# --via http: API versions to compare, as (label prefix, label suffix, URL template)
+HTTP_VERSIONS = {
+    "v1": ("V1", "", "/api/v1/{slug}/"),
+    "v2": ("V2", "", "/api/v2/{slug}/"),
+    "v2opt": ("V2", ".opt", "/api/v2/{slug}/?optimized=1"),
+    "v3": ("V3", "", "/api/v3/{slug}/"),
+}
+
+
+def _csv(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
 
 class Command(BaseCommand):
-    help = "Run a latency benchmark for a given SQL and store results."
+    help = (
+        "Benchmark one SQL statement, catalog metrics, or the API endpoints: warm-up, warm runs at one or "
+        "more client concurrency levels and optional cold-cache runs. Results are stored in BenchmarkRun."
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("--label", required=True, help="e.g., V1 / V2 / V3")
-        parser.add_argument("--sql", required=True, help="SQL text to execute")
-        parser.add_argument("--runs", type=int, default=30, help="Repetitions (default: 30)")
-        parser.add_argument("--no-stats", action="store_true", help="Skip DB stats snapshot")
+        parser.add_argument("--label", help="e.g., V1 / V2 / V3 (default: <metric>.<variant>)")
+        parser.add_argument("--sql", help="SQL text to execute")
+        parser.add_argument("--metric", action="append", choices=sorted(BY_NAME),
+                            help="Catalog metric to run instead of --sql (repeatable)")
+        parser.add_argument("--all", action="store_true", help="Run every catalog metric")
+        parser.add_argument("--variant", default="raw",
+                            help="Catalog source variants, comma-separated: raw,clean,rollup (default: raw)")
+        parser.add_argument("--via", choices=["sql", "http"], default="sql",
+                            help="Run the SQL directly, or call the API endpoints over HTTP")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server for --via http")
+        parser.add_argument("--versions", default="v1,v2,v2opt",
+                            help=f"API versions for --via http, comma-separated: {','.join(HTTP_VERSIONS)}")
+        parser.add_argument("--runs", type=int, default=30, help="Timed repetitions per concurrency level (default: 30)")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per client before timing (default: 3)")
+        parser.add_argument("--concurrency", default="1", help="Client concurrency levels, comma-separated (default: 1)")
+        parser.add_argument("--cold-runs", type=int, default=0, help="Cold-cache runs, each after --cold-cmd")
+        parser.add_argument("--cold-cmd",
+                            help="Shell command that empties the caches before each cold run, e.g. "
+                                 "'sudo systemctl restart postgresql && sync && echo 3 | sudo tee /proc/sys/vm/drop_caches'")
+        parser.add_argument("--no-stats", action="store_true", help="Skip DB stats snapshots")
 
-    def handle(self, *args, **options):
-        label = options["label"]
-        sql = options["sql"]
-        runs = options["runs"]
+    # -- targets: (label, text stored as sql_text, arg); arg is the bind parameters for SQL
+    #    targets and the make_call for perfmetrics.utils.measure for HTTP ones
 
-        if runs < 1:
-            raise CommandError("runs must be >= 1")
+    def _sql_targets(self, options):
+        if options["sql"]:
+            if not options["label"]:
+                raise CommandError("--label is required with --sql")
+            return [(options["label"], options["sql"], ())]
+        metrics = METRICS if options["all"] else [BY_NAME[n] for n in options["metric"] or []]
+        if not metrics:
+            raise CommandError("Pass --sql, --metric or --all")
+        targets = []
+        for m in metrics:
+            for variant in _csv(options["variant"]):
+                if variant not in m.variants:
+                    if options["all"]:
+                        continue
+                    raise CommandError(f"{m.name} has no {variant!r} variant")
+                label = options["label"] if options["label"] and len(metrics) == 1 else f"{m.name}.{variant}"
+                targets.append((label, m.render(variant), m.params))
+        return targets
 
-        self.stdout.write(self.style.WARNING(f"Running benchmark: {label} (runs={runs})"))
-        res = run_latency_benchmark(sql=sql, runs=runs)
+    def _http_targets(self, options):
+        import requests
 
-        idx_pct = None
-        hit_pct = None
-        if not options["no-stats"]:
-            try:
-                idx_pct = fetch_idx_usage_pct()
-                hit_pct = fetch_db_cache_hit_pct()
-            except Exception:
-                pass
+        if options["sql"]:
+            raise CommandError("--sql cannot be used with --via http")
+        metrics = METRICS if options["all"] else [BY_NAME[n] for n in options["metric"] or []]
+        if not metrics:
+            raise CommandError("Pass --metric or --all")
+        versions = _csv(options["versions"])
+        unknown = set(versions) - set(HTTP_VERSIONS)
+        if unknown:
+            raise CommandError(f"Unknown versions: {', '.join(sorted(unknown))}")
+
+        def make_call_for(url):
+            def make_call():
+                session = requests.Session()
+
+                def call():
+                    r = session.get(url, timeout=300)
+                    r.raise_for_status()
+                return call
+            return make_call
 
-        br = BenchmarkRun.objects.create(
+        targets = []
+        for m in metrics:
+            for v in versions:
+                prefix, suffix, path = HTTP_VERSIONS[v]
+                url = options["base_url"].rstrip("/") + path.format(slug=m.slug)
+                targets.append((f"{prefix}.{m.name}{suffix}", url, make_call_for(url)))
+        return targets
+
+    # -- phases
+
+    def _stats(self):
+        if self.no_stats:
+            return None
+        try:
+            return fetch_db_counters(self.alias)
+        except Exception as e:
+            self.stderr.write(f"DB stats unavailable: {e}")
+            self.no_stats = True
+            return None
+
+    def _run(self, text, arg, runs, warmup, concurrency):
+        if self.via == "http":
+            return measure(arg, runs, warmup, concurrency)
+        return run_latency_benchmark(sql=text, runs=runs, params=arg, warmup=warmup,
+                                     concurrency=concurrency, using=self.alias)
+
+    def _save(self, label, text, phase, concurrency, runs, warmup, res, before, after):
+        pcts = counter_pcts(before, after) if before and after else {}
+        return BenchmarkRun.objects.create(
             label=label,
-            sql_text=sql,
+            sql_text=text,
+            target=self.via,
+            phase=phase,
+            concurrency=concurrency,
             runs=runs,
+            warmup_runs=warmup,
+            errors=res.get("errors", 0),
             avg_ms=res["avg_ms"],
             min_ms=res["min_ms"],
             max_ms=res["max_ms"],
             p50_ms=res["p50_ms"],
             p95_ms=res["p95_ms"],
+            p99_ms=res["p99_ms"],
+            throughput_qps=res["throughput_qps"],
             samples_ms=res["samples_ms"],
-            idx_usage_pct=idx_pct,
-            db_cache_hit_pct=hit_pct,
+            idx_usage_pct=pcts.get("idx_usage_pct"),
+            db_cache_hit_pct=pcts.get("db_cache_hit_pct"),
+            stats_before=before,
+            stats_after=after,
         )
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Saved: {br} | p50={br.p50_ms:.2f} ms p95={br.p95_ms:.2f} ms "
-            f"cache_hit={br.db_cache_hit_pct} idx_usage={br.idx_usage_pct}"
-        ))
+    def _cold(self, label, text, arg, runs, cold_cmd):
+        samples, errors = [], 0
+        before = self._stats()
+        for _ in range(runs):
+            connections.close_all()
+            subprocess.run(cold_cmd, shell=True, check=True)
+            try:
+                res = self._run(text, arg, 1, 0, 1)
+            except RuntimeError:
+                errors += 1
+                continue
+            samples.extend(res["samples_ms"])
+        if not samples:
+            raise CommandError(f"{label}: every cold run failed")
+        # Reconnect: the cold command may have restarted the server
+        connections.close_all()
+        after = self._stats()
+        return self._save(label, text, "cold", 1, runs, 0, {**latency_stats(samples), "errors": errors}, before, after)
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        if runs < 1:
+            raise CommandError("runs must be >= 1")
+        try:
+            levels = [int(c) for c in _csv(options["concurrency"])]
+        except ValueError:
+            raise CommandError("--concurrency takes integers, e.g. 1,4,16")
+        if not levels or min(levels) < 1:
+            raise CommandError("concurrency must be >= 1")
+        if options["cold_runs"] and not options["cold_cmd"]:
+            raise CommandError("--cold-runs needs --cold-cmd; Postgres keeps its buffers across connections")
+
+        self.via = options["via"]
+        self.alias = analytics_db()
+        self.no_stats = options["no_stats"]
+        targets = self._http_targets(options) if self.via == "http" else self._sql_targets(options)
+
+        saved = []
+        for label, text, arg in targets:
+            for c in levels:
+                self.stdout.write(self.style.WARNING(f"Running benchmark: {label} (runs={runs}, concurrency={c})"))
+                before = self._stats()
+                try:
+                    res = self._run(text, arg, runs, options["warmup"], c)
+                except RuntimeError as e:
+                    self.stderr.write(f"{label}: {e}")
+                    continue
+                saved.append(self._save(label, text, "warm", c, runs, options["warmup"], res, before, self._stats()))
+            if options["cold_runs"]:
+                self.stdout.write(self.style.WARNING(f"Running cold benchmark: {label} (runs={options['cold_runs']})"))
+                saved.append(self._cold(label, text, arg, options["cold_runs"], options["cold_cmd"]))
+
+        self.stdout.write("")
+        self.stdout.write(f"{'label':<44} {'phase':<5} {'c':>3} {'p50':>9} {'p95':>9} {'p99':>9} "
+                          f"{'qps':>8} {'err':>4} {'cache%':>7} {'idx%':>6}")
+        fmt = lambda v, spec: "-" if v is None else format(v, spec)
+        for br in saved:
+            self.stdout.write(
+                f"{br.label:<44} {br.phase:<5} {br.concurrency:>3} {br.p50_ms:>9.2f} {br.p95_ms:>9.2f} "
+                f"{br.p99_ms:>9.2f} {fmt(br.throughput_qps, '>8.1f')} {br.errors:>4} "
+                f"{fmt(br.db_cache_hit_pct, '>7.2f')} {fmt(br.idx_usage_pct, '>6.2f')}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Saved {len(saved)} BenchmarkRun rows"))
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULTS = {
+    # Modules only the ingest paths and Celery workers may load
+    "forbidden": ["pyarrow", "core.ingest", "core.fast_db_connections", "core.synthetic", "core.tasks"],
+    "max_import_ms": None,
+    "max_rss_mb": None,
+}
+
+# What a web worker imports before serving its first request: settings, apps, WSGI handler with all
+# middleware, and every URLconf with its views
+CHILD = """
+import json, resource, sys
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({"rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "modules": sorted(sys.modules)}))
+"""
+
+IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    # (module, depth, self_us, cumulative_us) per line of -X importtime output
+    out = []
+    for line in stderr.splitlines():
+        m = IMPORTTIME.match(line)
+        if m:
+            out.append((m.group(4), (len(m.group(3)) - 1) // 2, int(m.group(1)), int(m.group(2))))
+    return out
+
+
+class Command(BaseCommand):
+    help = (
+        "Start a fresh interpreter with -X importtime, load the WSGI application and all URLconfs like a web "
+        "worker does, and report import time, peak RSS and the slowest imports. Fails if a forbidden module "
+        "(pyarrow, the ingest stack, Celery task modules) is loaded or a budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        cfg = {**DEFAULTS, **getattr(settings, "WEB_IMPORT_CHECK", {})}
+        parser.add_argument("--forbid", action="append", default=None,
+                            help=f"Module that must not be imported (repeatable; default: {', '.join(cfg['forbidden'])})")
+        parser.add_argument("--max-import-ms", type=float, default=cfg["max_import_ms"],
+                            help="Fail if the summed import time exceeds this")
+        parser.add_argument("--max-rss-mb", type=float, default=cfg["max_rss_mb"],
+                            help="Fail if the worker's peak RSS after startup exceeds this")
+        parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list (default: 15)")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        cfg = {**DEFAULTS, **getattr(settings, "WEB_IMPORT_CHECK", {})}
+        forbidden = options["forbid"] or cfg["forbidden"]
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "NYT.settings")}
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD],
+                              cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise CommandError(f"Web startup failed:\n{proc.stderr[-2000:]}")
+        child = json.loads(proc.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(proc.stderr)
+
+        loaded = set(child["modules"])
+        offenders = sorted(m for m in loaded if any(m == f or m.startswith(f + ".") for f in forbidden))
+        top = sorted((i for i in imports if i[1] == 0), key=lambda i: i[3], reverse=True)[:options["top"]]
+        result = {
+            "import_ms": round(sum(i[2] for i in imports) / 1000.0, 1),
+            "rss_mb": round(child["rss_kb"] / 1024.0, 1),
+            "modules": len(loaded),
+            "forbidden_loaded": offenders,
+            "slowest": [{"module": m, "cumulative_ms": round(cum / 1000.0, 1)} for m, _, _, cum in top],
+        }
+
+        failures = []
+        if offenders:
+            failures.append(f"forbidden modules imported: {', '.join(offenders[:10])}")
+        if options["max_import_ms"] is not None and result["import_ms"] > options["max_import_ms"]:
+            failures.append(f"import time {result['import_ms']} ms > {options['max_import_ms']} ms")
+        if options["max_rss_mb"] is not None and result["rss_mb"] > options["max_rss_mb"]:
+            failures.append(f"peak RSS {result['rss_mb']} MB > {options['max_rss_mb']} MB")
+
+        if options["json"]:
+            self.stdout.write(json.dumps({**result, "failures": failures}, indent=2))
+        else:
+            self.stdout.write(f"Imports: {result['import_ms']} ms over {result['modules']} modules, "
+                              f"peak RSS {result['rss_mb']} MB")
+            for row in result["slowest"]:
+                self.stdout.write(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+        if failures:
+            raise CommandError("; ".join(failures))
+        if not options["json"]:
+            self.stdout.write(self.style.SUCCESS("Web startup is within budget"))
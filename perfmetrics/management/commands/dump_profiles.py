@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from perfmetrics import profiler, rollup
+from perfmetrics.models import RequestProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the sampled stacks of an endpoint's profiled requests as folded stacks ('frame;frame count'), "
+        "for flamegraph.pl or speedscope. Without --endpoint, list the profiled endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", help="Route as stored, e.g. api/v2/daily-trips/")
+        parser.add_argument("--window", default="24h", help="How far back, e.g. 30m, 6h, 7d (default: 24h)")
+
+    def handle(self, *args, **options):
+        try:
+            window = rollup.parse_window(options["window"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not options["endpoint"]:
+            seen = {}
+            for ep, n, samples in RequestProfile.objects.values_list("endpoint", "requests", "samples"):
+                r, s = seen.get(ep, (0, 0))
+                seen[ep] = (r + n, s + samples)
+            for ep, (n, samples) in sorted(seen.items()):
+                self.stdout.write(f"{ep:<60} requests={n:<8} samples={samples}")
+            return
+        stacks = profiler.folded(options["endpoint"], window)
+        if not stacks:
+            raise CommandError(f"No profiles for {options['endpoint']!r} in the last {options['window']}")
+        for stack, n in stacks.most_common():
+            self.stdout.write(f"{stack} {n}")
@@ -0,0 +1,104 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perfmetrics import loadgen
+
+
+def _csv(value: str | None) -> list[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a weighted mix of dashboard API URLs at one or more closed-loop concurrency levels or open-loop "
+        "request rates, over HTTP or in-process through the WSGI app. Per-endpoint latency percentiles, error "
+        "rates and throughput are saved as LoadTestRun / LoadTestResult."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Running server to load")
+        parser.add_argument("--wsgi", action="store_true", help="Call the WSGI application in-process instead of HTTP")
+        parser.add_argument("--endpoint", action="append", metavar="PATH[=WEIGHT]",
+                            help="Request mix entry, e.g. /api/v2/daily-trips/=3 (repeatable; default: catalog mix)")
+        parser.add_argument("--versions", default="v1,v2",
+                            help=f"API versions in the default mix, comma-separated: {','.join(loadgen.API_PATHS)}")
+        parser.add_argument("--no-metrics-endpoints", action="store_true",
+                            help="Leave /metrics/hits/* out of the default mix")
+        parser.add_argument("--concurrency", default="10",
+                            help="Closed loop: virtual users, comma-separated levels (default: 10). "
+                                 "Open loop: max requests in flight")
+        parser.add_argument("--rps", help="Open loop: target request rates, comma-separated, e.g. 5,10,20")
+        parser.add_argument("--poisson", action="store_true", help="Open loop: Poisson instead of evenly spaced arrivals")
+        parser.add_argument("--think-ms", type=float, default=0.0, help="Closed loop: pause between a user's requests")
+        parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per level (default: 30)")
+        parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before each level (default: 5)")
+        parser.add_argument("--seed", type=int, help="Random seed for the request mix")
+        parser.add_argument("--name", default="", help="Name stored with the runs")
+        parser.add_argument("--no-save", action="store_true", help="Don't store the results")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def _mix(self, options):
+        if options["endpoint"]:
+            try:
+                return [loadgen.parse_endpoint(s) for s in options["endpoint"]]
+            except ValueError as e:
+                raise CommandError(str(e))
+        versions = _csv(options["versions"])
+        unknown = set(versions) - set(loadgen.API_PATHS)
+        if unknown:
+            raise CommandError(f"Unknown versions: {', '.join(sorted(unknown))}")
+        return loadgen.default_mix(versions, not options["no_metrics_endpoints"])
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(c) for c in _csv(options["concurrency"])]
+            rates = [float(r) for r in _csv(options["rps"])]
+        except ValueError:
+            raise CommandError("--concurrency takes integers and --rps numbers, e.g. 1,10,50")
+        if not levels or min(levels) < 1:
+            raise CommandError("concurrency must be >= 1")
+        if rates and (min(rates) <= 0 or len(levels) > 1):
+            raise CommandError("--rps must be > 0 and takes a single --concurrency (the in-flight cap)")
+        if options["duration"] <= 0:
+            raise CommandError("--duration must be > 0")
+
+        mix = self._mix(options)
+        transport = loadgen.WsgiTransport() if options["wsgi"] else loadgen.HttpTransport(options["base_url"])
+        # (concurrency, rps) per level
+        plan = [(levels[0], r) for r in rates] if rates else [(c, None) for c in levels]
+
+        results = []
+        for concurrency, rps in plan:
+            load = f"{rps:g} rps (max {concurrency} in flight)" if rps else f"{concurrency} users"
+            self.stdout.write(self.style.WARNING(
+                f"Load: {load}, {len(mix)} endpoints via {transport.target}, "
+                f"{options['warmup']:g}s warm-up + {options['duration']:g}s"
+            ))
+            res = loadgen.run(mix, transport, options["duration"], concurrency, rps, options["think_ms"],
+                              options["warmup"], options["poisson"], options["seed"])
+            if not options["no_save"]:
+                res["id"] = loadgen.save(res, options["name"]).id
+            results.append(res)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        fmt = lambda v, spec: "-" if v is None else format(v, spec)
+        for res in results:
+            t = res["total"]
+            load = f"{res['target_rps']:g} rps" if res["target_rps"] else f"c={res['concurrency']}"
+            self.stdout.write("")
+            self.stdout.write(self.style.SUCCESS(
+                f"[{res['mode']} {load}] {t['requests']} requests, {fmt(t['throughput_rps'], '.1f')} ok/s, "
+                f"errors {fmt(t['error_pct'], '.2f')}%, dropped {res['dropped']}, "
+                f"p50/p95/p99 {fmt(t['p50_ms'], '.1f')}/{fmt(t['p95_ms'], '.1f')}/{fmt(t['p99_ms'], '.1f')} ms"
+            ))
+            self.stdout.write(f"{'endpoint':<44} {'req':>6} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'ok/s':>7}  statuses")
+            for name, r in res["endpoints"].items():
+                statuses = " ".join(f"{k}:{n}" for k, n in sorted(r["statuses"].items()))
+                self.stdout.write(
+                    f"{name:<44} {r['requests']:>6} {fmt(r['error_pct'], '>6.2f')} {fmt(r['p50_ms'], '>9.1f')} "
+                    f"{fmt(r['p95_ms'], '>9.1f')} {fmt(r['p99_ms'], '>9.1f')} {fmt(r['throughput_rps'], '>7.2f')}  {statuses}"
+                )
@@ -0,0 +1,45 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.core.signals import request_finished
+from django.db import connections
+
+from perfmetrics import profiler, timing
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header with the request's time per phase (perfmetrics.timing) to
+    requests under PERF_TIMING["paths"], and profiles PERF_TIMING["profile_rate"] of them
+    (perfmetrics.profiler).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cfg = timing.config()
+        self.paths = tuple(self.cfg["paths"])
+        request_finished.connect(profiler.finish_deferred, dispatch_uid="perfmetrics.profiler.finish_deferred")
+
+    def __call__(self, request):
+        if not self.cfg["enabled"] or not request.path.startswith(self.paths):
+            return self.get_response(request)
+
+        profile = random.random() < self.cfg["profile_rate"]
+        if profile:
+            profiler.start(self.cfg["profile_interval_ms"])
+        t0 = time.perf_counter()
+        with timing.collect() as totals, ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timing.execute_wrapper))
+            response = self.get_response(request)
+        response["Server-Timing"] = timing.header(totals, (time.perf_counter() - t0) * 1000.0)
+
+        if profile:
+            match = request.resolver_match
+            endpoint = match.route if match else request.path
+            if response.streaming:
+                profiler.defer(endpoint)
+            else:
+                profiler.finish(endpoint)
+        return response
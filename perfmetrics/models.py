@@ -7,13 +7,17 @@ class QueryHit(models.Model):
     view_name = models.CharField(max_length=128)
     sql_text = models.TextField()
 
-    # Execution metrics
+    # Execution metrics (elapsed_ms is run time only; queue_ms is the admission wait before it)
     elapsed_ms = models.FloatField()
+    queue_ms = models.FloatField(default=0)
     rows = models.IntegerField()
 
     # Optional flags
     optimized = models.BooleanField(default=False)
 
+    # Fraction of hits for this label that were recorded (see perfmetrics.recorder)
+    sample_rate = models.FloatField(default=1.0)
+
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
@@ -24,3 +28,247 @@ class QueryHit(models.Model):
 
     def __str__(self):
         return f"{self.created_at:%Y-%m-%d %H:%M:%S} | {self.label} | {self.elapsed_ms:.2f} ms | rows={self.rows}"
+
+
+class QueryHitRollup(models.Model):
+    # Per-label QueryHit aggregates for one minute or one hour (see perfmetrics.rollup).
+    # Counts and sums are re-weighted by 1 / sample_rate.
+    MINUTE = "m"
+    HOUR = "h"
+    RESOLUTIONS = [(MINUTE, "minute"), (HOUR, "hour")]
+
+    resolution = models.CharField(max_length=1, choices=RESOLUTIONS)
+    bucket_start = models.DateTimeField()
+    label = models.CharField(max_length=128)
+
+    count = models.FloatField()
+    sum_ms = models.FloatField()
+    min_ms = models.FloatField()
+    max_ms = models.FloatField()
+    sum_queue_ms = models.FloatField(default=0)
+    max_queue_ms = models.FloatField(default=0)
+    rows = models.FloatField(default=0)
+
+    # Log-bucketed elapsed_ms histogram, mergeable across buckets (perfmetrics.histogram)
+    histogram = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["resolution", "label", "bucket_start"], name="queryhitrollup_bucket_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["resolution", "bucket_start"]),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket_start:%Y-%m-%d %H:%M} [{self.resolution}] | {self.label} | n={self.count:.0f}"
+
+
+class BenchmarkRun(models.Model):
+    # One bench_sql measurement: a SQL statement or endpoint, one phase, one concurrency level
+    PHASES = [("warm", "warm"), ("cold", "cold")]
+
+    label = models.CharField(max_length=128)
+    sql_text = models.TextField()
+    target = models.CharField(max_length=16, default="sql")  # "sql", "http" or "bench" (bench_scale)
+    phase = models.CharField(max_length=8, choices=PHASES, default="warm")
+    # bench_scale: the scale factor and trip count of the benchmark dataset
+    scale_factor = models.PositiveIntegerField(null=True, blank=True)
+    dataset_rows = models.BigIntegerField(null=True, blank=True)
+    concurrency = models.PositiveIntegerField(default=1)
+    runs = models.PositiveIntegerField()
+    warmup_runs = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+
+    avg_ms = models.FloatField()
+    min_ms = models.FloatField()
+    max_ms = models.FloatField()
+    p50_ms = models.FloatField()
+    p95_ms = models.FloatField()
+    p99_ms = models.FloatField()
+    throughput_qps = models.FloatField(null=True, blank=True)
+    samples_ms = models.JSONField(default=list)
+
+    # Computed from pg_stat_* counter deltas over the run; raw counters kept alongside
+    idx_usage_pct = models.FloatField(null=True, blank=True)
+    db_cache_hit_pct = models.FloatField(null=True, blank=True)
+    stats_before = models.JSONField(null=True, blank=True)
+    stats_after = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["label", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} | {self.label} [{self.phase} c={self.concurrency}] | p50={self.p50_ms:.2f} ms"
+
+
+class BenchmarkBaseline(models.Model):
+    # A named set of BenchmarkRuns to compare later runs against (see perfmetrics.regression)
+    name = models.CharField(max_length=64, unique=True)
+    description = models.TextField(blank=True)
+    runs = models.ManyToManyField(BenchmarkRun, related_name="baselines")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+
+class QueryPlan(models.Model):
+    # Sampled EXPLAIN (ANALYZE, BUFFERS) of an analytics query (see perfmetrics.plans)
+    label = models.CharField(max_length=128)
+    sql_text = models.TextField()
+    fingerprint = models.CharField(max_length=40)
+    plan = models.JSONField()
+
+    planning_ms = models.FloatField()
+    execution_ms = models.FloatField()
+    query_elapsed_ms = models.FloatField(null=True, blank=True)  # the sampled request's own timing
+
+    shared_hit_blocks = models.BigIntegerField(default=0)
+    shared_read_blocks = models.BigIntegerField(default=0)
+    temp_written_blocks = models.BigIntegerField(default=0)
+    max_estimate_error = models.FloatField(null=True, blank=True)
+    worst_estimate_node = models.CharField(max_length=200, blank=True)
+
+    plan_changed = models.BooleanField(default=False)
+    previous_fingerprint = models.CharField(max_length=40, blank=True)
+    latency_shift_pct = models.FloatField(null=True, blank=True)
+    flagged = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["label", "created_at"]),
+            models.Index(fields=["flagged", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} | {self.label} | {self.fingerprint[:12]} | {self.execution_ms:.2f} ms"
+
+
+class DbStatsSnapshot(models.Model):
+    # Cumulative pg_stat_* counters of the analytics database at one point in time (see
+    # perfmetrics.dbstats); deltas between consecutive snapshots give per-interval activity
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    database = models.CharField(max_length=128)
+    blks_hit = models.BigIntegerField()
+    blks_read = models.BigIntegerField()
+    xact_commit = models.BigIntegerField()
+    temp_bytes = models.BigIntegerField()
+    stats_reset = models.DateTimeField(null=True, blank=True)
+    # inet_server_addr():port of the server the counters came from
+    server = models.CharField(max_length=64, blank=True, default="")
+    has_statements = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} | {self.database}"
+
+
+class TableStat(models.Model):
+    snapshot = models.ForeignKey(DbStatsSnapshot, on_delete=models.CASCADE, related_name="tables")
+    relname = models.CharField(max_length=128)
+    seq_scan = models.BigIntegerField()
+    seq_tup_read = models.BigIntegerField()
+    idx_scan = models.BigIntegerField()
+    idx_tup_fetch = models.BigIntegerField()
+    n_tup_ins = models.BigIntegerField()
+    n_live_tup = models.BigIntegerField()
+    heap_blks_read = models.BigIntegerField()
+    heap_blks_hit = models.BigIntegerField()
+    idx_blks_read = models.BigIntegerField()
+    idx_blks_hit = models.BigIntegerField()
+
+
+class IndexStat(models.Model):
+    snapshot = models.ForeignKey(DbStatsSnapshot, on_delete=models.CASCADE, related_name="indexes")
+    relname = models.CharField(max_length=128)
+    indexrelname = models.CharField(max_length=128)
+    idx_scan = models.BigIntegerField()
+    idx_tup_read = models.BigIntegerField()
+    idx_blks_read = models.BigIntegerField()
+    idx_blks_hit = models.BigIntegerField()
+    size_bytes = models.BigIntegerField()
+    is_unique = models.BooleanField(default=False)
+
+
+class StatementStat(models.Model):
+    # Top pg_stat_statements entries by cumulative execution time
+    snapshot = models.ForeignKey(DbStatsSnapshot, on_delete=models.CASCADE, related_name="statements")
+    queryid = models.BigIntegerField()
+    query = models.TextField()
+    calls = models.BigIntegerField()
+    total_exec_ms = models.FloatField()
+    rows = models.BigIntegerField()
+    shared_blks_hit = models.BigIntegerField()
+    shared_blks_read = models.BigIntegerField()
+
+
+class LoadTestRun(models.Model):
+    # One loadgen session: a request mix driven closed- or open-loop (see perfmetrics.loadgen)
+    MODES = [("closed", "closed"), ("open", "open")]
+
+    name = models.CharField(max_length=64, blank=True)
+    mode = models.CharField(max_length=8, choices=MODES)
+    transport = models.CharField(max_length=8)  # "http" or "wsgi"
+    target = models.CharField(max_length=256)
+    concurrency = models.PositiveIntegerField()
+    target_rps = models.FloatField(null=True, blank=True)
+    think_ms = models.FloatField(default=0)
+    duration_s = models.FloatField()
+    warmup_s = models.FloatField(default=0)
+
+    requests = models.PositiveIntegerField()
+    errors = models.PositiveIntegerField()
+    dropped = models.PositiveIntegerField(default=0)
+    achieved_rps = models.FloatField(null=True, blank=True)
+    p50_ms = models.FloatField(null=True, blank=True)
+    p95_ms = models.FloatField(null=True, blank=True)
+    p99_ms = models.FloatField(null=True, blank=True)
+    mix = models.JSONField(default=list)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        load = f"{self.target_rps:g} rps" if self.target_rps else f"c={self.concurrency}"
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} | {self.name or self.mode} [{load}] | {self.achieved_rps or 0:.1f} rps"
+
+
+class LoadTestResult(models.Model):
+    # Per-endpoint latency and errors of a LoadTestRun
+    run = models.ForeignKey(LoadTestRun, on_delete=models.CASCADE, related_name="results")
+    endpoint = models.CharField(max_length=128)
+    path = models.CharField(max_length=512)
+    requests = models.PositiveIntegerField()
+    errors = models.PositiveIntegerField()
+    statuses = models.JSONField(default=dict)  # {"200": n, "429": n, "ConnectionError": n}
+    avg_ms = models.FloatField(null=True, blank=True)
+    min_ms = models.FloatField(null=True, blank=True)
+    max_ms = models.FloatField(null=True, blank=True)
+    p50_ms = models.FloatField(null=True, blank=True)
+    p95_ms = models.FloatField(null=True, blank=True)
+    p99_ms = models.FloatField(null=True, blank=True)
+    throughput_rps = models.FloatField(null=True, blank=True)
+    histogram = models.JSONField(default=dict)  # perfmetrics.histogram buckets of successful requests
+
+
+class RequestProfile(models.Model):
+    # Sampled stack counts of profiled requests per endpoint and hour (see perfmetrics.profiler)
+    endpoint = models.CharField(max_length=256)
+    bucket_start = models.DateTimeField()
+    requests = models.PositiveIntegerField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    interval_ms = models.FloatField()
+    stacks = models.JSONField(default=dict)  # {"module:func;module:func": samples}, root first
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["endpoint", "bucket_start"], name="requestprofile_endpoint_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket_start:%Y-%m-%d %H:00} | {self.endpoint} | {self.requests} requests"
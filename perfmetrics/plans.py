@@ -0,0 +1,179 @@
+"""
+Sampled EXPLAIN (ANALYZE, BUFFERS) capture for analytics queries.
+
+After a query runs, ``maybe_capture()`` decides in-process whether to sample
+its plan: with probability ``sample_rate``, or always when it took longer than
+``slow_ms``, but at most once per label every ``min_interval_s``. The EXPLAIN
+itself re-executes the query, so it runs in the ``capture_plan`` Celery task,
+never in the request.
+
+Each ``QueryPlan`` keeps the JSON plan plus:
+
+- ``fingerprint``: hash of the plan shape (node types, join/aggregate
+  strategies, relations and indexes), ignoring costs, rows and timings
+- buffers hit/read/temp-written for the whole statement
+- the worst row-estimate error (q-error, max(actual/estimate, estimate/actual))
+
+A plan whose fingerprint differs from the label's previous one is marked
+``plan_changed``; if its execution time also moved by ``latency_shift_pct`` or
+more against the recent plans of the old shape it is ``flagged`` and a warning
+is logged. Settings: ``ANALYTICS_PLAN_CAPTURE``.
+"""
+import hashlib
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from NYT.routers import analytics_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "enabled": True,
+    "sample_rate": 0.01,
+    "slow_ms": 2000.0,
+    "min_interval_s": 300.0,
+    "latency_shift_pct": 50.0,
+    "timeout_ms": 300_000,
+    # Broker connect/send timeout when queueing a capture from a request
+    "queue_timeout_s": 0.5,
+}
+HISTORY = 5
+
+# Plan keys that describe the shape of a node; everything else (costs, rows, timings, buffers) is
+# ignored. "Sort Method" is left out too: quicksort vs. external merge depends on memory, not the plan.
+SHAPE_KEYS = (
+    "Node Type", "Parent Relationship", "Join Type", "Strategy", "Partial Mode", "Scan Direction",
+    "Relation Name", "Index Name", "Command",
+)
+
+_last: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "ANALYTICS_PLAN_CAPTURE", {})}
+
+
+def maybe_capture(label: str, sql: str, params, elapsed_ms: float) -> bool:
+    cfg = config()
+    if not cfg["enabled"]:
+        return False
+    if elapsed_ms < cfg["slow_ms"] and random.random() >= cfg["sample_rate"]:
+        return False
+    now = time.monotonic()
+    with _lock:
+        if now - _last.get(label, -cfg["min_interval_s"]) < cfg["min_interval_s"]:
+            return False
+        _last[label] = now
+    from perfmetrics.tasks import capture_plan, queue
+
+    try:
+        queue(capture_plan, (label, sql, list(params or []), elapsed_ms), cfg["queue_timeout_s"])
+    except Exception:
+        # A missing broker must not fail the request that was sampled
+        logger.warning("Could not queue plan capture for %s", label, exc_info=True)
+        return False
+    return True
+
+
+def _shape(node: dict) -> dict:
+    out = {k: node[k] for k in SHAPE_KEYS if k in node}
+    children = node.get("Plans") or []
+    if children:
+        out["Plans"] = [_shape(c) for c in children]
+    return out
+
+
+def fingerprint(plan: dict) -> str:
+    return hashlib.sha1(json.dumps(_shape(plan), sort_keys=True).encode()).hexdigest()
+
+
+def _nodes(node: dict):
+    yield node
+    for child in node.get("Plans") or []:
+        yield from _nodes(child)
+
+
+def worst_estimate(plan: dict) -> tuple[float | None, str]:
+    worst, where = None, ""
+    for node in _nodes(plan):
+        if "Actual Rows" not in node or not node.get("Actual Loops"):
+            continue  # never executed
+        actual = max(node["Actual Rows"] * node["Actual Loops"], 1.0)
+        estimate = max(node["Plan Rows"] * node["Actual Loops"], 1.0)
+        q = max(actual / estimate, estimate / actual)
+        if worst is None or q > worst:
+            worst, where = q, node["Node Type"] + (f" on {node['Relation Name']}" if "Relation Name" in node else "")
+    return worst, where
+
+
+def explain(sql: str, params=None, using: str | None = None, timeout_ms: int | None = None) -> dict:
+    """
+    Run EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and return the top-level entry
+    ({"Plan": ..., "Planning Time": ..., "Execution Time": ...}).
+    """
+    conn = connections[using or analytics_db()]
+    with conn.cursor() as cur:
+        if timeout_ms:
+            cur.execute("SET statement_timeout = %s", [int(timeout_ms)])
+        try:
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params or [])
+            doc = cur.fetchone()[0]
+        finally:
+            if timeout_ms:
+                cur.execute("RESET statement_timeout")
+    if isinstance(doc, str):
+        doc = json.loads(doc)
+    return doc[0]
+
+
+def capture(label: str, sql: str, params=None, query_elapsed_ms: float | None = None):
+    from perfmetrics.models import QueryPlan
+
+    cfg = config()
+    doc = explain(sql, params, timeout_ms=cfg["timeout_ms"])
+    plan = doc["Plan"]
+    q_error, worst_node = worst_estimate(plan)
+    fp = fingerprint(plan)
+
+    previous = list(QueryPlan.objects.using("default").filter(label=label).order_by("-created_at")[:HISTORY])
+    changed = bool(previous) and previous[0].fingerprint != fp
+    shift = None
+    if changed:
+        old = [p.execution_ms for p in previous if p.fingerprint == previous[0].fingerprint]
+        base = statistics.median(old)
+        if base > 0:
+            shift = (doc["Execution Time"] - base) / base * 100.0
+    flagged = shift is not None and abs(shift) >= cfg["latency_shift_pct"]
+
+    qp = QueryPlan.objects.create(
+        label=label,
+        sql_text=sql,
+        fingerprint=fp,
+        plan=doc,
+        planning_ms=doc.get("Planning Time", 0.0),
+        execution_ms=doc["Execution Time"],
+        query_elapsed_ms=query_elapsed_ms,
+        shared_hit_blocks=plan.get("Shared Hit Blocks", 0),
+        shared_read_blocks=plan.get("Shared Read Blocks", 0),
+        temp_written_blocks=plan.get("Temp Written Blocks", 0),
+        max_estimate_error=q_error,
+        worst_estimate_node=worst_node,
+        plan_changed=changed,
+        previous_fingerprint=previous[0].fingerprint if previous else "",
+        latency_shift_pct=shift,
+        flagged=flagged,
+    )
+    if flagged:
+        logger.warning(
+            "Plan change for %s: %s -> %s, execution time %+.0f%% (plan %s)",
+            label, qp.previous_fingerprint[:12], fp[:12], shift, qp.pk,
+        )
+    return qp
@@ -0,0 +1,74 @@
+"""
+Server-side prepared statements for the known analytics queries.
+
+Each persistent connection PREPAREs a query the first time it sees it and then
+only sends ``EXECUTE name(args)``, so Postgres skips parsing and (after a few
+runs) planning. Statement names are derived from the SQL text. The set of
+prepared names is tied to the raw DB-API connection, so a reconnect (new
+``CONN_MAX_AGE`` cycle, failed health check) starts from scratch.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.db import ProgrammingError
+
+_PLACEHOLDER = re.compile(r"%s|%%")
+
+
+def enabled(wrapper) -> bool:
+    return wrapper.vendor == "postgresql" and getattr(settings, "ANALYTICS_PREPARED_STATEMENTS", True)
+
+
+def statement_name(sql: str) -> str:
+    return "nyt_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+
+def to_positional(sql: str) -> tuple[str, int]:
+    # DB-API %s placeholders -> $1..$n for PREPARE; %% is a literal percent sign
+    n = 0
+
+    def repl(m):
+        nonlocal n
+        if m.group(0) == "%%":
+            return "%"
+        n += 1
+        return f"${n}"
+
+    return _PLACEHOLDER.sub(repl, sql), n
+
+
+def _prepared_names(wrapper) -> set:
+    state = wrapper.__dict__.get("_nyt_prepared")
+    # Holding the raw connection makes the identity check safe against id reuse
+    if state is None or state[0] is not wrapper.connection:
+        state = (wrapper.connection, set())
+        wrapper.__dict__["_nyt_prepared"] = state
+    return state[1]
+
+
+def forget(wrapper) -> None:
+    """Call after DISCARD ALL / DEALLOCATE ALL on `wrapper`."""
+    wrapper.__dict__.pop("_nyt_prepared", None)
+
+
+def execute(wrapper, cur, sql: str, params=None) -> None:
+    """
+    Run `sql` on `cur` (a cursor of `wrapper`) as a prepared statement.
+    """
+    wrapper.ensure_connection()
+    names = _prepared_names(wrapper)
+    name = statement_name(sql)
+    positional, n = to_positional(sql)
+    if name not in names:
+        cur.execute(f"PREPARE {name} AS {positional}")
+        names.add(name)
+    args = f" ({', '.join(['%s'] * n)})" if n else ""
+    try:
+        cur.execute(f"EXECUTE {name}{args}", list(params or []) or None)
+    except ProgrammingError as e:
+        # Dropped behind our back (DISCARD ALL, pooler): prepare again once
+        if getattr(e.__cause__, "pgcode", None) != "26000" or wrapper.in_atomic_block:
+            raise
+        cur.execute(f"PREPARE {name} AS {positional}")
+        cur.execute(f"EXECUTE {name}{args}", list(params or []) or None)
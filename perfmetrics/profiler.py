@@ -0,0 +1,155 @@
+"""
+Statistical profiler for a sampled fraction of requests.
+
+``start()`` registers the calling (request) thread; one daemon thread per
+process then reads its Python stack every ``profile_interval_ms`` via
+``sys._current_frames()`` and counts it as a folded stack
+(``module:function;module:function;...``, root first), the input format of
+flamegraph.pl and speedscope. ``finish(endpoint)`` unregisters the thread and
+hands the counts to the ``store_profile`` Celery task (one publish attempt,
+``PERF_TIMING["profile_queue_timeout_s"]``), which merges them into
+``RequestProfile`` rows per endpoint and hour (``store()``). The sampler only
+wakes while at least one request is registered.
+
+Which requests are profiled is decided by ``ServerTimingMiddleware``
+(``PERF_TIMING["profile_rate"]``). Streaming responses are finished when the
+response is closed (``request_finished``), so the stack samples cover
+producing the body too.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from perfmetrics import timing
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 96
+MAX_STACKS = 5000  # distinct stacks kept per RequestProfile row; the rest are merged into OTHER
+OTHER = "(other)"
+
+_active: dict[int, Counter] = {}
+_lock = threading.Lock()
+_wake = threading.Event()
+_sampler = {"pid": None, "thread": None, "interval_s": 0.005}
+_local = threading.local()
+
+
+def fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _run():
+    while True:
+        if not _active:
+            _wake.wait()
+            _wake.clear()
+            continue
+        time.sleep(_sampler["interval_s"])
+        frames = sys._current_frames()
+        with _lock:
+            for tid, counts in _active.items():
+                frame = frames.get(tid)
+                if frame is not None:
+                    counts[fold(frame)] += 1
+
+
+def _ensure_sampler(interval_ms: float):
+    # The sampler thread does not survive a fork; start one per process
+    _sampler["interval_s"] = interval_ms / 1000.0
+    if _sampler["pid"] == os.getpid() and _sampler["thread"].is_alive():
+        return
+    with _lock:
+        if _sampler["pid"] == os.getpid() and _sampler["thread"].is_alive():
+            return
+        _active.clear()
+        _sampler["thread"] = threading.Thread(target=_run, name="request-profiler", daemon=True)
+        _sampler["pid"] = os.getpid()
+        _sampler["thread"].start()
+
+
+def start(interval_ms: float) -> None:
+    _ensure_sampler(interval_ms)
+    with _lock:
+        _active[threading.get_ident()] = Counter()
+    _local.pending = None
+    _wake.set()
+
+
+def defer(endpoint: str) -> None:
+    # Finish on request_finished instead (streaming responses)
+    _local.pending = endpoint
+
+
+def finish(endpoint: str) -> None:
+    with _lock:
+        counts = _active.pop(threading.get_ident(), None)
+    _local.pending = None
+    if counts is None:
+        return
+    from perfmetrics.tasks import queue, store_profile
+
+    try:
+        queue(store_profile, (endpoint, dict(counts), _sampler["interval_s"] * 1000.0),
+              timing.config()["profile_queue_timeout_s"])
+    except Exception:
+        logger.warning("Could not queue request profile for %s", endpoint, exc_info=True)
+
+
+def finish_deferred(sender=None, **kwargs) -> None:
+    # request_finished receiver
+    endpoint = getattr(_local, "pending", None)
+    if endpoint:
+        finish(endpoint)
+
+
+def _cap(stacks: dict) -> dict:
+    if len(stacks) <= MAX_STACKS:
+        return stacks
+    ordered = sorted(stacks.items(), key=lambda kv: kv[1], reverse=True)
+    kept = dict(ordered[:MAX_STACKS - 1])
+    kept[OTHER] = kept.get(OTHER, 0) + sum(n for _, n in ordered[MAX_STACKS - 1:])
+    return kept
+
+
+def store(endpoint: str, stacks: dict, interval_ms: float, now=None):
+    from perfmetrics.models import RequestProfile
+
+    hour = (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    try:
+        RequestProfile.objects.get_or_create(endpoint=endpoint, bucket_start=hour, defaults={"interval_ms": interval_ms})
+    except IntegrityError:
+        pass  # created concurrently by another worker
+    with transaction.atomic():
+        rp = RequestProfile.objects.select_for_update().get(endpoint=endpoint, bucket_start=hour)
+        merged = Counter(rp.stacks)
+        merged.update(stacks)
+        rp.stacks = _cap(dict(merged))
+        rp.requests += 1
+        rp.samples += sum(stacks.values())
+        rp.save(update_fields=["stacks", "requests", "samples"])
+    return rp
+
+
+def folded(endpoint: str, window: timedelta, now=None) -> Counter:
+    """
+    Folded-stack counts for `endpoint` over the last `window`, merged across hours.
+    """
+    from perfmetrics.models import RequestProfile
+
+    since = (now or timezone.now()) - window
+    out = Counter()
+    for stacks in RequestProfile.objects.filter(endpoint=endpoint, bucket_start__gte=since).values_list("stacks", flat=True):
+        out.update(stacks)
+    return out
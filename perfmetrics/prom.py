@@ -0,0 +1,132 @@
+"""
+Prometheus metrics for the web and Celery processes.
+
+Metrics are kept in process memory by ``prometheus_client`` and rendered as
+text by ``/metrics/prometheus/``; a scrape never queries Postgres (unlike the
+``QueryHit`` JSON endpoints). Only the Celery queue depth is read at scrape
+time, from the Redis broker.
+
+With several worker processes (gunicorn, Celery prefork) start everything with
+``PROMETHEUS_MULTIPROC_DIR`` pointing at one empty directory, wiped on every
+start: each process then writes its samples to memory-mapped files there and
+the endpoint aggregates all of them, so any web worker reports the whole host,
+Celery workers included. ``mark_process_dead(pid)`` must be called when a
+worker exits (gunicorn ``child_exit`` hook; Celery via ``NYT/celery.py``).
+Without the directory each process reports only its own metrics.
+
+- ``analytics_query_seconds{label,query_class}`` / ``analytics_query_rows_total{label}``
+- ``analytics_admission_wait_seconds{query_class}``
+- ``analytics_query_errors_total{status}``: 429/503 admission rejections, 504 timeouts
+- ``ingest_rows_total{source}`` / ``ingest_duration_seconds{source}``: rows/s is
+  ``rate(ingest_rows_total[5m])``
+- ``copy_bytes_total{direction}``: bytes through COPY FROM (ingest) / TO (export)
+- ``celery_task_duration_seconds{task,state}``
+- ``celery_queue_depth{queue}`` and ``celery_broker_up``
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LONG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+QUERY_SECONDS = Histogram("analytics_query_seconds", "Analytics query execution time (excludes admission wait)",
+                          ["label", "query_class"], buckets=LATENCY_BUCKETS)
+QUERY_ROWS = Counter("analytics_query_rows_total", "Rows returned by analytics queries", ["label"])
+ADMISSION_WAIT = Histogram("analytics_admission_wait_seconds", "Wait for an admission slot",
+                           ["query_class"], buckets=LATENCY_BUCKETS)
+QUERY_ERRORS = Counter("analytics_query_errors_total", "Rejected (429/503) and timed-out (504) analytics requests",
+                       ["status"])
+INGEST_ROWS = Counter("ingest_rows_total", "Trip rows ingested", ["source"])
+INGEST_SECONDS = Histogram("ingest_duration_seconds", "Time to ingest one file", ["source"], buckets=LONG_BUCKETS)
+COPY_BYTES = Counter("copy_bytes_total", "Bytes sent through COPY", ["direction"])
+TASK_SECONDS = Histogram("celery_task_duration_seconds", "Celery task run time", ["task", "state"],
+                         buckets=LATENCY_BUCKETS + LONG_BUCKETS[3:])
+
+_task_starts: dict[str, float] = {}
+_task_lock = threading.Lock()
+
+
+def observe_query(label: str, query_class: str, elapsed_ms: float, queue_ms: float = 0.0, rows: int = 0) -> None:
+    QUERY_SECONDS.labels(label, query_class).observe(elapsed_ms / 1000.0)
+    ADMISSION_WAIT.labels(query_class).observe(queue_ms / 1000.0)
+    QUERY_ROWS.labels(label).inc(rows)
+
+
+def observe_error(status: int) -> None:
+    QUERY_ERRORS.labels(str(status)).inc()
+
+
+def observe_ingest(source: str, rows: int, seconds: float) -> None:
+    INGEST_ROWS.labels(source).inc(rows)
+    INGEST_SECONDS.labels(source).observe(seconds)
+
+
+def count_copy_bytes(direction: str, n: int) -> None:
+    COPY_BYTES.labels(direction).inc(n)
+
+
+def task_started(task_id: str) -> None:
+    with _task_lock:
+        _task_starts[task_id] = time.perf_counter()
+
+
+def task_finished(task_id: str, task_name: str, state: str | None) -> None:
+    with _task_lock:
+        t0 = _task_starts.pop(task_id, None)
+    if t0 is not None:
+        TASK_SECONDS.labels(task_name, state or "UNKNOWN").observe(time.perf_counter() - t0)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def mark_process_dead(pid: int) -> None:
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
+
+
+class QueueDepthCollector:
+    # Celery queue lengths read from the Redis broker at scrape time (LLEN per queue)
+    def collect(self):
+        depth = GaugeMetricFamily("celery_queue_depth", "Messages waiting in the Celery queue", labels=["queue"])
+        up = GaugeMetricFamily("celery_broker_up", "1 if the broker answered the queue-depth check")
+        try:
+            import redis
+
+            client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+            for queue in getattr(settings, "PROMETHEUS_CELERY_QUEUES", ["celery"]):
+                depth.add_metric([queue], client.llen(queue))
+            up.add_metric([], 1)
+        except Exception:
+            up.add_metric([], 0)
+        yield depth
+        yield up
+
+
+def render() -> bytes:
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    if str(getattr(settings, "CELERY_BROKER_URL", "")).startswith("redis"):
+        collector = QueueDepthCollector()
+        if registry is REGISTRY:
+            # The default registry is process-wide: collect the queue depth on the side
+            return generate_latest(registry) + _render_one(collector)
+        registry.register(collector)
+    return generate_latest(registry)
+
+
+def _render_one(collector) -> bytes:
+    registry = CollectorRegistry()
+    registry.register(collector)
+    return generate_latest(registry)
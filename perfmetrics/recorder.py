@@ -0,0 +1,161 @@
+"""
+Buffered QueryHit writer.
+
+Request threads call ``record(...)``, which only samples and appends to an
+in-process buffer. The buffer is written with one ``bulk_create`` when it
+reaches ``flush_size`` records or ``flush_interval_s`` seconds, whichever comes
+first, by a daemon thread (``mode: "thread"``) or by handing the batch to the
+``perfmetrics.tasks.write_query_hits`` Celery task (``mode: "celery"``).
+``mode: "sync"`` keeps the old one-INSERT-per-query behaviour.
+
+Sampling is per label (``fnmatch`` patterns, first match wins, ``*`` as the
+default); kept records store their ``sample_rate`` so counts can be re-weighted.
+The buffer is flushed at interpreter exit and on Celery worker shutdown. If the
+database is unavailable the batch is kept and retried, up to ``max_buffer``
+records; beyond that the oldest are dropped and counted in ``dropped``.
+
+Settings: ``QUERYHIT_RECORDER``.
+"""
+import atexit
+import logging
+import os
+import random
+import threading
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "mode": "thread",
+    "flush_size": 500,
+    "flush_interval_s": 2.0,
+    "max_buffer": 20_000,
+    "sampling": {"*": 1.0},
+}
+
+
+def _config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "QUERYHIT_RECORDER", {})}
+
+
+class Recorder:
+    def __init__(self, mode: str, flush_size: int, flush_interval_s: float, max_buffer: int, sampling: dict):
+        self.mode = mode
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max_buffer
+        self.sampling = list(sampling.items())
+        self.dropped = 0
+        self._rates: dict[str, float] = {}
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._thread = None
+
+    def rate(self, label: str) -> float:
+        rate = self._rates.get(label)
+        if rate is None:
+            rate = next((r for pattern, r in self.sampling if fnmatchcase(label, pattern)), 1.0)
+            self._rates[label] = rate
+        return rate
+
+    def record(self, **fields) -> None:
+        rate = self.rate(fields["label"])
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return
+        fields["sample_rate"] = rate
+        fields.setdefault("created_at", timezone.now())
+        if self.mode == "sync":
+            self._write([fields])
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._buffer.append(fields)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def _ensure_thread(self) -> None:
+        # Started lazily and again after a fork, since threads do not survive fork()
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="queryhit-recorder", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        from django.db import close_old_connections
+
+        while True:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            close_old_connections()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write everything buffered so far; returns the number of records written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("QueryHit flush of %d records failed; will retry", len(batch))
+                with self._lock:
+                    self._buffer = batch + self._buffer
+                    overflow = len(self._buffer) - self.max_buffer
+                    if overflow > 0:
+                        del self._buffer[:overflow]
+                        self.dropped += overflow
+                return 0
+            return len(batch)
+
+    def _write(self, batch: list[dict]) -> None:
+        if self.mode == "celery":
+            from perfmetrics.tasks import write_query_hits
+
+            write_query_hits.delay([{**r, "created_at": r["created_at"].isoformat()} for r in batch])
+        else:
+            write(batch)
+
+
+def write(batch: list[dict]) -> None:
+    from perfmetrics.models import QueryHit
+
+    QueryHit.objects.bulk_create([QueryHit(**r) for r in batch], batch_size=1000)
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get() -> Recorder:
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = Recorder(**_config())
+    return _recorder
+
+
+def record(**fields) -> None:
+    get().record(**fields)
+
+
+def flush() -> int:
+    return _recorder.flush() if _recorder is not None else 0
+
+
+atexit.register(flush)
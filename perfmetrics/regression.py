@@ -0,0 +1,142 @@
+"""
+Benchmark baselines and regression comparison.
+
+A baseline is a named set of ``BenchmarkRun`` rows (``BenchmarkBaseline``).
+``compare(base, new)`` lines two sets up per query key — (label, target,
+phase, concurrency, scale factor) — and reports the change of a latency statistic (median,
+p95 or mean of the raw samples) with a percentile-bootstrap confidence
+interval of the relative delta.
+
+A key is a ``regression`` when the whole interval lies above zero and the
+point delta exceeds ``threshold_pct``; an ``improvement`` when the interval lies
+below zero and the delta is below ``-threshold_pct``; otherwise ``unchanged``.
+Either side of a comparison is a baseline name or ``latest`` (the newest run
+per key).
+"""
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS
+
+from perfmetrics.models import BenchmarkBaseline, BenchmarkRun
+
+LATEST = "latest"
+STATS = {
+    "p50": lambda a, axis=-1: np.median(a, axis=axis),
+    "p95": lambda a, axis=-1: np.percentile(a, 95, axis=axis),
+    "mean": lambda a, axis=-1: np.mean(a, axis=axis),
+}
+BOOTSTRAP_ITERS = 2000
+CONFIDENCE = 0.95
+
+
+def run_key(run: BenchmarkRun) -> tuple:
+    # scale_factor is 0 for runs that are not against a bench_scale dataset
+    return (run.label, run.target, run.phase, run.concurrency, run.scale_factor or 0)
+
+
+def _key_str(key: tuple) -> str:
+    label, target, phase, concurrency, sf = key
+    return " / ".join([label, target, phase, f"c={concurrency}"] + ([f"SF{sf}"] if sf else []))
+
+
+def _latest_per_key(runs) -> dict[tuple, BenchmarkRun]:
+    out = {}
+    for run in runs.order_by("created_at"):
+        out[run_key(run)] = run
+    return out
+
+
+def resolve(ref: str, using: str = DEFAULT_DB_ALIAS) -> dict[tuple, BenchmarkRun]:
+    """
+    {key: run} for a baseline name or "latest". Raises BenchmarkBaseline.DoesNotExist.
+    """
+    if ref == LATEST:
+        return _latest_per_key(BenchmarkRun.objects.using(using).all())
+    return _latest_per_key(BenchmarkBaseline.objects.using(using).get(name=ref).runs.all())
+
+
+def create_baseline(name: str, description: str = "", label_prefix: str | None = None, replace: bool = False) -> BenchmarkBaseline:
+    """
+    Snapshot the latest run per key (optionally only labels starting with label_prefix).
+    """
+    runs = _latest_per_key(BenchmarkRun.objects.all())
+    if label_prefix:
+        runs = {k: r for k, r in runs.items() if r.label.startswith(label_prefix)}
+    if replace:
+        BenchmarkBaseline.objects.filter(name=name).delete()
+    baseline = BenchmarkBaseline.objects.create(name=name, description=description)
+    baseline.runs.set(runs.values())
+    return baseline
+
+
+def bootstrap_delta(base: list[float], new: list[float], stat: str = "p50",
+                    iters: int = BOOTSTRAP_ITERS, confidence: float = CONFIDENCE, seed: int = 0):
+    """
+    Relative change of `stat` from base to new samples, in percent, with a
+    percentile-bootstrap interval: (delta_pct, low_pct, high_pct). None when
+    the baseline `stat` is zero, since no relative change is defined.
+    """
+    fn = STATS[stat]
+    a = np.asarray(base, dtype=np.float64)
+    b = np.asarray(new, dtype=np.float64)
+    if not fn(a) > 0:
+        return None
+    rng = np.random.default_rng(seed)
+    sa = fn(rng.choice(a, size=(iters, a.size), replace=True))
+    sb = fn(rng.choice(b, size=(iters, b.size), replace=True))
+    ratios = (sb / np.where(sa > 0, sa, np.nan) - 1.0) * 100.0
+    ratios = ratios[np.isfinite(ratios)]
+    point = (fn(b) / fn(a) - 1.0) * 100.0
+    if not ratios.size:
+        return None
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    low, high = np.percentile(ratios, [tail, 100.0 - tail])
+    return float(point), float(low), float(high)
+
+
+def classify(delta: float, low: float, high: float, threshold_pct: float) -> str:
+    if low > 0 and delta > threshold_pct:
+        return "regression"
+    if high < 0 and delta < -threshold_pct:
+        return "improvement"
+    return "unchanged"
+
+
+def compare(base_ref: str, new_ref: str, stat: str = "p50", threshold_pct: float = 5.0,
+            using: str = DEFAULT_DB_ALIAS) -> dict:
+    if stat not in STATS:
+        raise ValueError(f"stat must be one of {', '.join(STATS)}")
+    base, new = resolve(base_ref, using), resolve(new_ref, using)
+    rows = []
+    for key in sorted(set(base) & set(new)):
+        b, n = base[key], new[key]
+        if not b.samples_ms or not n.samples_ms:
+            continue
+        ci = bootstrap_delta(b.samples_ms, n.samples_ms, stat)
+        delta, low, high = ci or (None, None, None)
+        label, target, phase, concurrency, sf = key
+        rows.append({
+            "label": label,
+            "target": target,
+            "phase": phase,
+            "concurrency": concurrency,
+            "scale_factor": sf or None,
+            "base_ms": round(float(STATS[stat](np.asarray(b.samples_ms))), 3),
+            "new_ms": round(float(STATS[stat](np.asarray(n.samples_ms))), 3),
+            "delta_pct": round(delta, 2) if ci else None,
+            "ci_low_pct": round(low, 2) if ci else None,
+            "ci_high_pct": round(high, 2) if ci else None,
+            "status": classify(delta, low, high, threshold_pct) if ci else "no_baseline",
+            "base_run": b.id,
+            "new_run": n.id,
+        })
+    return {
+        "base": base_ref,
+        "new": new_ref,
+        "stat": stat,
+        "threshold_pct": threshold_pct,
+        "confidence": CONFIDENCE,
+        "results": rows,
+        "regressions": sum(r["status"] == "regression" for r in rows),
+        "only_in_base": [_key_str(k) for k in sorted(set(base) - set(new))],
+        "only_in_new": [_key_str(k) for k in sorted(set(new) - set(base))],
+    }
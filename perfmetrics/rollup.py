@@ -0,0 +1,231 @@
+"""
+Downsampling of raw QueryHits into per-minute and per-hour rollups, retention,
+and the window summaries read by the perfmetrics endpoints.
+
+- ``rollup_minutes()`` aggregates complete minutes of raw hits (grouped and
+  bucketed in SQL, so only label x minute x histogram-bucket rows come back)
+  starting at the minute watermark: the end of the latest minute rollup. A
+  minute is only rolled up once it is ``SETTLE_S`` old, so hits still sitting
+  in a recorder buffer are not missed.
+- ``rollup_hours()`` merges complete hours of minute rollups.
+- ``purge()`` deletes raw hits and minute rollups older than the retention
+  settings, but never anything that has not been rolled up yet.
+
+Rollups are upserted, so re-running any step is safe. Settings:
+``PERFMETRICS_RETENTION``.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from perfmetrics import histogram
+from perfmetrics.models import QueryHit, QueryHitRollup
+
+SETTLE_S = 120
+DELETE_BATCH = 50_000
+
+RETENTION_DEFAULTS = {"raw_days": 2, "minute_days": 14, "hour_days": 400}
+
+FIELDS = ["count", "sum_ms", "min_ms", "max_ms", "sum_queue_ms", "max_queue_ms", "rows", "histogram"]
+
+MINUTE_SQL = f"""
+    SELECT date_trunc('minute', created_at) AS b, label,
+           floor(ln(greatest(elapsed_ms, %(min)s) / %(min)s) / ln(%(growth)s))::int AS i,
+           SUM(1.0 / sample_rate), SUM(elapsed_ms / sample_rate), MIN(elapsed_ms), MAX(elapsed_ms),
+           SUM(queue_ms / sample_rate), MAX(queue_ms), SUM(rows / sample_rate)
+    FROM {QueryHit._meta.db_table}
+    WHERE created_at >= %(start)s AND created_at < %(end)s
+    GROUP BY 1, 2, 3
+"""
+
+WINDOW_RE = re.compile(r"^(\d+)([smhd])$")
+WINDOW_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def retention() -> dict:
+    return {**RETENTION_DEFAULTS, **getattr(settings, "PERFMETRICS_RETENTION", {})}
+
+
+def parse_window(value: str) -> timedelta:
+    m = WINDOW_RE.match(value or "")
+    if not m:
+        raise ValueError(f"Invalid window {value!r}; use e.g. 15m, 6h, 7d")
+    return timedelta(**{WINDOW_UNITS[m.group(2)]: int(m.group(1))})
+
+
+def _empty() -> dict:
+    return {"count": 0.0, "sum_ms": 0.0, "min_ms": None, "max_ms": None,
+            "sum_queue_ms": 0.0, "max_queue_ms": 0.0, "rows": 0.0, "histogram": {}}
+
+
+def _merge(acc: dict, part: dict) -> dict:
+    for f in ("count", "sum_ms", "sum_queue_ms", "rows"):
+        acc[f] += part[f]
+    acc["min_ms"] = part["min_ms"] if acc["min_ms"] is None else min(acc["min_ms"], part["min_ms"])
+    acc["max_ms"] = part["max_ms"] if acc["max_ms"] is None else max(acc["max_ms"], part["max_ms"])
+    acc["max_queue_ms"] = max(acc["max_queue_ms"], part["max_queue_ms"])
+    histogram.merge(acc["histogram"], part["histogram"])
+    return acc
+
+
+def _upsert(resolution: str, buckets: dict) -> int:
+    objs = [QueryHitRollup(resolution=resolution, bucket_start=b, label=label, **agg)
+            for (b, label), agg in buckets.items()]
+    QueryHitRollup.objects.bulk_create(
+        objs, batch_size=1000, update_conflicts=True,
+        unique_fields=["resolution", "label", "bucket_start"], update_fields=FIELDS,
+    )
+    return len(objs)
+
+
+def watermark(resolution: str, using: str = DEFAULT_DB_ALIAS):
+    # End of the latest rolled-up bucket (everything before it is rolled up), or None
+    latest = (QueryHitRollup.objects.using(using).filter(resolution=resolution)
+              .aggregate(b=Max("bucket_start"))["b"])
+    if latest is None:
+        return None
+    return latest + (timedelta(minutes=1) if resolution == QueryHitRollup.MINUTE else timedelta(hours=1))
+
+
+def _raw_buckets(start, end, using: str = DEFAULT_DB_ALIAS) -> dict:
+    # {(minute, label): aggregate} for raw hits in [start, end)
+    buckets: dict = {}
+    with connections[using].cursor() as cur:
+        cur.execute(MINUTE_SQL, {"min": histogram.MIN_MS, "growth": histogram.GROWTH, "start": start, "end": end})
+        for b, label, i, n, s, lo, hi, q, qmax, rows in cur.fetchall():
+            part = {"count": float(n), "sum_ms": float(s), "min_ms": lo, "max_ms": hi,
+                    "sum_queue_ms": float(q), "max_queue_ms": qmax, "rows": float(rows),
+                    "histogram": {str(min(max(i, 0), histogram.BUCKETS - 1)): float(n)}}
+            _merge(buckets.setdefault((b, label), _empty()), part)
+    return buckets
+
+
+def rollup_minutes(now=None) -> int:
+    now = now or timezone.now()
+    end = (now - timedelta(seconds=SETTLE_S)).replace(second=0, microsecond=0)
+    start = watermark(QueryHitRollup.MINUTE)
+    if start is None:
+        first = QueryHit.objects.order_by("created_at").values_list("created_at", flat=True).first()
+        if first is None:
+            return 0
+        start = first.replace(second=0, microsecond=0)
+    if start >= end:
+        return 0
+    return _upsert(QueryHitRollup.MINUTE, _raw_buckets(start, end))
+
+
+def rollup_hours() -> int:
+    end = watermark(QueryHitRollup.MINUTE)
+    if end is None:
+        return 0
+    end = end.replace(minute=0, second=0, microsecond=0)
+    start = watermark(QueryHitRollup.HOUR)
+    if start is None:
+        first = QueryHitRollup.objects.filter(resolution=QueryHitRollup.MINUTE).order_by("bucket_start").first()
+        start = first.bucket_start.replace(minute=0)
+    if start >= end:
+        return 0
+    buckets: dict = {}
+    minutes = QueryHitRollup.objects.filter(
+        resolution=QueryHitRollup.MINUTE, bucket_start__gte=start, bucket_start__lt=end,
+    ).values("bucket_start", "label", *FIELDS)
+    for r in minutes.iterator(chunk_size=5000):
+        hour = r["bucket_start"].replace(minute=0)
+        _merge(buckets.setdefault((hour, r["label"]), _empty()), r)
+    return _upsert(QueryHitRollup.HOUR, buckets)
+
+
+def _delete_before(qs, field: str, cutoff) -> int:
+    # Batched, so a large backlog does not hold one huge transaction. Ids are picked on the
+    # database they are deleted from; stop if a batch deletes nothing rather than re-reading it.
+    qs = qs.using(DEFAULT_DB_ALIAS)
+    deleted = 0
+    while True:
+        ids = list(qs.filter(**{f"{field}__lt": cutoff}).values_list("id", flat=True)[:DELETE_BATCH])
+        if not ids:
+            return deleted
+        n = qs.filter(id__in=ids).delete()[0]
+        if not n:
+            return deleted
+        deleted += n
+
+
+def purge(now=None) -> dict:
+    now = now or timezone.now()
+    keep = retention()
+    out = {"raw": 0, "minute": 0, "hour": 0}
+    minute_mark = watermark(QueryHitRollup.MINUTE)
+    if minute_mark is not None:
+        cutoff = min(now - timedelta(days=keep["raw_days"]), minute_mark)
+        out["raw"] = _delete_before(QueryHit.objects.all(), "created_at", cutoff)
+    hour_mark = watermark(QueryHitRollup.HOUR)
+    if hour_mark is not None:
+        cutoff = min(now - timedelta(days=keep["minute_days"]), hour_mark)
+        out["minute"] = _delete_before(
+            QueryHitRollup.objects.filter(resolution=QueryHitRollup.MINUTE), "bucket_start", cutoff)
+    out["hour"] = _delete_before(
+        QueryHitRollup.objects.filter(resolution=QueryHitRollup.HOUR), "bucket_start",
+        now - timedelta(days=keep["hour_days"]))
+    return out
+
+
+def run(now=None) -> dict:
+    now = now or timezone.now()
+    return {"minutes": rollup_minutes(now), "hours": rollup_hours(), "purged": purge(now)}
+
+
+def summarize(agg: dict) -> dict:
+    n = agg["count"]
+    p50, p95, p99 = histogram.quantiles(agg["histogram"], lo=agg["min_ms"], hi=agg["max_ms"])
+    r = lambda v: None if v is None else round(v, 2)
+    return {
+        "count": round(n),
+        "avg_ms": r(agg["sum_ms"] / n) if n else None,
+        "min_ms": r(agg["min_ms"]),
+        "max_ms": r(agg["max_ms"]),
+        "p50_ms": r(p50),
+        "p95_ms": r(p95),
+        "p99_ms": r(p99),
+        "avg_queue_ms": r(agg["sum_queue_ms"] / n) if n else None,
+        "max_queue_ms": r(agg["max_queue_ms"]),
+    }
+
+
+def window_by_label(window: timedelta, label: str | None = None, now=None,
+                    using: str = DEFAULT_DB_ALIAS) -> dict[str, dict]:
+    """
+    Aggregates per label over the last `window`: hour rollups for whole hours,
+    minute rollups for the rest, raw hits after the minute watermark. Windows
+    reach back to the start of their first bucket. Everything is read on `using`.
+    """
+    now = now or timezone.now()
+    since = now - window
+    by_label: dict[str, dict] = {}
+
+    hour_mark = watermark(QueryHitRollup.HOUR, using)
+    minute_from = since.replace(second=0, microsecond=0)
+    if hour_mark is not None and window >= timedelta(hours=6):
+        hours = QueryHitRollup.objects.using(using).filter(
+            resolution=QueryHitRollup.HOUR, bucket_start__gte=since.replace(minute=0, second=0, microsecond=0))
+        if label:
+            hours = hours.filter(label=label)
+        for r in hours.values("label", *FIELDS).iterator(chunk_size=5000):
+            _merge(by_label.setdefault(r["label"], _empty()), r)
+        minute_from = max(minute_from, hour_mark)
+
+    minutes = QueryHitRollup.objects.using(using).filter(
+        resolution=QueryHitRollup.MINUTE, bucket_start__gte=minute_from)
+    if label:
+        minutes = minutes.filter(label=label)
+    for r in minutes.values("label", *FIELDS).iterator(chunk_size=5000):
+        _merge(by_label.setdefault(r["label"], _empty()), r)
+
+    tail_from = max(since, watermark(QueryHitRollup.MINUTE, using) or since)
+    for (_, lbl), agg in _raw_buckets(tail_from, now + timedelta(seconds=1), using).items():
+        if label is None or lbl == label:
+            _merge(by_label.setdefault(lbl, _empty()), agg)
+    return by_label
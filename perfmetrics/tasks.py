@@ -0,0 +1,57 @@
+from celery import shared_task
+from django.utils.dateparse import parse_datetime
+
+from perfmetrics import recorder
+
+
+def queue(task, args: tuple, timeout_s: float) -> None:
+    """
+    Publish `task` from the request path: one attempt with `timeout_s` on the broker
+    connect and send, so an unreachable broker costs at most that instead of
+    Celery's publish retries. Raises whatever the broker raised.
+    """
+    with task.app.connection_for_write(
+        connect_timeout=timeout_s,
+        transport_options={"socket_connect_timeout": timeout_s, "socket_timeout": timeout_s},
+    ) as conn:
+        task.apply_async(args, connection=conn, retry=False)
+
+
+@shared_task(ignore_result=True)
+def write_query_hits(rows: list[dict]):
+    # Batches handed off by web processes running the recorder in "celery" mode
+    for r in rows:
+        r["created_at"] = parse_datetime(r["created_at"])
+    recorder.write(rows)
+    return len(rows)
+
+
+@shared_task(ignore_result=True)
+def rollup_query_hits():
+    # Minute/hour rollups of QueryHit plus retention; scheduled by CELERY_BEAT_SCHEDULE
+    from perfmetrics import rollup
+    return rollup.run()
+
+
+@shared_task(ignore_result=True)
+def capture_plan(label: str, sql: str, params: list, elapsed_ms: float):
+    # EXPLAIN ANALYZE re-runs the query, so sampled captures happen here rather than in the request
+    from perfmetrics import plans
+    qp = plans.capture(label, sql, params, elapsed_ms)
+    return qp.pk
+
+
+@shared_task(ignore_result=True)
+def collect_db_stats():
+    # pg_stat_* snapshot of the analytics database; scheduled by CELERY_BEAT_SCHEDULE
+    from perfmetrics import dbstats
+    snap = dbstats.collect()
+    dbstats.purge()
+    return snap.pk
+
+
+@shared_task(ignore_result=True)
+def store_profile(endpoint: str, stacks: dict, interval_ms: float):
+    # Stack samples of one profiled request, merged into its endpoint's hourly RequestProfile
+    from perfmetrics import profiler
+    profiler.store(endpoint, stacks, interval_ms)
@@ -1,3 +1,335 @@
-from django.test import TestCase
+import math
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from NYT.routers import AnalyticsRouter
+from perfmetrics import admission, histogram, profiler, prom, recorder, rollup, tasks
+from perfmetrics.admission import AdmissionRejected, Gate
+from perfmetrics.models import QueryHit, QueryHitRollup
+from perfmetrics.utils import run_logged_return_timed, stream_sql_logged
+
+
+class HistogramBucketTests(SimpleTestCase):
+    def test_fast_hits_share_bucket_zero(self):
+        for ms in (0.0, 0.01, histogram.MIN_MS):
+            self.assertEqual(histogram.bucket(ms), 0)
+
+    def test_bucket_boundaries(self):
+        # Bucket i covers [MIN_MS * GROWTH**i, MIN_MS * GROWTH**(i+1))
+        for i in (1, 5, 40, 120):
+            self.assertEqual(histogram.bucket(histogram.MIN_MS * histogram.GROWTH ** (i - 0.01)), i - 1)
+            self.assertEqual(histogram.bucket(histogram.MIN_MS * histogram.GROWTH ** (i + 0.01)), i)
+            self.assertEqual(histogram.bucket(histogram.MIN_MS * histogram.GROWTH ** (i + 0.99)), i)
+
+    def test_slow_hits_share_the_last_bucket(self):
+        self.assertEqual(histogram.bucket(histogram.MIN_MS * histogram.GROWTH ** (histogram.BUCKETS + 5)),
+                         histogram.BUCKETS - 1)
+        self.assertEqual(histogram.bucket(1e12), histogram.BUCKETS - 1)
+
+    def test_add_and_merge(self):
+        a = histogram.add({}, 1.0)
+        histogram.add(a, 1.0, weight=2.5)
+        b = histogram.add({}, 500.0)
+        merged = histogram.merge(dict(a), b)
+        self.assertEqual(merged, {str(histogram.bucket(1.0)): 3.5, str(histogram.bucket(500.0)): 1})
+
+
+class HistogramQuantileTests(SimpleTestCase):
+    def test_empty(self):
+        self.assertEqual(histogram.quantiles({}), [None, None, None])
+
+    def test_estimates_within_bucket_width(self):
+        rng = random.Random(0)
+        samples = sorted(rng.lognormvariate(3.0, 1.5) for _ in range(5000))
+        hist = {}
+        for ms in samples:
+            histogram.add(hist, ms)
+        qs = (0.5, 0.9, 0.95, 0.99)
+        for q, estimate in zip(qs, histogram.quantiles(hist, qs)):
+            exact = samples[math.ceil(q * len(samples)) - 1]
+            with self.subTest(q=q):
+                self.assertLessEqual(abs(estimate / exact - 1.0), histogram.GROWTH - 1.0)
+
+    def test_weighted_counts(self):
+        # One sampled hit at rate 0.1 outweighs five unsampled ones
+        hist = {}
+        for _ in range(5):
+            histogram.add(hist, 1.0)
+        histogram.add(hist, 100.0, weight=10.0)
+        p50, = histogram.quantiles(hist, (0.5,))
+        self.assertEqual(histogram.bucket(p50), histogram.bucket(100.0))
+
+    def test_clamped_to_known_min_max(self):
+        hist = histogram.add({}, 3.0)
+        self.assertEqual(histogram.quantiles(hist, lo=3.0, hi=3.0), [3.0, 3.0, 3.0])
+
+
+@override_settings(PERFMETRICS_RETENTION={"raw_days": 2, "minute_days": 14, "hour_days": 400})
+class RollupPurgeTests(TestCase):
+    now = datetime(2024, 6, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+    def hit(self, age: timedelta) -> QueryHit:
+        return QueryHit.objects.create(label="V2.daily_trips", view_name="daily_trips", sql_text="SELECT 1",
+                                       elapsed_ms=5.0, rows=1, created_at=self.now - age)
+
+    def minute_rollup(self, age: timedelta) -> QueryHitRollup:
+        return QueryHitRollup.objects.create(
+            resolution=QueryHitRollup.MINUTE, bucket_start=self.now - age, label="V2.daily_trips",
+            count=1, sum_ms=5.0, min_ms=5.0, max_ms=5.0, histogram={"0": 1},
+        )
+
+    def test_nothing_purged_before_the_first_rollup(self):
+        self.hit(timedelta(days=30))
+        out = rollup.purge(self.now)
+        self.assertEqual(out["raw"], 0)
+        self.assertEqual(QueryHit.objects.count(), 1)
+
+    def test_unrolled_hits_survive_retention(self):
+        self.hit(timedelta(days=10))
+        unrolled = self.hit(timedelta(days=5))
+        recent = self.hit(timedelta(hours=1))
+        # Minute watermark: everything before now - 7 days + 1 minute is rolled up
+        self.minute_rollup(timedelta(days=7))
+        rollup.purge(self.now)
+        self.assertEqual(set(QueryHit.objects.values_list("pk", flat=True)), {unrolled.pk, recent.pk})
+
+    def test_minute_rollups_kept_until_rolled_into_hours(self):
+        self.minute_rollup(timedelta(days=60))
+        out = rollup.purge(self.now)
+        self.assertEqual(out["minute"], 0)
+        self.assertEqual(QueryHitRollup.objects.filter(resolution=QueryHitRollup.MINUTE).count(), 1)
+
+    def test_purge_stops_on_ids_that_are_already_deleted(self):
+        gone = self.hit(timedelta(days=10))
+        gone_pk = gone.pk
+        gone.delete()
+        kept = self.hit(timedelta(days=5))
+        self.minute_rollup(timedelta(days=7))
+        values_list = QuerySet.values_list
+
+        def lagging_replica(qs, *fields, **kwargs):
+            # A replica that has not replayed the delete keeps listing the row
+            if qs.model is QueryHit and fields == ("id",):
+                return [gone_pk]
+            return values_list(qs, *fields, **kwargs)
+
+        with mock.patch.object(QuerySet, "values_list", lagging_replica):
+            out = rollup.purge(self.now)
+        self.assertEqual(out["raw"], 0)
+        self.assertEqual(list(QueryHit.objects.values_list("pk", flat=True)), [kept.pk])
+
+    def test_perfmetrics_reads_are_not_routed_to_the_replica(self):
+        self.assertIsNone(AnalyticsRouter().db_for_read(QueryHit))
+
+    def test_run_purges_only_what_it_rolled_up(self):
+        self.hit(timedelta(days=3))
+        # Not settled yet, so not rolled up by this run
+        pending = self.hit(timedelta(seconds=30))
+        out = rollup.run(self.now)
+        self.assertEqual(out["minutes"], 1)
+        self.assertEqual(out["purged"]["raw"], 1)
+        self.assertEqual(list(QueryHit.objects.values_list("pk", flat=True)), [pending.pk])
+
+
+class GateTests(SimpleTestCase):
+    def test_free_slot_is_taken_immediately(self):
+        gate = Gate("light", concurrency=2, queue=0, wait_s=1.0, timeout_ms=None)
+        self.assertEqual(gate.acquire(), 0.0)
+        self.assertEqual(gate.acquire(), 0.0)
+
+    def test_full_queue_is_rejected_with_429(self):
+        gate = Gate("heavy", concurrency=1, queue=0, wait_s=2.5, timeout_ms=None)
+        gate.acquire()
+        with self.assertRaises(AdmissionRejected) as cm:
+            gate.acquire()
+        self.assertEqual((cm.exception.query_class, cm.exception.status, cm.exception.retry_after), ("heavy", 429, 3))
+
+    def test_wait_timeout_is_rejected_with_503(self):
+        gate = Gate("heavy", concurrency=1, queue=1, wait_s=0.05, timeout_ms=None)
+        gate.acquire()
+        with self.assertRaises(AdmissionRejected) as cm:
+            gate.acquire()
+        self.assertEqual(cm.exception.status, 503)
+        self.assertEqual(gate.waiting, 0)
+
+    def test_waiter_gets_a_released_slot(self):
+        gate = Gate("light", concurrency=1, queue=1, wait_s=5.0, timeout_ms=None)
+        gate.acquire()
+        releaser = threading.Timer(0.05, gate.release)
+        releaser.start()
+        try:
+            self.assertGreater(gate.acquire(), 0.0)
+        finally:
+            releaser.join()
+        self.assertEqual(gate.waiting, 0)
+
+
+class CanceledError(Exception):
+    pgcode = admission.QUERY_CANCELED
+
+
+def statement_timeout():
+    exc = OperationalError("canceling statement due to statement timeout")
+    exc.__cause__ = CanceledError()
+    return exc
+
+
+class GuardTests(SimpleTestCase):
+    def call(self, exc):
+        def view(request):
+            raise exc
+        return admission.guard(view)(RequestFactory().get("/"))
+
+    def test_rejections_become_429_and_503(self):
+        for status in (429, 503):
+            with self.subTest(status=status):
+                response = self.call(AdmissionRejected("light", status, 7))
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response["Retry-After"], "7")
+                self.assertEqual(response["Cache-Control"], "no-store")
+
+    def test_statement_timeout_becomes_504(self):
+        response = self.call(statement_timeout())
+        self.assertEqual(response.status_code, 504)
+        self.assertFalse(response.has_header("Retry-After"))
+
+    def test_other_database_errors_propagate(self):
+        with self.assertRaises(OperationalError):
+            self.call(OperationalError("connection refused"))
+
+    def test_passes_responses_through(self):
+        response = admission.guard(lambda request: HttpResponse("ok"))(RequestFactory().get("/"))
+        self.assertEqual(response.content, b"ok")
+
+
+@override_settings(ANALYTICS_ADMISSION={"test": {"concurrency": 1, "queue": 0, "wait_s": 0.05, "timeout_ms": None}})
+class SlotReleaseTests(SimpleTestCase):
+    def setUp(self):
+        admission._gates.pop("test", None)
+        self.addCleanup(admission._gates.pop, "test", None)
+
+    def assertSlotFree(self):
+        gate = admission.gate("test")
+        self.assertEqual(gate.acquire(), 0.0)
+        gate.release()
+
+    def test_released_when_the_engine_raises(self):
+        def execute():
+            raise RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            run_logged_return_timed(execute, label="test", view_name="test", sql_text="", query_class="test")
+        self.assertSlotFree()
+
+    def test_released_when_a_stream_fails(self):
+        def rows():
+            yield b"a"
+            raise RuntimeError("boom")
+        gate = admission.gate("test")
+        gate.acquire()
+        stream = admission.Admitted(gate, rows())
+        self.assertEqual(next(stream), b"a")
+        with self.assertRaises(RuntimeError):
+            next(stream)
+        self.assertSlotFree()
+
+    def test_released_once_when_closed_without_iterating(self):
+        gate = admission.gate("test")
+        gate.acquire()
+        stream = admission.Admitted(gate, iter([b"a"]))
+        stream.close()
+        stream.close()
+        self.assertSlotFree()
+        # A second release would have raised on the bounded semaphore
+        with self.assertRaises(ValueError):
+            gate.release()
+
+
+class RowEncoder:
+    def write(self, columns, types, rows):
+        return b"".join(b"%d\n" % r for r, in rows)
+
+    def close(self, **summary):
+        yield b"end\n"
+
+
+@override_settings(ANALYTICS_ADMISSION={"test": {"concurrency": 1, "queue": 0, "wait_s": 0.05, "timeout_ms": None}})
+class StreamTimeoutTests(SimpleTestCase):
+    def setUp(self):
+        admission._gates.pop("test", None)
+        self.addCleanup(admission._gates.pop, "test", None)
+
+    def stream(self, chunks):
+        with mock.patch("perfmetrics.utils.iter_sql_chunks", lambda *args, **kwargs: chunks()):
+            return stream_sql_logged("SELECT n", label="test", view_name="test", encoder=RowEncoder(),
+                                     query_class="test")
+
+    def test_execute_time_timeout_becomes_504(self):
+        def chunks():
+            raise statement_timeout()
+            yield
+
+        @admission.guard
+        def view(request):
+            return HttpResponse(self.stream(chunks))
+
+        self.assertEqual(view(RequestFactory().get("/")).status_code, 504)
+        gate = admission.gate("test")
+        self.assertEqual(gate.acquire(), 0.0)
+        gate.release()
+
+    def test_mid_stream_timeout_is_counted_not_recorded(self):
+        def chunks():
+            yield ["n"], [23], [(1,), (2,)]
+            raise statement_timeout()
+
+        with mock.patch.object(recorder, "record") as recorded, \
+                mock.patch.object(prom, "observe_error") as observed:
+            stream = self.stream(chunks)
+            self.assertEqual(next(stream), b"1\n2\n")
+            with self.assertLogs("perfmetrics.utils", "WARNING"), self.assertRaises(OperationalError):
+                next(stream)
+        observed.assert_called_once_with(504)
+        recorded.assert_not_called()
+
+    def test_completed_stream_is_recorded(self):
+        def chunks():
+            yield ["n"], [23], [(1,)]
+
+        with mock.patch.object(recorder, "record") as recorded, mock.patch.object(prom, "observe_query"), \
+                mock.patch("perfmetrics.plans.maybe_capture"):
+            self.assertEqual(b"".join(self.stream(chunks)), b"1\nend\n")
+        self.assertEqual(recorded.call_args.kwargs["rows"], 1)
+
+
+class TaskQueueTests(SimpleTestCase):
+    def test_one_publish_attempt_on_a_short_timeout(self):
+        task = mock.Mock()
+        conn = task.app.connection_for_write.return_value.__enter__.return_value
+        tasks.queue(task, ("a", 1), 0.25)
+        task.app.connection_for_write.assert_called_once_with(
+            connect_timeout=0.25, transport_options={"socket_connect_timeout": 0.25, "socket_timeout": 0.25},
+        )
+        task.apply_async.assert_called_once_with(("a", 1), connection=conn, retry=False)
+
+    def test_profile_is_queued_with_the_profile_timeout(self):
+        profiler._active[threading.get_ident()] = Counter({"app:view": 3})
+        with mock.patch.object(tasks, "queue") as queued:
+            profiler.finish("/api/v1/daily")
+        task, args, timeout_s = queued.call_args.args
+        self.assertIs(task, tasks.store_profile)
+        self.assertEqual(args[:2], ("/api/v1/daily", {"app:view": 3}))
+        self.assertEqual(timeout_s, 0.5)
+
+    def test_unreachable_broker_does_not_fail_the_request(self):
+        profiler._active[threading.get_ident()] = Counter({"app:view": 1})
+        with mock.patch.object(tasks, "queue", side_effect=OSError("connection refused")), \
+                self.assertLogs("perfmetrics.profiler", "WARNING"):
+            profiler.finish("/api/v1/daily")
@@ -0,0 +1,92 @@
+"""
+Per-request time breakdown, reported as ``Server-Timing`` headers.
+
+``ServerTimingMiddleware`` (``perfmetrics.middleware``) opens a collector for
+each matching request; code on the request path marks its phases with
+``phase(name)``:
+
+- ``queue``: waiting for an admission slot
+- ``db-connect``: opening or health-checking the DB connection
+- ``db-exec``: every ``cursor.execute`` (via a connection execute wrapper)
+- ``db-fetch``: reading the result rows from the cursor
+- ``build``: turning rows into dicts
+- ``serialize``: JSON encoding of the response
+- ``instr``: QueryHit recording and plan-capture sampling
+
+Phases nest and each one is charged its exclusive time, so a QueryHit INSERT
+inside ``instr`` counts as ``db-exec`` only; ``app`` is whatever the phases do
+not cover. Streaming responses send their headers before the body is
+produced, so their header only covers the time up to that point. Outside a
+collected request ``phase()`` does nothing. Settings: ``PERF_TIMING``.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import JsonResponse
+
+DEFAULTS = {
+    "enabled": True,
+    "paths": ["/api/", "/metrics/"],
+    "profile_rate": 0.0,
+    "profile_interval_ms": 5.0,
+    # Broker connect/send timeout when queueing a profile from a request
+    "profile_queue_timeout_s": 0.5,
+}
+PHASES = ("queue", "db-connect", "db-exec", "db-fetch", "build", "serialize", "instr")
+
+# Per request: {"totals": {phase: ms}, "stack": [[name, start, child_ms], ...]}
+_current: ContextVar[dict | None] = ContextVar("perf_timing", default=None)
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "PERF_TIMING", {})}
+
+
+@contextmanager
+def collect():
+    state = {"totals": {}, "stack": []}
+    token = _current.set(state)
+    try:
+        yield state["totals"]
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name: str):
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    frame = [name, time.perf_counter(), 0.0]
+    state["stack"].append(frame)
+    try:
+        yield
+    finally:
+        state["stack"].pop()
+        elapsed = (time.perf_counter() - frame[1]) * 1000.0
+        totals = state["totals"]
+        totals[name] = totals.get(name, 0.0) + elapsed - frame[2]
+        if state["stack"]:
+            state["stack"][-1][2] += elapsed
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    # connection.execute_wrapper() hook: charge every statement to db-exec
+    with phase("db-exec"):
+        return execute(sql, params, many, context)
+
+
+def json_response(data, **kwargs) -> JsonResponse:
+    with phase("serialize"):
+        return JsonResponse(data, **kwargs)
+
+
+def header(totals: dict, total_ms: float) -> str:
+    parts = [f"{name};dur={totals[name]:.2f}" for name in PHASES if name in totals]
+    app = max(total_ms - sum(totals.values()), 0.0)
+    parts.append(f"app;dur={app:.2f}")
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
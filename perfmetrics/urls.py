@@ -1,7 +1,21 @@
 from django.urls import path
-from perfmetrics.views import latest_hits, summary_by_label
+from perfmetrics.views import (
+    latest_hits, summary_by_label, label_timeseries, bench_baselines, bench_compare, bench_compare_page, bench_scaling,
+    plan_history, plan_detail, db_stats, db_table_series, load_runs, prometheus,
+)
 
 urlpatterns = [
     path("hits/latest/", latest_hits, name="metrics-latest-hits"),
     path("hits/summary/", summary_by_label, name="metrics-summary-by-label"),
+    path("hits/timeseries/", label_timeseries, name="metrics-label-timeseries"),
+    path("bench/", bench_compare_page, name="metrics-bench-page"),
+    path("bench/baselines/", bench_baselines, name="metrics-bench-baselines"),
+    path("bench/compare/", bench_compare, name="metrics-bench-compare"),
+    path("bench/scaling/", bench_scaling, name="metrics-bench-scaling"),
+    path("plans/", plan_history, name="metrics-plan-history"),
+    path("plans/<int:pk>/", plan_detail, name="metrics-plan-detail"),
+    path("db/", db_stats, name="metrics-db-stats"),
+    path("db/tables/", db_table_series, name="metrics-db-table-series"),
+    path("load/", load_runs, name="metrics-load-runs"),
+    path("prometheus/", prometheus, name="metrics-prometheus"),
 ]
@@ -1,50 +1,357 @@
+import logging
+import math
+import statistics
+import threading
 import time
-from typing import Sequence, Any, Dict
-from django.db import connection
+from contextlib import contextmanager
+from typing import Sequence, Any, Dict, Iterator
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections
 from django.utils.module_loading import import_string
-from perfmetrics.models import QueryHit
+from NYT.routers import analytics_db
+from perfmetrics import admission, plans, prepared, prom, recorder, timing
+
+logger = logging.getLogger(__name__)
 
 def _fetch_all_dict(cur) -> list[dict]:
     cols = [c[0] for c in cur.description] if cur.description else []
-    rows = cur.fetchall() if cur.description else []
-    return [dict(zip(cols, r)) for r in rows]
+    with timing.phase("db-fetch"):
+        rows = cur.fetchall() if cur.description else []
+    with timing.phase("build"):
+        return [dict(zip(cols, r)) for r in rows]
+
+def _execute(cur, sql: str, params: Sequence[Any] | None = None) -> None:
+    # Known analytics queries run as per-connection prepared statements
+    wrapper = cur.db
+    if prepared.enabled(wrapper):
+        prepared.execute(wrapper, cur, sql, params)
+    else:
+        cur.execute(sql, params or [])
+
+@contextmanager
+def _statement_timeout(wrapper, timeout_ms: int | None):
+    # Connections are persistent, so always put the server default back afterwards
+    if not timeout_ms:
+        yield
+        return
+    with wrapper.cursor() as cur:
+        cur.execute("SET statement_timeout = %s", [int(timeout_ms)])
+    try:
+        yield
+    finally:
+        try:
+            with wrapper.cursor() as cur:
+                cur.execute("RESET statement_timeout")
+        except DatabaseError:
+            pass
 
-def run_sql_logged_return_data(sql: str, label: str, view_name: str, optimized: bool = False, params: Sequence[Any] | None = None):
+@contextmanager
+def _admitted(alias: str, query_class: str, timeout_ms: int | None):
     """
-    Execute SQL and return ONLY data (for V1 compatibility), but log metrics in DB.
+    Wait for a slot of `query_class` and apply its statement_timeout; yields the queue wait in ms.
     """
-    t0 = time.perf_counter()
-    with connection.cursor() as cur:
+    gate = admission.gate(query_class)
+    with timing.phase("queue"):
+        queue_ms = gate.acquire()
+    try:
+        with _statement_timeout(connections[alias], timeout_ms or gate.timeout_ms):
+            yield queue_ms
+    finally:
+        gate.release()
+
+def iter_sql_chunks(sql: str, params: Sequence[Any] | None = None, chunk_size: int | None = None, using: str | None = None) -> Iterator[tuple[list[str], list[int], list[tuple]]]:
+    """
+    Execute SQL on a server-side cursor and yield (columns, type OIDs, rows) per fetchmany() chunk.
+    The first chunk is always yielded (possibly empty) so callers learn the columns.
+    """
+    chunk_size = chunk_size or getattr(settings, "ANALYTICS_FETCH_CHUNK_SIZE", 5000)
+    with connections[using or analytics_db()].chunked_cursor() as cur:
         cur.execute(sql, params or [])
-        data = _fetch_all_dict(cur)
-    elapsed_ms = (time.perf_counter() - t0) * 1000.0
-
-    QueryHit.objects.create(
-        label=label,
-        view_name=view_name,
-        sql_text=sql,
-        elapsed_ms=elapsed_ms,
-        rows=len(data),
-        optimized=optimized,
-    )
+        first = True
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows and not first:
+                break
+            desc = cur.description or []
+            yield [c[0] for c in desc], [c[1] for c in desc], rows
+            if not rows:
+                break
+            first = False
+
+def _run_sql(sql: str, params, query_class: str, timeout_ms: int | None) -> tuple[list[dict], float, float]:
+    # (rows, elapsed_ms, queue_ms); elapsed_ms excludes the admission wait
+    alias = analytics_db()
+    with timing.phase("db-connect"):
+        connections[alias].ensure_connection()
+    with _admitted(alias, query_class, timeout_ms) as queue_ms:
+        t0 = time.perf_counter()
+        with connections[alias].cursor() as cur:
+            _execute(cur, sql, params)
+            data = _fetch_all_dict(cur)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    return data, elapsed_ms, queue_ms
+
+def run_sql_logged_return_data(sql: str, label: str, view_name: str, optimized: bool = False, params: Sequence[Any] | None = None, query_class: str = "light", timeout_ms: int | None = None):
+    """
+    Execute SQL and return ONLY data (for V1 compatibility), but log metrics in DB.
+    """
+    data, elapsed_ms, queue_ms = _run_sql(sql, params, query_class, timeout_ms)
+
+    with timing.phase("instr"):
+        recorder.record(
+            label=label,
+            view_name=view_name,
+            sql_text=sql,
+            elapsed_ms=elapsed_ms,
+            queue_ms=queue_ms,
+            rows=len(data),
+            optimized=optimized,
+        )
+        prom.observe_query(label, query_class, elapsed_ms, queue_ms, len(data))
+        plans.maybe_capture(label, sql, params, elapsed_ms)
     return data
 
-def run_sql_logged_return_timed(sql: str, label: str, view_name: str, optimized: bool = False, params: Sequence[Any] | None = None) -> Dict[str, Any]:
+def run_sql_logged_return_timed(sql: str, label: str, view_name: str, optimized: bool = False, params: Sequence[Any] | None = None, query_class: str = "light", timeout_ms: int | None = None) -> Dict[str, Any]:
     """
     Execute SQL and return timed structure (for V2 compatibility), and log metrics in DB.
     """
+    data, elapsed_ms, queue_ms = _run_sql(sql, params, query_class, timeout_ms)
+
+    with timing.phase("instr"):
+        recorder.record(
+            label=label,
+            view_name=view_name,
+            sql_text=sql,
+            elapsed_ms=elapsed_ms,
+            queue_ms=queue_ms,
+            rows=len(data),
+            optimized=optimized,
+        )
+        prom.observe_query(label, query_class, elapsed_ms, queue_ms, len(data))
+        plans.maybe_capture(label, sql, params, elapsed_ms)
+    return {"elapsed_ms": round(elapsed_ms, 2), "queue_ms": round(queue_ms, 2), "rows": len(data), "data": data}
+
+def run_logged_return_timed(execute, label: str, view_name: str, sql_text: str, optimized: bool = False, query_class: str = "light") -> Dict[str, Any]:
+    """
+    Same as run_sql_logged_return_timed, for non-SQL engines: `execute()` returns the rows
+    and `sql_text` describes what ran. It holds a slot of `query_class` while running.
+    """
+    gate = admission.gate(query_class)
+    with timing.phase("queue"):
+        queue_ms = gate.acquire()
+    try:
+        t0 = time.perf_counter()
+        data = execute()
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    finally:
+        gate.release()
+
+    with timing.phase("instr"):
+        recorder.record(
+            label=label,
+            view_name=view_name,
+            sql_text=sql_text,
+            elapsed_ms=elapsed_ms,
+            queue_ms=queue_ms,
+            rows=len(data),
+            optimized=optimized,
+        )
+        prom.observe_query(label, query_class, elapsed_ms, queue_ms, len(data))
+    return {"elapsed_ms": round(elapsed_ms, 2), "queue_ms": round(queue_ms, 2), "rows": len(data), "data": data}
+
+def stream_sql_logged(sql: str, label: str, view_name: str, encoder, optimized: bool = False, params: Sequence[Any] | None = None, chunk_size: int | None = None, query_class: str = "light", timeout_ms: int | None = None):
+    """
+    Execute SQL in fetchmany() chunks, yield them encoded by `encoder`, and log metrics
+    in DB once the stream ends (elapsed_ms covers execution, fetch and encoding).
+    Admission and the first fetch happen here, before any response is started, so a
+    rejection can still become a 429/503 and an execute-time statement timeout a 504;
+    the slot is held until the stream is closed.
+    """
+    gate = admission.gate(query_class)
+    with timing.phase("queue"):
+        queue_ms = gate.acquire()
+    try:
+        stream = _stream_sql_logged(sql, label, view_name, encoder, optimized, params, chunk_size,
+                                    query_class, timeout_ms or gate.timeout_ms, queue_ms)
+        first = next(stream, b"")
+    except BaseException:
+        gate.release()
+        raise
+    return admission.Admitted(gate, stream, head=[first])
+
+def _stream_sql_logged(sql, label, view_name, encoder, optimized, params, chunk_size, query_class, timeout_ms, queue_ms) -> Iterator[bytes]:
+    alias = analytics_db()
     t0 = time.perf_counter()
-    with connection.cursor() as cur:
-        cur.execute(sql, params or [])
-        data = _fetch_all_dict(cur)
-    elapsed_ms = (time.perf_counter() - t0) * 1000.0
-
-    QueryHit.objects.create(
-        label=label,
-        view_name=view_name,
-        sql_text=sql,
-        elapsed_ms=elapsed_ms,
-        rows=len(data),
-        optimized=optimized,
-    )
-    return {"elapsed_ms": round(elapsed_ms, 2), "rows": len(data), "data": data}
+    rows = 0
+    started = False
+
+    def record():
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        recorder.record(
+            label=label,
+            view_name=view_name,
+            sql_text=sql,
+            elapsed_ms=elapsed_ms,
+            queue_ms=queue_ms,
+            rows=rows,
+            optimized=optimized,
+        )
+        prom.observe_query(label, query_class, elapsed_ms, queue_ms, rows)
+
+    try:
+        with _statement_timeout(connections[alias], timeout_ms):
+            for cols, types, chunk in iter_sql_chunks(sql, params, chunk_size, using=alias):
+                rows += len(chunk)
+                out = encoder.write(cols, types, chunk)
+                # Always yield after the first chunk: stream_sql_logged pulls it before the response starts
+                if out or not started:
+                    yield out
+                    started = True
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        plans.maybe_capture(label, sql, params, elapsed_ms)
+        yield from encoder.close(rows=rows, elapsed_ms=round(elapsed_ms, 2))
+    except GeneratorExit:
+        # Client went away: record what was sent
+        record()
+        raise
+    except OperationalError as e:
+        # Failed queries are not recorded as hits, as in the buffered paths. A timeout before the
+        # first chunk reaches guard as a 504; after it the 200 is already out, so count it here.
+        if started and getattr(e.__cause__, "pgcode", None) == admission.QUERY_CANCELED:
+            prom.observe_error(504)
+            logger.warning("%s exceeded its statement timeout after %d streamed rows", label, rows)
+        raise
+    else:
+        record()
+
+
+# ---------------------------------------------------------------------------
+# Benchmark harness (bench_sql)
+# ---------------------------------------------------------------------------
+
+COUNTERS_SQL = """
+    SELECT d.blks_hit, d.blks_read,
+           COALESCE((SELECT SUM(idx_scan) FROM pg_stat_user_tables), 0),
+           COALESCE((SELECT SUM(seq_scan) FROM pg_stat_user_tables), 0)
+    FROM pg_stat_database d
+    WHERE d.datname = current_database()
+"""
+
+def _pct(part: float, whole: float) -> float | None:
+    return round(100.0 * part / whole, 2) if whole else None
+
+def _quantile(sorted_samples: list[float], q: float) -> float:
+    # Nearest-rank percentile
+    return sorted_samples[max(0, min(len(sorted_samples) - 1, math.ceil(q * len(sorted_samples)) - 1))]
+
+def fetch_db_counters(using: str | None = None) -> Dict[str, int]:
+    """
+    Cumulative buffer-cache and scan counters of the analytics database (pg_stat_*).
+    """
+    with connections[using or analytics_db()].cursor() as cur:
+        cur.execute("SELECT pg_stat_clear_snapshot()")
+        cur.execute(COUNTERS_SQL)
+        blks_hit, blks_read, idx_scan, seq_scan = cur.fetchone()
+    return {"blks_hit": int(blks_hit), "blks_read": int(blks_read), "idx_scan": int(idx_scan), "seq_scan": int(seq_scan)}
+
+def counter_pcts(before: Dict[str, int], after: Dict[str, int] | None = None) -> Dict[str, float | None]:
+    """
+    Cache-hit and index-usage percentages from counters, or from the delta between two snapshots.
+    """
+    d = {k: after[k] - before[k] for k in before} if after else before
+    return {
+        "db_cache_hit_pct": _pct(d["blks_hit"], d["blks_hit"] + d["blks_read"]),
+        "idx_usage_pct": _pct(d["idx_scan"], d["idx_scan"] + d["seq_scan"]),
+    }
+
+def fetch_db_cache_hit_pct(using: str | None = None) -> float | None:
+    return counter_pcts(fetch_db_counters(using))["db_cache_hit_pct"]
+
+def fetch_idx_usage_pct(using: str | None = None) -> float | None:
+    return counter_pcts(fetch_db_counters(using))["idx_usage_pct"]
+
+def measure(make_call, runs: int, warmup: int = 0, concurrency: int = 1) -> Dict[str, Any]:
+    """
+    Time `runs` calls spread over `concurrency` threads after `warmup` untimed calls per
+    thread. `make_call()` runs once per thread and returns the zero-argument callable to time
+    (so each thread can hold its own connection or HTTP session). Failed calls are counted
+    in `errors` and left out of the samples. Each thread's DB connections are closed at the end.
+    """
+    samples: list[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    shares = [runs // concurrency + (1 if i < runs % concurrency else 0) for i in range(concurrency)]
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(n: int):
+        mine, failed, call = [], 0, None
+        try:
+            call = make_call()
+            for _ in range(warmup):
+                call()
+        except Exception:
+            call = None
+        finally:
+            start.wait()
+        try:
+            for _ in range(n):
+                if call is None:
+                    failed += 1
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    call()
+                except Exception:
+                    failed += 1
+                    continue
+                mine.append((time.perf_counter() - t0) * 1000.0)
+        finally:
+            # Connections are per thread; don't leave this one's open
+            connections.close_all()
+        with lock:
+            samples.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(n,), name=f"bench-{i}") for i, n in enumerate(shares)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t_all = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - t_all
+
+    if not samples:
+        raise RuntimeError(f"All {runs} benchmark calls failed")
+    return {**latency_stats(samples, wall_s), "errors": errors[0]}
+
+def latency_stats(samples: list[float], wall_s: float | None = None) -> Dict[str, Any]:
+    samples = sorted(samples)
+    return {
+        "avg_ms": statistics.fmean(samples),
+        "min_ms": samples[0],
+        "max_ms": samples[-1],
+        "p50_ms": _quantile(samples, 0.50),
+        "p95_ms": _quantile(samples, 0.95),
+        "p99_ms": _quantile(samples, 0.99),
+        "throughput_qps": len(samples) / wall_s if wall_s else None,
+        "samples_ms": samples,
+    }
+
+def run_latency_benchmark(sql: str, runs: int = 30, params: Sequence[Any] | None = None, warmup: int = 0, concurrency: int = 1, using: str | None = None) -> Dict[str, Any]:
+    """
+    Time `sql` (fetching all rows) on the analytics database; see measure().
+    Each worker thread uses its own connection.
+    """
+    alias = using or analytics_db()
+
+    def make_call():
+        conn = connections[alias]
+
+        def call():
+            with conn.cursor() as cur:
+                cur.execute(sql, params or [])
+                cur.fetchall()
+        return call
+
+    return measure(make_call, runs, warmup, concurrency)
@@ -1,17 +1,24 @@
-from django.http import JsonResponse
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.shortcuts import render
 from django.views.decorators.http import require_GET
-from django.db.models import Avg, Min, Max, Count
-from .models import QueryHit
+from django.db.models import Count
+from django.utils import timezone
+from NYT.routers import analytics_db
+from . import dbstats, prom, regression, rollup
+from .models import BenchmarkBaseline, BenchmarkRun, LoadTestRun, QueryHit, QueryHitRollup, QueryPlan
 
 @require_GET
 def latest_hits(request):
-    qs = QueryHit.objects.order_by("-created_at")[:200]
+    qs = QueryHit.objects.using(analytics_db()).order_by("-created_at")[:200]
     data = [
         {
             "ts": q.created_at.isoformat(),
             "label": q.label,
             "view": q.view_name,
             "ms": round(q.elapsed_ms, 2),
+            "queue_ms": round(q.queue_ms, 2),
             "rows": q.rows,
             "opt": q.optimized,
         }
@@ -21,24 +28,171 @@ def latest_hits(request):
 
 @require_GET
 def summary_by_label(request):
+    # Percentiles per label over ?window= (default 24h), read from the rollups
+    try:
+        window = rollup.parse_window(request.GET.get("window", "24h"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    by_label = rollup.window_by_label(window, label=request.GET.get("label") or None, using=analytics_db())
+    data = [{"label": label, **rollup.summarize(agg)} for label, agg in sorted(by_label.items())]
+    return JsonResponse({"window": request.GET.get("window", "24h"), "summary": data}, status=200)
+
+@require_GET
+def label_timeseries(request):
+    # Per-bucket percentiles for one label: ?label=&resolution=m|h&window=
+    label = request.GET.get("label")
+    if not label:
+        return JsonResponse({"error": "label is required"}, status=400)
+    resolution = request.GET.get("resolution", QueryHitRollup.MINUTE)
+    if resolution not in dict(QueryHitRollup.RESOLUTIONS):
+        return JsonResponse({"error": "resolution must be m or h"}, status=400)
+    try:
+        window = rollup.parse_window(request.GET.get("window", "6h" if resolution == "m" else "7d"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     qs = (
-        QueryHit.objects.values("label")
-        .annotate(
-            cnt=Count("id"),
-            avg_ms=Avg("elapsed_ms"),
-            min_ms=Min("elapsed_ms"),
-            max_ms=Max("elapsed_ms"),
-        )
-        .order_by("label")
+        QueryHitRollup.objects.using(analytics_db())
+        .filter(resolution=resolution, label=label, bucket_start__gte=timezone.now() - window)
+        .order_by("bucket_start")
+        .values("bucket_start", *rollup.FIELDS)
     )
+    data = [{"ts": r["bucket_start"].isoformat(), **rollup.summarize(r)} for r in qs]
+    return JsonResponse({"label": label, "resolution": resolution, "results": data}, status=200)
+
+@require_GET
+def bench_baselines(request):
+    data = [
+        {"name": b.name, "description": b.description, "created_at": b.created_at.isoformat(), "runs": b.n}
+        for b in BenchmarkBaseline.objects.using(analytics_db()).annotate(n=Count("runs")).order_by("-created_at")
+    ]
+    return JsonResponse({"results": data}, status=200)
+
+@require_GET
+def bench_compare(request):
+    # ?base=<baseline>&new=<baseline|latest>&stat=p50|p95|mean&threshold=5
+    base = request.GET.get("base")
+    if not base:
+        return JsonResponse({"error": "base is required"}, status=400)
+    try:
+        threshold = float(request.GET.get("threshold", "5"))
+        report = regression.compare(base, request.GET.get("new", regression.LATEST),
+                                    request.GET.get("stat", "p50"), threshold, using=analytics_db())
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except BenchmarkBaseline.DoesNotExist:
+        return JsonResponse({"error": "Unknown baseline"}, status=404)
+    return JsonResponse(report, status=200)
+
+@require_GET
+def bench_scaling(request):
+    # Latency vs dataset size from bench_scale: latest run per label and scale factor (?metric= to filter)
+    qs = (
+        BenchmarkRun.objects.using(analytics_db()).filter(target="bench", scale_factor__isnull=False)
+        .defer("sql_text", "samples_ms", "stats_before", "stats_after")
+        .order_by("created_at")
+    )
+    metric = request.GET.get("metric")
+    if metric:
+        qs = qs.filter(label__startswith=f"{metric}.")
+    latest = {(r.label, r.scale_factor): r for r in qs}
+    curves = {}
+    for (label, sf), r in sorted(latest.items()):
+        curves.setdefault(label, []).append({
+            "scale_factor": sf, "rows": r.dataset_rows, "p50_ms": r.p50_ms, "p95_ms": r.p95_ms,
+            "p99_ms": r.p99_ms, "run": r.id, "created_at": r.created_at.isoformat(),
+        })
+    return JsonResponse({"results": curves}, status=200)
+
+@login_required(login_url='/admin/login/?next=/metrics/bench/')
+def bench_compare_page(request):
+    return render(request, "dashboard/bench_compare.html", {})
+
+PLAN_FIELDS = (
+    "id", "label", "fingerprint", "planning_ms", "execution_ms", "query_elapsed_ms", "shared_hit_blocks",
+    "shared_read_blocks", "temp_written_blocks", "max_estimate_error", "worst_estimate_node", "plan_changed",
+    "previous_fingerprint", "latency_shift_pct", "flagged", "created_at",
+)
+
+@require_GET
+def plan_history(request):
+    # ?label= plan history for one label, or ?flagged=1 for recent flagged plan changes
+    qs = QueryPlan.objects.using(analytics_db()).order_by("-created_at")
+    label = request.GET.get("label")
+    if label:
+        qs = qs.filter(label=label)
+    elif request.GET.get("flagged") == "1":
+        qs = qs.filter(flagged=True)
+    else:
+        return JsonResponse({"error": "label or flagged=1 is required"}, status=400)
+    data = [
+        {**r, "created_at": r["created_at"].isoformat()}
+        for r in qs.values(*PLAN_FIELDS)[:200]
+    ]
+    return JsonResponse({"results": data}, status=200)
+
+@require_GET
+def plan_detail(request, pk: int):
+    qp = get_object_or_404(QueryPlan.objects.using(analytics_db()), pk=pk)
+    data = {f: getattr(qp, f) for f in PLAN_FIELDS}
+    data["created_at"] = qp.created_at.isoformat()
+    data["sql_text"] = qp.sql_text
+    data["plan"] = qp.plan
+    return JsonResponse(data, status=200)
+
+@require_GET
+def db_stats(request):
+    # Table/index/cache/statement deltas over ?window= (default 1h)
+    try:
+        window = rollup.parse_window(request.GET.get("window", "1h"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    report = dbstats.window_report(window, using=analytics_db())
+    if report is None:
+        return JsonResponse({"error": "No database stats collected yet"}, status=404)
+    table = request.GET.get("table")
+    if table:
+        report["tables"] = [t for t in report["tables"] if t["table"] == table]
+        report["indexes"] = [i for i in report["indexes"] if i["table"] == table]
+        report["unused_indexes"] = [i for i in report["unused_indexes"] if i["table"] == table]
+    return JsonResponse(report, status=200)
+
+@require_GET
+def db_table_series(request):
+    # Per-interval seq/index scans and hit ratio for ?table= (default core_trip)
+    try:
+        window = rollup.parse_window(request.GET.get("window", "24h"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    table = request.GET.get("table", "core_trip")
+    return JsonResponse({"table": table, "results": dbstats.table_series(table, window, using=analytics_db())}, status=200)
+
+LOAD_FIELDS = (
+    "id", "name", "mode", "transport", "target", "concurrency", "target_rps", "think_ms", "duration_s",
+    "requests", "errors", "dropped", "achieved_rps", "p50_ms", "p95_ms", "p99_ms", "created_at",
+)
+LOAD_RESULT_FIELDS = (
+    "endpoint", "path", "requests", "errors", "statuses", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "throughput_rps",
+)
+
+@require_GET
+def load_runs(request):
+    # Recent loadgen runs (?name= to filter) with per-endpoint results: throughput and latency per load level
+    qs = LoadTestRun.objects.using(analytics_db()).order_by("-created_at").prefetch_related("results")
+    name = request.GET.get("name")
+    if name:
+        qs = qs.filter(name=name)
     data = [
         {
-            "label": r["label"],
-            "count": r["cnt"],
-            "avg_ms": round(r["avg_ms"] or 0, 2),
-            "min_ms": round(r["min_ms"] or 0, 2),
-            "max_ms": round(r["max_ms"] or 0, 2),
+            **{f: getattr(r, f) for f in LOAD_FIELDS},
+            "created_at": r.created_at.isoformat(),
+            "endpoints": [{f: getattr(e, f) for f in LOAD_RESULT_FIELDS} for e in r.results.all()],
         }
-        for r in qs
+        for r in qs[:50]
     ]
-    return JsonResponse({"summary": data}, status=200)
+    return JsonResponse({"results": data}, status=200)
+
+
+@require_GET
+def prometheus(request):
+    # Text exposition for Prometheus scrapes: process memory (or PROMETHEUS_MULTIPROC_DIR) only, no DB access
+    return HttpResponse(prom.render(), content_type=prom.CONTENT_TYPE)